@@ -0,0 +1,113 @@
+# app/analysis_cache.py
+"""
+Content-addressed cache for face-analysis results.
+
+Entries are keyed by the SHA-256 of the uploaded image bytes (which ingest
+already computes), so the same selfie sent to /analyze-face and then to
+/face-recommendations is only analysed once. A bounded in-process LRU is
+always used; when a directory is configured, results are also written there
+as small JSON files so they survive restarts and are shared by workers.
+"""
+from collections import OrderedDict
+import copy
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisCache:
+    def __init__(self, max_entries: int = 256, cache_dir: Optional[str] = None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir or None
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "disk_errors": 0}
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _remember(self, key: str, value: Dict) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return copy.deepcopy(value)
+
+        if self.cache_dir:
+            try:
+                with open(self._path(key), "r", encoding="utf-8") as f:
+                    value = json.load(f)
+            except FileNotFoundError:
+                value = None
+            except (OSError, ValueError) as e:
+                logger.warning(f"Unreadable analysis cache entry {key}: {e}")
+                value = None
+                with self._lock:
+                    self._stats["disk_errors"] += 1
+            if value is not None:
+                self._remember(key, value)
+                with self._lock:
+                    self._stats["disk_hits"] += 1
+                return copy.deepcopy(value)
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, key: str, value: Dict) -> None:
+        value = copy.deepcopy(value)
+        self._remember(key, value)
+        if not self.cache_dir:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename so readers never see a partial file
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(value, f)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Could not write analysis cache entry {key}: {e}")
+            with self._lock:
+                self._stats["disk_errors"] += 1
+
+    def get_or_compute(self, key: str, compute: Callable[[], Dict]) -> Dict:
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits"] + stats["disk_hits"]) / lookups, 4) if lookups else None
+        stats["max_entries"] = self.max_entries
+        stats["disk"] = bool(self.cache_dir)
+        return stats
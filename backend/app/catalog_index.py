@@ -0,0 +1,334 @@
+# app/catalog_index.py
+"""
+Visual "shop similar" search over the product catalog.
+
+Product images are embedded offline with the compatibility model's
+backbone (`get_embedding`) and written to a compact index directory:
+
+    embeddings.npy   float16 [N, 128], L2-normalised rows
+    products.json    id and metadata of each row
+    head.npz         compatibility head weights of the model that built it
+    manifest.json    model (variant, checkpoint, fingerprint), size and build time
+
+A query is one matrix multiply over all rows. "similar" ranks by cosine
+similarity; "compatible" runs the compatibility head, whose first layer is
+split so the catalog half is precomputed once at load time. The head scores
+(top, bottom) pairs, so the query's role decides which half it takes.
+The manifest records the variant, checkpoint and fingerprint of the model
+that built the index; queries must be embedded by that same model.
+
+    python -m app.catalog_index                           # products in the product catalog
+    python -m app.catalog_index --images ../clothes/test  # local images, one folder per category
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CATALOG_INDEX_DIR = os.environ.get("CATALOG_INDEX_DIR", os.path.join(BASE_DIR, "catalog_index"))
+# Images per forward pass while indexing
+CATALOG_INDEX_BATCH = int(os.environ.get("CATALOG_INDEX_BATCH", "32"))
+# Concurrent image downloads while indexing
+CATALOG_INDEX_WORKERS = int(os.environ.get("CATALOG_INDEX_WORKERS", "8"))
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+MODES = ("similar", "compatible")
+ROLES = ("top", "bottom")
+
+
+def head_fingerprint(head: List[Tuple[np.ndarray, np.ndarray]]) -> str:
+    """Hash of compatibility head weights; differs between any two trained models."""
+    digest = hashlib.sha256()
+    for w, b in head:
+        digest.update(np.ascontiguousarray(w, dtype=np.float32).tobytes())
+        digest.update(np.ascontiguousarray(b, dtype=np.float32).tobytes())
+    return digest.hexdigest()
+
+
+def product_id(product: Dict) -> str:
+    key = product.get("link") or product.get("default_image") or product.get("title") or ""
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def catalog_products(catalog) -> List[Dict]:
+    """Every product stored in the product catalog, tagged with its page's category."""
+    from .product_catalog import _category_for_url
+    from .web_scraper import SCRAPING_URLS
+
+    products = []
+    for url in sorted(set(SCRAPING_URLS.values())):
+        for product in catalog.products(url, 10000):
+            products.append({**product, "category": _category_for_url(url)})
+    return products
+
+
+def local_products(root: str) -> List[Dict]:
+    """Images under `root/<category>/`, as products whose image is a local path."""
+    products = []
+    for category in sorted(os.listdir(root)):
+        folder = os.path.join(root, category)
+        if not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                path = os.path.abspath(os.path.join(folder, name))
+                products.append({"title": f"{category}/{name}", "link": None, "default_image": path, "category": category})
+    return products
+
+
+def _load_image(src: str, cache_dir: str) -> bytes:
+    """Bytes of a local image, or of a remote one via the download cache."""
+    if os.path.isfile(src):
+        with open(src, "rb") as f:
+            return f.read()
+    path = os.path.join(cache_dir, hashlib.sha1(src.encode("utf-8")).hexdigest())
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return f.read()
+    from .web_scraper import SCRAPER_HTTP_TIMEOUT, get_http_session
+
+    response = get_http_session().get(src, timeout=SCRAPER_HTTP_TIMEOUT)
+    response.raise_for_status()
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(response.content)
+    os.replace(tmp, path)
+    return response.content
+
+
+def _write_atomic(path: str, write) -> None:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+def model_identity(model) -> Dict:
+    """What the index manifest records about the model that built it (see CatalogIndex.matches)."""
+    return {
+        "variant": getattr(model, "variant", None),
+        "checkpoint": str(getattr(model, "model_path", None)),
+        "model_fingerprint": model.fingerprint(),
+    }
+
+
+def build_index(products: Iterable[Dict], out_dir: str = CATALOG_INDEX_DIR, model=None,
+                batch_size: int = CATALOG_INDEX_BATCH, workers: int = CATALOG_INDEX_WORKERS) -> Dict:
+    """
+    Embed every product image and write the index to `out_dir`. Remote
+    images are cached under `out_dir/images`, so rebuilding after a catalog
+    refresh only downloads new products. Returns a summary.
+    """
+    if model is None:
+        from .outfit_compatibility import get_model
+        model = get_model()
+    start = time.perf_counter()
+    cache_dir = os.path.join(out_dir, "images")
+    os.makedirs(cache_dir, exist_ok=True)
+
+    unique = {}
+    for product in products:
+        if product.get("default_image"):
+            unique.setdefault(product_id(product), product)
+    ids = list(unique)
+
+    def fetch(pid):
+        try:
+            return _load_image(unique[pid]["default_image"], cache_dir)
+        except Exception as e:
+            logger.warning(f"Skipping {unique[pid].get('title')}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        images = list(pool.map(fetch, ids))
+    fetched = time.perf_counter()
+
+    rows, chunks = [], []
+    for offset in range(0, len(ids), batch_size):
+        batch = [(pid, img) for pid, img in zip(ids[offset:offset + batch_size], images[offset:offset + batch_size]) if img]
+        if not batch:
+            continue
+        try:
+            chunks.append(model.embed_images([img for _, img in batch]))
+            rows.extend(pid for pid, _ in batch)
+        except Exception:
+            # One undecodable image fails the whole batch; retry it image by image
+            for pid, img in batch:
+                try:
+                    chunks.append(model.embed_images([img]))
+                    rows.append(pid)
+                except Exception as e:
+                    logger.warning(f"Skipping {unique[pid].get('title')}: {e}")
+    embeddings = np.concatenate(chunks) if chunks else np.zeros((0, 0), dtype=np.float32)
+    embedded = time.perf_counter()
+
+    metadata = [{"id": pid, **{k: v for k, v in unique[pid].items() if k != "id"}} for pid in rows]
+    head = model.compatibility_head_arrays()
+    manifest = {
+        **model_identity(model),
+        "products": len(rows),
+        "dim": int(embeddings.shape[1]) if len(rows) else 0,
+        "built_at": time.time(),
+    }
+    _write_atomic(os.path.join(out_dir, "embeddings.npy"), lambda f: np.save(f, embeddings.astype(np.float16)))
+    _write_atomic(os.path.join(out_dir, "products.json"), lambda f: f.write(json.dumps(metadata).encode("utf-8")))
+    _write_atomic(os.path.join(out_dir, "head.npz"), lambda f: np.savez(
+        f, **{f"w{i}": w for i, (w, _) in enumerate(head)}, **{f"b{i}": b for i, (_, b) in enumerate(head)}
+    ))
+    # Written last: readers reload when the manifest changes
+    _write_atomic(os.path.join(out_dir, "manifest.json"), lambda f: f.write(json.dumps(manifest, indent=2).encode("utf-8")))
+
+    return {
+        **manifest,
+        "skipped": len(ids) - len(rows),
+        "fetch_seconds": round(fetched - start, 2),
+        "embed_seconds": round(embedded - fetched, 2),
+        "images_per_second": round(len(rows) / max(embedded - fetched, 1e-9), 1),
+    }
+
+
+class CatalogIndex:
+    def __init__(self, embeddings: np.ndarray, products: List[Dict],
+                 head: Optional[List[Tuple[np.ndarray, np.ndarray]]] = None, manifest: Optional[Dict] = None):
+        if len(embeddings) != len(products):
+            raise ValueError(f"{len(embeddings)} embeddings for {len(products)} products")
+        # float16 on disk, float32 in memory so the matmul runs through BLAS
+        self.embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        self.products = products
+        self.manifest = manifest or {}
+        self.categories = np.array([p.get("category") or "" for p in products])
+        self._head = None
+        if head:
+            (w1, b1), *rest = head
+            dim = self.embeddings.shape[1]
+            # Linear([top, bottom]) = W_t top + W_b bottom + b. The catalog side of
+            # either role is fixed per index, so both are precomputed.
+            w_top, w_bottom = w1[:, :dim], w1[:, dim:]
+            self._head = {
+                "query": {"top": np.ascontiguousarray(w_top.T), "bottom": np.ascontiguousarray(w_bottom.T)},
+                "catalog": {"top": self.embeddings @ w_top.T + b1, "bottom": self.embeddings @ w_bottom.T + b1},
+                "rest": rest,
+            }
+
+    @classmethod
+    def load(cls, index_dir: str = CATALOG_INDEX_DIR) -> "CatalogIndex":
+        with open(os.path.join(index_dir, "manifest.json"), encoding="utf-8") as f:
+            manifest = json.load(f)
+        with open(os.path.join(index_dir, "products.json"), encoding="utf-8") as f:
+            products = json.load(f)
+        embeddings = np.load(os.path.join(index_dir, "embeddings.npy"))
+        head = None
+        head_path = os.path.join(index_dir, "head.npz")
+        if os.path.exists(head_path):
+            with np.load(head_path) as arrays:
+                head = [(arrays[f"w{i}"], arrays[f"b{i}"]) for i in range(len(arrays.files) // 2)]
+        return cls(embeddings, products, head, manifest)
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def mask_for(self, keep) -> np.ndarray:
+        """Boolean row mask from a predicate on the product category."""
+        allowed = {c for c in set(self.categories) if keep(c)}
+        return np.isin(self.categories, list(allowed))
+
+    def matches(self, identity: Dict) -> bool:
+        """Whether the index was built by the model with this `model_identity`."""
+        return all(self.manifest.get(key) == value for key, value in identity.items())
+
+    def scores(self, queries: np.ndarray, mode: str = "similar", query_role: str = "top") -> np.ndarray:
+        """
+        [Q, N] scores of every catalog row for a batch of query embeddings.
+        In compatible mode `query_role` says whether the queries are tops
+        (scored as head([query, row])) or bottoms (head([row, query])).
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if mode == "similar":
+            return queries @ self.embeddings.T
+        if mode != "compatible":
+            raise ValueError(f"mode must be one of {MODES}")
+        if query_role not in ROLES:
+            raise ValueError(f"query_role must be one of {ROLES}")
+        if self._head is None:
+            raise ValueError("Index was built without a compatibility head")
+        catalog_role = "bottom" if query_role == "top" else "top"
+        w_query = self._head["query"][query_role]
+        catalog_hidden = self._head["catalog"][catalog_role]
+        rest = self._head["rest"]
+        hidden = np.maximum(catalog_hidden[None, :, :] + (queries @ w_query)[:, None, :], 0)
+        for i, (w, b) in enumerate(rest):
+            hidden = hidden @ w.T + b
+            if i < len(rest) - 1:
+                hidden = np.maximum(hidden, 0)
+        return 1.0 / (1.0 + np.exp(-hidden[..., 0]))
+
+    def search(self, queries: np.ndarray, k: int = 10, mode: str = "similar",
+               mask: Optional[np.ndarray] = None, query_role: str = "top") -> List[List[Tuple[int, float]]]:
+        """Top-k (row, score) per query, best first; rows outside `mask` are never returned."""
+        scores = self.scores(queries, mode, query_role)
+        candidates = len(self) if mask is None else int(mask.sum())
+        k = min(k, candidates)
+        if k <= 0:
+            return [[] for _ in range(len(scores))]
+        if mask is not None:
+            scores = np.where(mask[None, :], scores, -np.inf)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, cols in zip(scores, top):
+            cols = cols[np.argsort(-row[cols])]
+            results.append([(int(c), float(row[c])) for c in cols])
+        return results
+
+
+_index_instance: Optional[CatalogIndex] = None
+_index_mtime = None
+_index_lock = threading.Lock()
+
+
+def get_catalog_index(index_dir: str = CATALOG_INDEX_DIR) -> Optional[CatalogIndex]:
+    """The current index, reloaded when it has been rebuilt; None when none was built yet."""
+    global _index_instance, _index_mtime
+    try:
+        mtime = os.stat(os.path.join(index_dir, "manifest.json")).st_mtime
+    except FileNotFoundError:
+        return None
+    if _index_instance is None or mtime != _index_mtime:
+        with _index_lock:
+            if _index_instance is None or mtime != _index_mtime:
+                _index_instance = CatalogIndex.load(index_dir)
+                _index_mtime = mtime
+                logger.info(f"Loaded catalog index with {len(_index_instance)} products from {index_dir}")
+    return _index_instance
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Embed product images into the visual search index.")
+    parser.add_argument("--images", nargs="*", default=None,
+                        help="Local image roots (one sub-folder per category) to index")
+    parser.add_argument("--no-catalog", action="store_true", help="Skip products stored in the product catalog")
+    parser.add_argument("--out", default=CATALOG_INDEX_DIR)
+    parser.add_argument("--batch-size", type=int, default=CATALOG_INDEX_BATCH)
+    parser.add_argument("--workers", type=int, default=CATALOG_INDEX_WORKERS)
+    args = parser.parse_args()
+
+    products = []
+    if not args.no_catalog:
+        from .product_catalog import get_product_catalog
+        products.extend(catalog_products(get_product_catalog()))
+    for root in args.images or []:
+        products.extend(local_products(root))
+    print(json.dumps(build_index(products, args.out, batch_size=args.batch_size, workers=args.workers), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 # app/crud.py
-from .db import SessionLocal, WardrobeItem
+from .db import SessionLocal, WardrobeItem, normalize_class_name
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 import uuid
 
@@ -9,15 +10,21 @@ def create_item(filename, class_name, confidence, color_hex, thickness, meta=Non
         id = uuid.uuid4().hex,
         filename = filename,
         class_name = class_name,
+        class_name_normalized = normalize_class_name(class_name),
         confidence = confidence,
         color_hex = color_hex,
         thickness = thickness,
         meta = meta or {}
     )
-    db.add(item)
-    db.commit()
-    db.refresh(item)
-    db.close()
+    try:
+        db.add(item)
+        db.commit()
+        db.refresh(item)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
     return item
 
 def list_items(limit=100):
@@ -32,12 +39,38 @@ def get_item(item_id):
     db.close()
     return item
 
+def get_item_by_filename(filename):
+    db = SessionLocal()
+    item = db.query(WardrobeItem).filter(WardrobeItem.filename == filename).first()
+    db.close()
+    return item
+
+def get_existing_filenames(filenames):
+    """Subset of `filenames` that already have a wardrobe row (one query)."""
+    if not filenames:
+        return set()
+    db = SessionLocal()
+    rows = db.query(WardrobeItem.filename).filter(WardrobeItem.filename.in_(list(filenames))).all()
+    db.close()
+    return {row[0] for row in rows}
+
 def get_items_by_class_name(class_name: str, limit: int = 10):
     """Get wardrobe items by class name (case-insensitive partial match)"""
     db = SessionLocal()
+    # Match on the pre-lowered column (trigram-indexed on PostgreSQL)
     items = db.query(WardrobeItem).filter(
-        WardrobeItem.class_name.ilike(f"%{class_name}%")
+        WardrobeItem.class_name_normalized.contains(normalize_class_name(class_name), autoescape=True)
     ).order_by(WardrobeItem.confidence.desc()).limit(limit).all()
     db.close()
     return items
 
+def get_wardrobe_version():
+    """
+    Cheap fingerprint of the wardrobe table (row count + newest created_at).
+    Items are only ever inserted, so it changes whenever the wardrobe does,
+    including rows written by other processes such as the S3 ingest worker.
+    """
+    db = SessionLocal()
+    count, newest = db.query(func.count(WardrobeItem.id), func.max(WardrobeItem.created_at)).one()
+    db.close()
+    return f"{count}:{newest.isoformat() if newest else ''}"
@@ -1,29 +1,141 @@
 # app/db.py
-from sqlalchemy import create_engine, Column, String, Integer, Float, DateTime, JSON
+from sqlalchemy import create_engine, Column, String, Integer, Float, DateTime, JSON, Index, DDL, event, inspect, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import datetime
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 # Database path relative to backend root
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-DATABASE_URL = f"sqlite:///{os.path.join(BASE_DIR, 'wardrobe.db')}"
+SQLITE_PATH = os.path.join(BASE_DIR, 'wardrobe.db')
+DEFAULT_DATABASE_URL = f"sqlite:///{SQLITE_PATH}"
+
+# Override with e.g. postgresql+psycopg2://user:pass@db:5432/wardrobe
+DATABASE_URL = os.environ.get("DATABASE_URL", DEFAULT_DATABASE_URL)
+
+# Pool settings are per worker process: total connections to the server are
+# roughly workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW).
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "5"))
+DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
+
+
+def is_sqlite_url(url: str) -> bool:
+    return url.startswith("sqlite")
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+
+def make_engine(url: str = DATABASE_URL):
+    """Create an engine with settings appropriate for the backend behind `url`."""
+    if is_sqlite_url(url):
+        return create_engine(url, connect_args={"check_same_thread": False})
+    return create_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+    )
+
+
+engine = make_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+
+def normalize_class_name(class_name):
+    """Canonical form used for class name lookups (trimmed, lower-case)."""
+    return (class_name or "").strip().lower()
+
+
 class WardrobeItem(Base):
     __tablename__ = "wardrobe_items"
     id = Column(String, primary_key=True, index=True)
-    filename = Column(String, index=True)
+    # Unique: the S3 ingest worker relies on it to make concurrent/retried ingests idempotent
+    filename = Column(String, index=True, unique=True)
     class_name = Column(String, index=True)
+    # Lower-cased copy of class_name so searches don't need ILIKE/lower() per row
+    class_name_normalized = Column(String, index=True)
     confidence = Column(Float)
     color_hex = Column(String)
     thickness = Column(String)
-    meta = Column(JSON, default={})
-    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    meta = Column(JSON().with_variant(JSONB(), "postgresql"), default={})
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+
+    __table_args__ = (
+        Index("ix_wardrobe_items_class_confidence", "class_name_normalized", "confidence"),
+    )
+
+
+# On PostgreSQL, a trigram index makes the partial-match search in
+# crud.get_items_by_class_name index-backed.
+TRGM_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_wardrobe_items_class_name_trgm "
+    "ON wardrobe_items USING gin (class_name_normalized gin_trgm_ops)",
+)
+for _statement in TRGM_DDL:
+    event.listen(
+        WardrobeItem.__table__,
+        "after_create",
+        DDL(_statement).execute_if(dialect="postgresql"),
+    )
+
+
+def _upgrade_schema(bind):
+    """Bring databases created before class_name_normalized existed up to date."""
+    inspector = inspect(bind)
+    table = WardrobeItem.__table__
+    if not inspector.has_table(table.name):
+        return
+
+    columns = {c["name"] for c in inspector.get_columns(table.name)}
+    if "class_name_normalized" not in columns:
+        logger.info("Adding class_name_normalized column to wardrobe_items")
+        with bind.begin() as conn:
+            conn.execute(text("ALTER TABLE wardrobe_items ADD COLUMN class_name_normalized VARCHAR"))
+            conn.execute(text(
+                "UPDATE wardrobe_items SET class_name_normalized = lower(trim(class_name))"
+            ))
+
+    # create_all() skips existing tables, so add any indexes they are missing
+    existing = {ix["name"]: ix for ix in inspector.get_indexes(table.name)}
+    for index in table.indexes:
+        if index.name in existing and (not index.unique or existing[index.name].get("unique")):
+            continue
+        if index.unique:
+            columns = ", ".join(c.name for c in index.columns)
+            with bind.connect() as conn:
+                duplicate = conn.execute(text(
+                    f"SELECT {columns} FROM {table.name} GROUP BY {columns} HAVING count(*) > 1 LIMIT 1"
+                )).first()
+            if duplicate is not None:
+                logger.warning(f"Not creating unique index {index.name}: duplicate rows exist, e.g. {tuple(duplicate)}")
+                continue
+        try:
+            with bind.begin() as conn:
+                if index.name in existing:
+                    # Index became unique (ix_wardrobe_items_filename)
+                    logger.info(f"Making {index.name} unique")
+                    conn.execute(text(f"DROP INDEX {index.name}"))
+                index.create(conn)
+        except IntegrityError as e:
+            logger.warning(f"Could not create unique index {index.name}; remove duplicate rows first: {e}")
+
+    # The after_create hooks only run for new tables; IF NOT EXISTS makes this a no-op once applied
+    if bind.dialect.name == "postgresql":
+        with bind.begin() as conn:
+            for statement in TRGM_DDL:
+                conn.execute(text(statement))
 
-def init_db():
-    Base.metadata.create_all(bind=engine)
 
+def init_db(bind=None):
+    bind = bind or engine
+    _upgrade_schema(bind)
+    Base.metadata.create_all(bind=bind)
@@ -0,0 +1,86 @@
+import argparse
+import logging
+
+from sqlalchemy.orm import sessionmaker
+
+from .db import DATABASE_URL, DEFAULT_DATABASE_URL, WardrobeItem, init_db, make_engine, normalize_class_name
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("db_migrate")
+
+
+def migrate(source_url: str, target_url: str, batch_size: int = 500) -> dict:
+    """
+    Copy wardrobe items from `source_url` (typically the legacy wardrobe.db)
+    into `target_url`. Rows whose id already exists in the target are skipped,
+    so the migration can be re-run safely.
+    """
+    if source_url == target_url:
+        raise ValueError("Source and target database URLs are identical.")
+
+    source_engine = make_engine(source_url)
+    target_engine = make_engine(target_url)
+
+    # Upgrades the legacy schema in place and creates tables/indexes on the target
+    init_db(source_engine)
+    init_db(target_engine)
+
+    Source = sessionmaker(bind=source_engine)
+    Target = sessionmaker(bind=target_engine)
+
+    copied = 0
+    skipped = 0
+    columns = [c.name for c in WardrobeItem.__table__.columns]
+
+    with Source() as src, Target() as dst:
+        query = src.query(WardrobeItem).order_by(WardrobeItem.id).yield_per(batch_size)
+        batch = []
+        for item in query:
+            row = {name: getattr(item, name) for name in columns}
+            row["class_name_normalized"] = normalize_class_name(item.class_name)
+            row["meta"] = item.meta or {}
+            batch.append(row)
+            if len(batch) >= batch_size:
+                c, s = _flush(dst, batch)
+                copied, skipped = copied + c, skipped + s
+                batch = []
+        if batch:
+            c, s = _flush(dst, batch)
+            copied, skipped = copied + c, skipped + s
+
+    return {"copied": copied, "skipped": skipped, "source": source_url, "target": target_url}
+
+
+def _flush(session, batch):
+    ids = [row["id"] for row in batch]
+    existing = {
+        row_id for (row_id,) in session.query(WardrobeItem.id).filter(WardrobeItem.id.in_(ids))
+    }
+    new_rows = [row for row in batch if row["id"] not in existing]
+    if new_rows:
+        session.bulk_insert_mappings(WardrobeItem, new_rows)
+        session.commit()
+    return len(new_rows), len(batch) - len(new_rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate wardrobe items between databases.")
+    parser.add_argument(
+        "--source",
+        default=DEFAULT_DATABASE_URL,
+        help="Source database URL (default: the local wardrobe.db)",
+    )
+    parser.add_argument(
+        "--target",
+        default=DATABASE_URL,
+        help="Target database URL (default: $DATABASE_URL)",
+    )
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    summary = migrate(args.source, args.target, batch_size=args.batch_size)
+    logger.info("Migration complete: %s", summary)
+
+
+if __name__ == "__main__":
+    main()
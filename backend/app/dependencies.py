@@ -40,6 +40,21 @@ def get_registry_model_name() -> str:
     return os.environ.get("MLFLOW_MODEL_NAME", "wardrobe-compatibility")
 
 
+@lru_cache()
+def get_student_model_name() -> str:
+    """Registry name of the distilled student compatibility model (ml.distill)."""
+    return os.environ.get("MLFLOW_STUDENT_MODEL_NAME", "wardrobe-compatibility-student")
+
+
+@lru_cache()
+def get_model_variant() -> str:
+    """
+    Which compatibility model the API serves: "teacher" (the full
+    MobileNetV2 Siamese network) or "student" (the distilled small model).
+    """
+    return os.environ.get("COMPATIBILITY_MODEL", "teacher").lower()
+
+
 @lru_cache()
 def get_registry_stage() -> str:
     """
@@ -1,10 +1,10 @@
 # app/detector.py
 from ultralytics import YOLO
 from PIL import Image
-import io
 import numpy as np
 import os
 import logging
+from .ingest import open_image
 
 logger = logging.getLogger(__name__)
 
@@ -36,62 +36,92 @@ def _get_yolo_model():
 def classify_image_bytes(image_bytes, topk=1):
     """
     Returns list of predictions: [{"class_name": str, "confidence": float}]
+    `image_bytes` may also be a binary file handle (e.g. an ingested upload).
     Compatible with older Ultralytics YOLO where Probs has no .topk().
     """
     # Load image
     try:
-        img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+        img = open_image(image_bytes).convert("RGB")
     except Exception as e:
         return [{"class_name": "corrupt_image", "confidence": 0.0, "reason": str(e)}]
 
     try:
         model = _get_yolo_model()
         results = model.predict(img, save=False, verbose=False)
-        r = results[0]
-
-        # ------------------------------
-        # CASE A — Classification Output
-        # ------------------------------
-        if hasattr(r, "probs") and r.probs is not None:
-            probs = r.probs
-
-            # If topk == 1 → Use top1
-            if topk == 1:
-                idx = int(probs.top1)
-                conf = float(probs.top1conf)
-                return [{
-                    "class_name": model.names[idx],
-                    "confidence": conf
-                }]
-
-            # If topk > 1 → Use top5
-            indices = probs.top5[:topk]
-            confs = probs.top5conf[:topk]
-
-            preds = []
-            for idx, conf in zip(indices, confs):
-                preds.append({
-                    "class_name": model.names[int(idx)],
-                    "confidence": float(conf)
-                })
-            return preds
-
-        # ------------------------------
-        # CASE B — Detection fallback
-        # ------------------------------
-        if hasattr(r, "boxes") and r.boxes is not None and len(r.boxes) > 0:
-            preds = []
-            for b in r.boxes:
-                cls_id = int(b.cls)
-                preds.append({
-                    "class_name": model.names[cls_id],
-                    "confidence": float(b.conf)
-                })
-            preds = sorted(preds, key=lambda x: x["confidence"], reverse=True)
-            return preds[:topk]
-
-        return [{"class_name": "unknown", "confidence": 0.0, "reason": "no classes available"}]
+        return _predictions_from_result(results[0], model, topk)
 
     except Exception as e:
         return [{"class_name": "unknown", "confidence": 0.0, "reason": str(e)}]
 
+
+def classify_image_batch(images, topk=1):
+    """
+    Classify several images with a single YOLO predict call.
+    `images` may hold bytes, file handles or PIL images; returns one
+    prediction list per input, in order.
+    """
+    out = [None] * len(images)
+    loaded = []
+    for i, src in enumerate(images):
+        try:
+            img = src if isinstance(src, Image.Image) else open_image(src)
+            loaded.append((i, img.convert("RGB")))
+        except Exception as e:
+            out[i] = [{"class_name": "corrupt_image", "confidence": 0.0, "reason": str(e)}]
+
+    if loaded:
+        try:
+            model = _get_yolo_model()
+            results = model.predict([img for _, img in loaded], save=False, verbose=False)
+            for (i, _), r in zip(loaded, results):
+                out[i] = _predictions_from_result(r, model, topk)
+        except Exception as e:
+            for i, _ in loaded:
+                out[i] = [{"class_name": "unknown", "confidence": 0.0, "reason": str(e)}]
+    return out
+
+
+def _predictions_from_result(r, model, topk):
+    """Convert one Ultralytics result into our prediction dicts."""
+    # ------------------------------
+    # CASE A — Classification Output
+    # ------------------------------
+    if hasattr(r, "probs") and r.probs is not None:
+        probs = r.probs
+
+        # If topk == 1 → Use top1
+        if topk == 1:
+            idx = int(probs.top1)
+            conf = float(probs.top1conf)
+            return [{
+                "class_name": model.names[idx],
+                "confidence": conf
+            }]
+
+        # If topk > 1 → Use top5
+        indices = probs.top5[:topk]
+        confs = probs.top5conf[:topk]
+
+        preds = []
+        for idx, conf in zip(indices, confs):
+            preds.append({
+                "class_name": model.names[int(idx)],
+                "confidence": float(conf)
+            })
+        return preds
+
+    # ------------------------------
+    # CASE B — Detection fallback
+    # ------------------------------
+    if hasattr(r, "boxes") and r.boxes is not None and len(r.boxes) > 0:
+        preds = []
+        for b in r.boxes:
+            cls_id = int(b.cls)
+            preds.append({
+                "class_name": model.names[cls_id],
+                "confidence": float(b.conf)
+            })
+        preds = sorted(preds, key=lambda x: x["confidence"], reverse=True)
+        return preds[:topk]
+
+    return [{"class_name": "unknown", "confidence": 0.0, "reason": "no classes available"}]
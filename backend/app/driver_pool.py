@@ -0,0 +1,157 @@
+# app/driver_pool.py
+"""
+Bounded pool of reusable Selenium WebDrivers.
+
+Starting Chrome costs seconds, navigating an already running one costs a
+page load, so scrapers check a driver out, use it for one page and return
+it. Drivers are health-checked on checkout and recycled after
+`max_pages` pages or as soon as they raise a WebDriverException (crashed
+renderer, dead session), so one bad browser never poisons the pool.
+"""
+from contextlib import contextmanager
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from selenium.common.exceptions import WebDriverException
+
+logger = logging.getLogger(__name__)
+
+
+class DriverUnavailable(RuntimeError):
+    """Raised when no driver could be checked out (start failure or timeout)."""
+
+
+class DriverPool:
+    def __init__(self, factory: Callable[[], object], size: int = 2, max_pages: int = 50):
+        self.factory = factory
+        self.size = max(1, size)
+        self.max_pages = max_pages
+        self._idle: List[object] = []  # LIFO: the most recently used driver has warm caches
+        self._pages: Dict[int, int] = {}
+        self._cond = threading.Condition()
+        self._live = 0
+        self._closed = False
+        self.stats = {"created": 0, "recycled": 0, "crashed": 0, "unhealthy": 0, "checkouts": 0}
+
+    def _create(self):
+        """Start a driver for a slot already reserved in `_live`."""
+        start = time.perf_counter()
+        try:
+            driver = self.factory()
+        except Exception as e:
+            logger.error(f"WebDriver factory failed: {e}")
+            driver = None
+        with self._cond:
+            if driver is None:
+                self._live -= 1
+                self._cond.notify()
+                raise DriverUnavailable("WebDriver could not be started")
+            self._pages[id(driver)] = 0
+            self.stats["created"] += 1
+            live = self._live
+        logger.info(f"Started WebDriver in {time.perf_counter() - start:.1f}s ({live}/{self.size} live)")
+        return driver
+
+    def _discard(self, driver, reason: str) -> None:
+        with self._cond:
+            self._pages.pop(id(driver), None)
+            self._live -= 1
+            self.stats[reason] += 1
+            self._cond.notify()
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.debug(f"Error quitting WebDriver: {e}")
+
+    @staticmethod
+    def _healthy(driver) -> bool:
+        try:
+            driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def warm(self, count: Optional[int] = None) -> int:
+        """Start up to `count` (default: all) drivers now; returns how many were started."""
+        started = 0
+        for _ in range(self.size if count is None else min(count, self.size)):
+            with self._cond:
+                if self._closed or self._live >= self.size:
+                    break
+                self._live += 1
+            try:
+                driver = self._create()
+            except DriverUnavailable as e:
+                logger.error(f"Failed to warm WebDriver pool: {e}")
+                break
+            self.checkin(driver, used=False)
+            started += 1
+        return started
+
+    def checkout(self, timeout: float = 60.0):
+        """Borrow a healthy driver, starting one if the pool is below its size."""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise DriverUnavailable("Driver pool is closed")
+                    if self._idle:
+                        driver = self._idle.pop()
+                        break
+                    if self._live < self.size:
+                        self._live += 1
+                        driver = None
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise DriverUnavailable(f"No WebDriver available within {timeout}s")
+                    self._cond.wait(remaining)
+
+            if driver is None:
+                driver = self._create()
+            elif not self._healthy(driver):
+                self._discard(driver, "unhealthy")
+                continue
+            with self._cond:
+                self.stats["checkouts"] += 1
+            return driver
+
+    def checkin(self, driver, broken: bool = False, used: bool = True) -> None:
+        """Return a driver after one page; crashed or worn-out drivers are replaced."""
+        with self._cond:
+            pages = self._pages.get(id(driver), 0) + (1 if used else 0)
+            self._pages[id(driver)] = pages
+            keep = not (broken or self._closed or pages >= self.max_pages)
+            if keep:
+                self._idle.append(driver)
+                self._cond.notify()
+                return
+        self._discard(driver, "crashed" if broken else "recycled")
+
+    @contextmanager
+    def driver(self, timeout: float = 60.0):
+        """`with pool.driver() as d:` checkout/checkin; WebDriver errors discard the driver."""
+        driver = self.checkout(timeout)
+        broken = False
+        try:
+            yield driver
+        except WebDriverException:
+            broken = True
+            raise
+        finally:
+            self.checkin(driver, broken=broken)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for driver in idle:
+            self._discard(driver, "recycled")
+
+    def snapshot(self) -> Dict:
+        with self._cond:
+            return {**self.stats, "live": self._live, "idle": len(self._idle), "size": self.size}
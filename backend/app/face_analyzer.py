@@ -1,11 +1,35 @@
 # app/face_analyzer.py
 import cv2
+import hashlib
 import numpy as np
 from sklearn.cluster import KMeans
 from collections import Counter
-import io
-from PIL import Image
 import os
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from .analysis_cache import AnalysisCache
+from .ingest import open_image
+
+logger = logging.getLogger(__name__)
+
+CASCADE_PATH = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+# Number of cascade instances available for concurrent detection
+FACE_ANALYZER_POOL_SIZE = int(os.environ.get("FACE_ANALYZER_POOL_SIZE", "4"))
+# Longest side of the downscaled copy used for face detection (0 = detect at full resolution)
+FACE_DETECT_MAX_SIDE = int(os.environ.get("FACE_DETECT_MAX_SIDE", "640"))
+# Extra context kept around the detected face when cropping at full resolution
+FACE_CROP_MARGIN = 0.25
+# Skin-tone estimator: "histogram" (subsampled LAB mode) or "kmeans" (legacy)
+SKIN_TONE_METHOD = os.environ.get("SKIN_TONE_METHOD", "histogram")
+# Maximum number of skin pixels the histogram estimator looks at
+SKIN_SAMPLE_BUDGET = int(os.environ.get("SKIN_SAMPLE_BUDGET", "4096"))
+# Analysis results remembered per image hash (0 disables the in-process LRU)
+FACE_CACHE_SIZE = int(os.environ.get("FACE_CACHE_SIZE", "256"))
+# Optional directory for a persistent, cross-worker copy of the cache
+FACE_CACHE_DIR = os.environ.get("FACE_CACHE_DIR") or None
 
 try:
     import dlib
@@ -15,13 +39,33 @@ except ImportError:
     print("Warning: Dlib not available. Using basic face shape detection.")
 
 
+def _rss_bytes():
+    """Resident set size of this process, or None where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
 class FaceAnalyzer:
-    def __init__(self):
-        """Initialize face analyzer with detection models"""
-        # Load face detector
-        self.face_cascade = cv2.CascadeClassifier(
-            cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-        )
+    def __init__(self, pool_size: int = 1):
+        """
+        Initialize face analyzer with detection models.
+        `pool_size` cascade instances are created so that up to that many
+        threads can run detection concurrently; the dlib predictor is
+        read-only at inference time and is shared.
+        """
+        start = time.perf_counter()
+        rss_before = _rss_bytes()
+
+        # Load face detectors
+        self._cascades = queue.Queue()
+        for _ in range(max(1, pool_size)):
+            cascade = cv2.CascadeClassifier(CASCADE_PATH)
+            if cascade.empty():
+                raise RuntimeError(f"Failed to load Haar cascade from {CASCADE_PATH}")
+            self._cascades.put(cascade)
         
         # Try to load dlib shape predictor
         self.use_dlib = False
@@ -47,29 +91,94 @@ class FaceAnalyzer:
                     self.use_dlib = True
             except Exception as e:
                 print(f"Warning: Could not load dlib predictor: {e}")
+
+        rss_after = _rss_bytes()
+        self.load_stats = {
+            'load_seconds': round(time.perf_counter() - start, 4),
+            'cascade_instances': max(1, pool_size),
+            'dlib_loaded': self.use_dlib,
+            'rss_delta_bytes': (rss_after - rss_before) if rss_before is not None and rss_after is not None else None,
+        }
+        logger.info(f"FaceAnalyzer loaded: {self.load_stats}")
+
+    @contextmanager
+    def _cascade(self):
+        """Borrow a cascade from the pool for the duration of one detection."""
+        cascade = self._cascades.get()
+        try:
+            yield cascade
+        finally:
+            self._cascades.put(cascade)
     
     def load_image_from_bytes(self, image_bytes):
-        """Load image from bytes"""
-        img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+        """Load image from bytes or a binary file handle"""
+        img = open_image(image_bytes).convert("RGB")
         # Convert PIL to OpenCV format
         img_array = np.array(img)
         img_bgr = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
         return img_bgr
     
+    def _detect_largest(self, gray):
+        """Run the cascade on a grayscale image; returns the largest face or None"""
+        with self._cascade() as cascade:
+            faces = cascade.detectMultiScale(gray, 1.3, 5)
+        if len(faces) == 0:
+            return None
+        return max(faces, key=lambda x: x[2] * x[3])
+    
     def detect_face(self, img):
         """Detect face in image"""
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
+        face = self._detect_largest(gray)
         
-        if len(faces) == 0:
+        if face is None:
             raise ValueError("No face detected in the image")
         
-        # Get largest face
-        face = max(faces, key=lambda x: x[2] * x[3])
         return face
     
-    def calculate_skin_tone(self, img, face):
-        """Calculate skin tone from face region"""
+    def locate_face(self, image_bytes, max_side=FACE_DETECT_MAX_SIDE):
+        """
+        Coarse-to-fine face localisation.
+        Detects on a copy decoded at reduced size (JPEG draft mode) and
+        scaled to `max_side`, maps the box back to full resolution and
+        returns (face_crop_bgr, face_in_crop, (offset_x, offset_y)) where the
+        crop is the full-resolution face region plus a margin.
+        """
+        src = open_image(image_bytes)
+        full_w, full_h = src.size
+        if max_side <= 0 or max(full_w, full_h) <= max_side:
+            img = self.load_image_from_bytes(image_bytes)
+            return img, self.detect_face(img), (0, 0)
+        
+        # Let the JPEG decoder skip most of the work, then finish with a resize
+        src.draft("RGB", (max_side, max_side))
+        small = src.convert("RGB")
+        small.thumbnail((max_side, max_side))
+        gray = cv2.cvtColor(np.array(small), cv2.COLOR_RGB2GRAY)
+        face = self._detect_largest(gray)
+        if face is None:
+            # Small faces can vanish when downscaling; fall back to full resolution
+            img = self.load_image_from_bytes(image_bytes)
+            return img, self.detect_face(img), (0, 0)
+        
+        sx, sy = full_w / small.width, full_h / small.height
+        x, y, w, h = face
+        fx, fy = int(round(x * sx)), int(round(y * sy))
+        fw, fh = int(round(w * sx)), int(round(h * sy))
+        
+        mx, my = int(fw * FACE_CROP_MARGIN), int(fh * FACE_CROP_MARGIN)
+        left, top = max(0, fx - mx), max(0, fy - my)
+        right, bottom = min(full_w, fx + fw + mx), min(full_h, fy + fh + my)
+        crop = open_image(image_bytes).crop((left, top, right, bottom)).convert("RGB")
+        crop_bgr = cv2.cvtColor(np.array(crop), cv2.COLOR_RGB2BGR)
+        return crop_bgr, (fx - left, fy - top, fw, fh), (left, top)
+    
+    def calculate_skin_tone(self, img, face, method=None, with_confidence=False):
+        """
+        Calculate skin tone from face region.
+        `method` overrides SKIN_TONE_METHOD; with `with_confidence` the
+        result also carries a 0-1 'confidence' score.
+        """
         x, y, w, h = face
         
         # Extract face region with some margin
@@ -106,38 +215,73 @@ class FaceAnalyzer:
         if len(skin_pixels) == 0:
             raise ValueError("Could not extract skin pixels")
         
-        # Use KMeans to find dominant color
-        n_clusters = min(3, len(skin_pixels))
-        if n_clusters < 1:
-            raise ValueError("Not enough skin pixels for analysis")
-            
-        kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-        kmeans.fit(skin_pixels)
-        
-        # Get the most common cluster
-        labels = kmeans.labels_
-        most_common = Counter(labels).most_common(1)[0][0]
-        dominant_color = kmeans.cluster_centers_[most_common]
+        method = method or SKIN_TONE_METHOD
+        if method == 'kmeans':
+            dominant_color, confidence = self._dominant_color_kmeans(skin_pixels)
+        else:
+            dominant_color, confidence = self._dominant_color_histogram(skin_pixels)
         
         # Convert BGR to RGB
-        dominant_color = dominant_color[::-1]
-        
-        # Calculate skin tone metrics
-        r, g, b = dominant_color
+        result = self.describe_skin_color(dominant_color[::-1])
+        if with_confidence:
+            result['confidence'] = round(float(confidence), 4)
+        return result
+    
+    def describe_skin_color(self, rgb):
+        """Skin tone metrics (luminance, undertone, category) for an RGB colour"""
+        r, g, b = rgb
         
         # ITU-R BT.601 luminance
         luminance = 0.299 * r + 0.587 * g + 0.114 * b
         
         # Calculate undertone (warmer vs cooler)
-        undertone = (r - b) / 255.0 if 255 > 0 else 0  # Positive = warm, Negative = cool
+        undertone = (r - b) / 255.0  # Positive = warm, Negative = cool
         
         return {
-            'rgb': [float(x) for x in dominant_color],
+            'rgb': [float(x) for x in rgb],
             'luminance': float(luminance),
             'undertone': float(undertone),
             'category': self._categorize_skin_tone(luminance)
         }
     
+    def _dominant_color_kmeans(self, skin_pixels):
+        """Legacy estimator: centre of the largest of 3 KMeans clusters (BGR)"""
+        n_clusters = min(3, len(skin_pixels))
+        if n_clusters < 1:
+            raise ValueError("Not enough skin pixels for analysis")
+            
+        kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
+        kmeans.fit(skin_pixels)
+        
+        # Get the most common cluster
+        labels = kmeans.labels_
+        most_common, count = Counter(labels).most_common(1)[0]
+        return kmeans.cluster_centers_[most_common], count / len(labels)
+    
+    def _dominant_color_histogram(self, skin_pixels, budget=None):
+        """
+        Fast estimator (BGR): subsample to a fixed budget, find the densest
+        cell of a coarse LAB histogram and take the per-channel median of
+        the pixels in and around it. Confidence is the share of samples
+        that fall in that neighbourhood.
+        """
+        budget = budget or SKIN_SAMPLE_BUDGET
+        pixels = np.asarray(skin_pixels, dtype=np.uint8).reshape(-1, 3)
+        if len(pixels) > budget:
+            # Fixed seed keeps results reproducible for the same image
+            idx = np.random.default_rng(0).integers(0, len(pixels), budget)
+            pixels = pixels[idx]
+        
+        lab = cv2.cvtColor(pixels.reshape(-1, 1, 3), cv2.COLOR_BGR2LAB).reshape(-1, 3)
+        cells = (lab // 16).astype(np.int32)  # 16 bins per channel
+        keys = cells[:, 0] * 256 + cells[:, 1] * 16 + cells[:, 2]
+        mode = int(np.bincount(keys, minlength=4096).argmax())
+        mode_cell = np.array([mode // 256, (mode // 16) % 16, mode % 16])
+        
+        near = np.all(np.abs(cells - mode_cell) <= 1, axis=1)
+        dominant = np.median(pixels[near].astype(float), axis=0)
+        return dominant, near.mean()
+    
     def _categorize_skin_tone(self, luminance):
         """Categorize skin tone based on luminance"""
         if luminance < 100:
@@ -221,10 +365,13 @@ class FaceAnalyzer:
             else:
                 return 'long'
     
-    def analyze_face(self, image_bytes):
-        """Complete face analysis pipeline"""
-        img = self.load_image_from_bytes(image_bytes)
-        face = self.detect_face(img)
+    def analyze_face(self, image_bytes, max_side=FACE_DETECT_MAX_SIDE):
+        """
+        Complete face analysis pipeline.
+        Skin tone and landmarks only look at the full-resolution face crop;
+        pass max_side=0 to detect on the full image instead.
+        """
+        img, face, (ox, oy) = self.locate_face(image_bytes, max_side=max_side)
         skin_tone = self.calculate_skin_tone(img, face)
         face_shape = self.calculate_face_shape(img, face)
         
@@ -232,14 +379,56 @@ class FaceAnalyzer:
             'skin_tone': skin_tone,
             'face_shape': face_shape,
             'face_bbox': {
-                'x': int(face[0]),
-                'y': int(face[1]),
+                'x': int(face[0]) + ox,
+                'y': int(face[1]) + oy,
                 'w': int(face[2]),
                 'h': int(face[3])
             }
         }
 
 
+# Process-wide analyzer (lazy loaded, shared by all requests)
+_analyzer_instance = None
+_analyzer_lock = threading.Lock()
+
+
+def get_face_analyzer() -> FaceAnalyzer:
+    """
+    Get or create the shared FaceAnalyzer so the cascade and the dlib
+    predictor are read from disk once per process instead of per request.
+    """
+    global _analyzer_instance
+    if _analyzer_instance is None:
+        with _analyzer_lock:
+            if _analyzer_instance is None:
+                _analyzer_instance = FaceAnalyzer(pool_size=FACE_ANALYZER_POOL_SIZE)
+    return _analyzer_instance
+
+
+analysis_cache = AnalysisCache(max_entries=FACE_CACHE_SIZE, cache_dir=FACE_CACHE_DIR)
+
+
+def analyze_face_cached(image, sha256=None, max_side=FACE_DETECT_MAX_SIDE):
+    """
+    `FaceAnalyzer.analyze_face` through the content-hash cache.
+    `sha256` is the hex digest of the image bytes (ingest already has it);
+    it is computed here when omitted. The key also records the settings
+    that change the result, so switching estimator or detector invalidates it.
+    """
+    if sha256 is None:
+        if hasattr(image, "read"):
+            image.seek(0)
+            digest = hashlib.sha256()
+            for chunk in iter(lambda: image.read(256 * 1024), b""):
+                digest.update(chunk)
+            sha256 = digest.hexdigest()
+        else:
+            sha256 = hashlib.sha256(image).hexdigest()
+    analyzer = get_face_analyzer()
+    key = f"{sha256}-{max_side}-{SKIN_TONE_METHOD}-{SKIN_SAMPLE_BUDGET}-{'dlib' if analyzer.use_dlib else 'basic'}"
+    return analysis_cache.get_or_compute(key, lambda: analyzer.analyze_face(image, max_side=max_side))
+
+
 class ClothingRecommender:
     def __init__(self):
         """Initialize clothing recommender with wardrobe"""
@@ -336,9 +525,48 @@ class ClothingRecommender:
                 'accessories': ['medium length necklaces']
             }
         }
+        
+        # (tone category, undertone type, face shape) -> ranked wardrobe list
+        self._rankings = {}
+        self._rankings_lock = threading.Lock()
+    
+    @staticmethod
+    def profile_key(skin_tone, face_shape):
+        """The only inputs the ranking depends on: (category, 'warm'/'cool', face shape)."""
+        undertone_type = 'warm' if skin_tone['undertone'] > 0 else 'cool'
+        return (skin_tone['category'], undertone_type, face_shape)
+    
+    def precompute(self):
+        """
+        Rank the wardrobe for every skin tone category x undertone x face
+        shape up front so recommend_clothing is a dictionary lookup.
+        """
+        rankings = {}
+        for category in self.color_recommendations:
+            for undertone_type, undertone in (('warm', 1.0), ('cool', -1.0)):
+                for face_shape in self.face_shape_styles:
+                    skin_tone = {'category': category, 'undertone': undertone}
+                    rankings[(category, undertone_type, face_shape)] = self._rank(skin_tone, face_shape)
+        with self._rankings_lock:
+            self._rankings.update(rankings)
+        return len(rankings)
     
     def recommend_clothing(self, skin_tone, face_shape):
-        """Generate clothing recommendations with ratings"""
+        """
+        Generate clothing recommendations with ratings.
+        Served from the precomputed table; combinations outside it are
+        ranked on first use and remembered. The returned list is shared,
+        so callers must not modify it.
+        """
+        key = self.profile_key(skin_tone, face_shape)
+        ranking = self._rankings.get(key)
+        if ranking is None:
+            ranking = self._rank(skin_tone, face_shape)
+            with self._rankings_lock:
+                self._rankings[key] = ranking
+        return ranking
+    
+    def _rank(self, skin_tone, face_shape):
         recommendations = {}
         
         for item, thickness in self.wardrobe.items():
@@ -424,3 +652,18 @@ class ClothingRecommender:
         
         return recommendations
 
+
+_recommender_instance = None
+_recommender_lock = threading.Lock()
+
+
+def get_clothing_recommender() -> ClothingRecommender:
+    """Process-wide recommender with its ranking table already built."""
+    global _recommender_instance
+    if _recommender_instance is None:
+        with _recommender_lock:
+            if _recommender_instance is None:
+                recommender = ClothingRecommender()
+                recommender.precompute()
+                _recommender_instance = recommender
+    return _recommender_instance
@@ -0,0 +1,199 @@
+# app/face_stream.py
+"""
+Incremental face analysis over a stream of frames (live "mirror" mode).
+
+Running the whole analyze_face pipeline on every frame is far too slow for
+video, so a FaceStreamSession:
+
+* runs the Haar cascade on a downscaled frame only every `detect_every`
+  frames (or when tracking is lost),
+* follows the face box in between with normalised template matching in a
+  small search window around the previous position,
+* folds each frame's skin colour into an exponential moving average and
+  takes a majority vote over recent face-shape estimates,
+* reports a new state only when something the client shows has changed.
+"""
+from collections import Counter, deque
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .face_analyzer import FaceAnalyzer
+
+# Full detection every N frames; frames in between are tracked
+FACE_STREAM_DETECT_EVERY = int(os.environ.get("FACE_STREAM_DETECT_EVERY", "5"))
+# Longest side frames are scaled to before running the cascade
+FACE_STREAM_DETECT_SIDE = int(os.environ.get("FACE_STREAM_DETECT_SIDE", "320"))
+# Weight of the newest frame in the running skin-colour average
+FACE_STREAM_SMOOTHING = float(os.environ.get("FACE_STREAM_SMOOTHING", "0.2"))
+# Template-match score below which the tracker is considered lost
+TRACK_MIN_SCORE = 0.5
+# Face width (pixels) templates are scaled to before matching
+TRACK_TEMPLATE_WIDTH = 48
+# Number of recent face-shape estimates in the vote
+SHAPE_WINDOW = 9
+
+Box = Tuple[int, int, int, int]
+
+
+def decode_frame(data: bytes) -> np.ndarray:
+    """Decode one encoded (JPEG/PNG/WebP) frame to BGR."""
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("Could not decode frame")
+    return img
+
+
+class FaceStreamSession:
+    """Per-connection tracking and smoothing state."""
+
+    def __init__(
+        self,
+        analyzer: FaceAnalyzer,
+        detect_every: int = FACE_STREAM_DETECT_EVERY,
+        detect_side: int = FACE_STREAM_DETECT_SIDE,
+        smoothing: float = FACE_STREAM_SMOOTHING,
+    ):
+        self.analyzer = analyzer
+        self.detect_every = max(1, detect_every)
+        self.detect_side = detect_side
+        self.smoothing = smoothing
+
+        self.frame_index = -1
+        self.box: Optional[Box] = None
+        self._template = None
+        self._scale = 1.0
+        self._since_detect = 0
+        self._rgb = None
+        self._shapes = deque(maxlen=SHAPE_WINDOW)
+        self._last_sent = None
+        self.stats = {"frames": 0, "detections": 0, "tracked": 0, "lost": 0}
+
+    def _detect(self, img, gray) -> Optional[Box]:
+        self.stats["detections"] += 1
+        self._since_detect = 0
+        h, w = gray.shape
+        scale = min(1.0, self.detect_side / max(h, w)) if self.detect_side > 0 else 1.0
+        small = cv2.resize(gray, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA) if scale < 1.0 else gray
+        face = self.analyzer._detect_largest(small)
+        if face is None:
+            return None
+        x, y, fw, fh = (int(round(v / scale)) for v in face)
+        box = (x, y, min(fw, w - x), min(fh, h - y))
+        self._set_template(gray, box)
+        # Landmarks/ratios are only re-estimated on detection frames
+        self._shapes.append(self.analyzer.calculate_face_shape(img, box))
+        return box
+
+    def _set_template(self, gray, box: Box) -> None:
+        x, y, w, h = box
+        self._scale = TRACK_TEMPLATE_WIDTH / max(w, 1)
+        patch = gray[y:y + h, x:x + w]
+        self._template = cv2.resize(patch, None, fx=self._scale, fy=self._scale, interpolation=cv2.INTER_AREA)
+
+    def _track(self, gray) -> Optional[Box]:
+        """Find the previous face template in a window around the last box."""
+        x, y, w, h = self.box
+        img_h, img_w = gray.shape
+        pad_x, pad_y = w // 2, h // 2
+        x0, y0 = max(0, x - pad_x), max(0, y - pad_y)
+        x1, y1 = min(img_w, x + w + pad_x), min(img_h, y + h + pad_y)
+        window = cv2.resize(gray[y0:y1, x0:x1], None, fx=self._scale, fy=self._scale, interpolation=cv2.INTER_AREA)
+        th, tw = self._template.shape
+        if window.shape[0] < th or window.shape[1] < tw:
+            return None
+        scores = cv2.matchTemplate(window, self._template, cv2.TM_CCOEFF_NORMED)
+        _, best, _, (bx, by) = cv2.minMaxLoc(scores)
+        if best < TRACK_MIN_SCORE:
+            return None
+        nx, ny = x0 + int(round(bx / self._scale)), y0 + int(round(by / self._scale))
+        return (nx, ny, min(w, img_w - nx), min(h, img_h - ny))
+
+    def _update_skin(self, img, box: Box) -> Optional[Dict]:
+        try:
+            tone = self.analyzer.calculate_skin_tone(img, box)
+        except ValueError:
+            return None if self._rgb is None else self.analyzer.describe_skin_color(self._rgb)
+        rgb = np.array(tone['rgb'])
+        if self._rgb is None:
+            self._rgb = rgb
+        else:
+            self._rgb = (1 - self.smoothing) * self._rgb + self.smoothing * rgb
+        return self.analyzer.describe_skin_color(self._rgb)
+
+    def _changed(self, state: Dict) -> bool:
+        last = self._last_sent
+        if last is None or (last["face_bbox"] is None) != (state["face_bbox"] is None):
+            return True
+        if state["face_bbox"] is None:
+            return False
+        if state["face_shape"] != last["face_shape"]:
+            return True
+        new_tone, old_tone = state["skin_tone"], last["skin_tone"]
+        if (new_tone is None) != (old_tone is None):
+            return True
+        if new_tone is not None and (
+            new_tone["category"] != old_tone["category"]
+            or (new_tone["undertone"] > 0) != (old_tone["undertone"] > 0)
+        ):
+            return True
+        # Re-send when the box moved or resized by more than 10% of its width
+        nb, ob = state["face_bbox"], last["face_bbox"]
+        tolerance = 0.1 * ob["w"]
+        return any(abs(nb[k] - ob[k]) > tolerance for k in ("x", "y", "w", "h"))
+
+    def process_frame(self, data: bytes) -> Optional[Dict]:
+        """
+        Analyse one encoded frame. Returns the new state when it differs from
+        the last one reported, otherwise None.
+        """
+        start = time.perf_counter()
+        img = decode_frame(data)
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        self.frame_index += 1
+        self.stats["frames"] += 1
+        self._since_detect += 1
+
+        due = self.box is None or self._since_detect >= self.detect_every
+        box = None if due else self._track(gray)
+        mode = "tracked"
+        if box is None:
+            mode = "detected"
+            box = self._detect(img, gray)
+            if box is None and due and self.box is not None:
+                # The cascade misses now and then; keep following the face
+                mode = "tracked"
+                box = self._track(gray)
+        if box is not None and mode == "tracked":
+            self.stats["tracked"] += 1
+
+        if box is None:
+            if self.box is not None:
+                self.stats["lost"] += 1
+            self.box = None
+            self._template = None
+            self._rgb = None
+            self._shapes.clear()
+            state = {"face_bbox": None, "skin_tone": None, "face_shape": None}
+        else:
+            self.box = box
+            shape = Counter(self._shapes).most_common(1)[0][0] if self._shapes else None
+            state = {
+                "face_bbox": {"x": box[0], "y": box[1], "w": box[2], "h": box[3]},
+                "skin_tone": self._update_skin(img, box),
+                "face_shape": shape,
+            }
+
+        if not self._changed(state):
+            return None
+        self._last_sent = state
+        return {
+            **state,
+            "frame": self.frame_index,
+            "mode": mode,
+            "processing_ms": round((time.perf_counter() - start) * 1000, 2),
+            "stats": dict(self.stats),
+        }
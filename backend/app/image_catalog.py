@@ -0,0 +1,165 @@
+# app/image_catalog.py
+"""
+In-memory index of the static display images (clothes/test and any extra
+configured roots).
+
+The catalog is built once at startup with per-file metadata (size, mtime,
+dimensions, ETag) so listing and serving never hit os.listdir/os.path.exists
+on the request path. Each category directory is re-checked at most every
+`check_interval` seconds by comparing its mtime, and rebuilt only if it changed
+(so files should be replaced by rename rather than overwritten in place).
+"""
+from PIL import Image
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif')
+MEDIA_TYPES = {'.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.png': 'image/png', '.gif': 'image/gif'}
+
+
+class CatalogEntry:
+    __slots__ = ("name", "path", "stat", "size", "mtime_ns", "width", "height", "etag", "media_type")
+
+    def __init__(self, name: str, path: str, st: os.stat_result):
+        self.name = name
+        self.path = path
+        self.stat = st
+        self.size = st.st_size
+        self.mtime_ns = st.st_mtime_ns
+        self.etag = f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+        self.media_type = MEDIA_TYPES.get(os.path.splitext(name)[1].lower(), "application/octet-stream")
+        try:
+            with Image.open(path) as img:  # header only, no decode
+                self.width, self.height = img.size
+        except Exception:
+            self.width = self.height = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "size": self.size,
+            "width": self.width,
+            "height": self.height,
+            "etag": self.etag,
+        }
+
+
+class _Category:
+    def __init__(self, path: str, dir_mtime_ns: int, entries: List[CatalogEntry]):
+        self.path = path
+        self.dir_mtime_ns = dir_mtime_ns
+        self.entries = entries
+        self.by_name = {e.name: e for e in entries}
+        self.checked_at = time.monotonic()
+        digest = hashlib.sha1(f"{path}:{dir_mtime_ns}:{len(entries)}".encode()).hexdigest()
+        self.etag = f'"{digest[:20]}"'
+
+
+class ImageCatalog:
+    def __init__(self, roots: List[str], check_interval: float = 5.0):
+        self.roots = [os.path.abspath(r) for r in roots]
+        self.check_interval = check_interval
+        self._categories: Dict[str, _Category] = {}
+        # category name -> monotonic time of the last failed on-disk lookup
+        self._misses: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def build(self) -> None:
+        """Scan every root once; the first root wins when category names collide."""
+        categories = {}
+        for root in self.roots:
+            if not os.path.isdir(root):
+                logger.warning(f"Display image root does not exist: {root}")
+                continue
+            for name in sorted(os.listdir(root)):
+                path = os.path.join(root, name)
+                if name not in categories and os.path.isdir(path):
+                    categories[name] = self._scan(path)
+        with self._lock:
+            self._categories = categories
+        logger.info(
+            f"Display image catalog: {len(categories)} categories, "
+            f"{sum(len(c.entries) for c in categories.values())} images"
+        )
+
+    def _scan(self, path: str) -> _Category:
+        dir_mtime_ns = os.stat(path).st_mtime_ns
+        entries = []
+        for name in sorted(os.listdir(path)):
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            file_path = os.path.join(path, name)
+            try:
+                entries.append(CatalogEntry(name, file_path, os.stat(file_path)))
+            except OSError:
+                continue
+        return _Category(path, dir_mtime_ns, entries)
+
+    def _find_new_category(self, category: str) -> Optional[_Category]:
+        # Only direct children of a root are categories
+        if category in ("", ".", "..") or os.path.basename(category) != category or (os.altsep and os.altsep in category):
+            return None
+        for root in self.roots:
+            path = os.path.join(root, category)
+            if os.path.isdir(path):
+                return self._scan(path)
+        return None
+
+    def get_category(self, category: str) -> Optional[_Category]:
+        """Return the (possibly refreshed) index for `category`, or None if unknown."""
+        with self._lock:
+            cat = self._categories.get(category)
+        now = time.monotonic()
+        if cat is not None and now - cat.checked_at < self.check_interval:
+            return cat
+
+        if cat is None:
+            # Unknown categories are only looked up on disk once per interval
+            with self._lock:
+                last_miss = self._misses.get(category)
+            if last_miss is not None and now - last_miss < self.check_interval:
+                return None
+            fresh = self._find_new_category(category)
+            with self._lock:
+                if fresh is None:
+                    if len(self._misses) > 1024:
+                        self._misses.clear()
+                    self._misses[category] = now
+                else:
+                    self._misses.pop(category, None)
+                    self._categories[category] = fresh
+            return fresh
+
+        try:
+            dir_mtime_ns = os.stat(cat.path).st_mtime_ns
+        except OSError:
+            with self._lock:
+                self._categories.pop(category, None)
+            return None
+        if dir_mtime_ns != cat.dir_mtime_ns:
+            cat = self._scan(cat.path)
+            with self._lock:
+                self._categories[category] = cat
+        else:
+            cat.checked_at = now
+        return cat
+
+    def list(self, category: str, offset: int = 0, limit: Optional[int] = None):
+        """Return (category index, page of entries) or (None, []) for unknown categories."""
+        cat = self.get_category(category)
+        if cat is None:
+            return None, []
+        end = None if limit is None else offset + limit
+        return cat, cat.entries[offset:end]
+
+    def lookup(self, category: str, filename: str) -> Optional[CatalogEntry]:
+        cat = self.get_category(category)
+        if cat is None:
+            return None
+        return cat.by_name.get(filename)
@@ -0,0 +1,169 @@
+# app/ingest.py
+"""
+Streaming ingestion of uploaded files.
+
+Uploads are read in fixed-size chunks into a spooled temp file (memory for
+small files, disk beyond UPLOAD_SPOOL_BYTES) while being hashed, so a large
+photo never has to sit in worker memory as one `bytes` object. Size and
+pixel limits are enforced before any full decode happens.
+"""
+from PIL import Image
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+MAX_IMAGE_PIXELS = int(os.environ.get("MAX_IMAGE_PIXELS", str(40_000_000)))
+UPLOAD_SPOOL_BYTES = int(os.environ.get("UPLOAD_SPOOL_BYTES", str(1024 * 1024)))
+CHUNK_SIZE = 256 * 1024
+
+
+class UploadTooLarge(ValueError):
+    """Raised when an upload exceeds the configured byte or pixel limits."""
+
+
+class InvalidImage(ValueError):
+    """Raised when an upload that should be an image cannot be identified."""
+
+
+class IngestedUpload:
+    """An upload that has been streamed to a spooled file and hashed."""
+
+    def __init__(self, file, size: int, sha256: str, filename=None, content_type=None):
+        self.file = file
+        self.size = size
+        self.sha256 = sha256
+        self.filename = filename
+        self.content_type = content_type
+        self.width = None
+        self.height = None
+
+    def stream(self):
+        """Return the underlying file handle rewound to the start."""
+        self.file.seek(0)
+        return self.file
+
+    def save_to(self, path: str) -> None:
+        with open(path, "wb") as f:
+            shutil.copyfileobj(self.stream(), f, CHUNK_SIZE)
+
+    def read_bytes(self) -> bytes:
+        """Escape hatch for consumers that genuinely need a bytes object."""
+        return self.stream().read()
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_image(source) -> Image.Image:
+    """
+    Open an image from bytes, a memoryview/bytearray or a binary file handle.
+    File handles are rewound first so several stages can share one upload.
+    """
+    if hasattr(source, "read"):
+        source.seek(0)
+        return Image.open(source)
+    return Image.open(io.BytesIO(source))
+
+
+def check_image_limits(upload: IngestedUpload, max_pixels: int = MAX_IMAGE_PIXELS) -> None:
+    """Read only the image header and reject oversized or unreadable images."""
+    try:
+        with Image.open(upload.stream()) as img:
+            width, height = img.size
+    except Image.DecompressionBombError as e:
+        # PIL refuses headers far beyond its own pixel limit before we can check ours
+        raise UploadTooLarge(str(e))
+    except Exception as e:
+        raise InvalidImage(f"Uploaded file is not a readable image: {e}")
+    if width * height > max_pixels:
+        raise UploadTooLarge(
+            f"Image is {width}x{height} ({width * height} pixels); limit is {max_pixels} pixels"
+        )
+    upload.width, upload.height = width, height
+
+
+class _Spooler:
+    """Accumulates chunks into a spooled temp file while hashing and size-checking."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.spool = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES)
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise UploadTooLarge(f"Upload exceeds the {self.max_bytes} byte limit")
+        self.digest.update(chunk)
+        self.spool.write(chunk)
+
+    def finish(self, max_pixels: int, check_image: bool, filename=None, content_type=None) -> IngestedUpload:
+        upload = IngestedUpload(
+            self.spool,
+            self.size,
+            self.digest.hexdigest(),
+            filename=filename,
+            content_type=content_type,
+        )
+        if check_image:
+            check_image_limits(upload, max_pixels)
+        upload.stream()
+        return upload
+
+
+async def ingest_upload(
+    file,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+    max_pixels: int = MAX_IMAGE_PIXELS,
+    check_image: bool = True,
+) -> IngestedUpload:
+    """
+    Stream a FastAPI `UploadFile` into a spooled temp file, hashing as we go.
+    Raises UploadTooLarge as soon as `max_bytes` is exceeded, and (when
+    `check_image`) validates dimensions from the header before decoding.
+    """
+    spooler = _Spooler(max_bytes)
+    try:
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            spooler.write(chunk)
+        return spooler.finish(
+            max_pixels,
+            check_image,
+            filename=getattr(file, "filename", None),
+            content_type=getattr(file, "content_type", None),
+        )
+    except Exception:
+        spooler.spool.close()
+        raise
+
+
+def ingest_fileobj(
+    fileobj,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+    max_pixels: int = MAX_IMAGE_PIXELS,
+    check_image: bool = True,
+    filename=None,
+    content_type=None,
+) -> IngestedUpload:
+    """Synchronous counterpart of `ingest_upload` for any readable binary stream (e.g. an S3 body)."""
+    spooler = _Spooler(max_bytes)
+    try:
+        for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b""):
+            spooler.write(chunk)
+        return spooler.finish(max_pixels, check_image, filename=filename, content_type=content_type)
+    except Exception:
+        spooler.spool.close()
+        raise
@@ -1,45 +1,43 @@
 # app/main.py
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Body
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Body, Request, WebSocket, WebSocketDisconnect
 from pydantic import BaseModel
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import os
 from .detector import classify_image_bytes
 from .utils import get_dominant_color, rgb_to_hex, estimate_thickness, get_weather, color_contrast_advice
 from .db import init_db
-from .crud import create_item, list_items, get_item, get_items_by_class_name
-from .face_analyzer import FaceAnalyzer, ClothingRecommender
-from .web_scraper import get_recommendations_for_items
+from .crud import create_item, list_items, get_item, get_items_by_class_name, get_wardrobe_version
+from .face_analyzer import get_face_analyzer, get_clothing_recommender, analyze_face_cached, analysis_cache
+from .face_stream import FaceStreamSession, FACE_STREAM_DETECT_EVERY
+from starlette.concurrency import run_in_threadpool
+import asyncio
+import json
+import threading
+import time
+from . import web_scraper
+from .web_scraper import get_driver_pool, warm_driver_pool
+from .product_catalog import CatalogRefresher, get_product_catalog, submit_refresh
+from .catalog_index import MODES as CATALOG_SEARCH_MODES, get_catalog_index, model_identity
 from .outfit_compatibility import get_model, reload_model_from_registry
+from . import renditions
+from .ingest import ingest_upload, UploadTooLarge
+from .image_catalog import ImageCatalog
 from .dependencies import get_tracking_uri, get_registry_model_name, get_registry_stage
 from typing import Optional, List
 import logging
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-import boto3
+from . import s3_storage
+from .s3_storage import S3_BUCKET, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY
 import os
 import uuid
 from datetime import timedelta
 
 app = FastAPI()
 
-S3_BUCKET = os.environ.get("S3_BUCKET", "my-app-uploads-mlops")
-AWS_REGION = os.environ.get("AWS_REGION", "eu-north-1")
-
-# Read credentials from environment only; never hardcode secrets
-AWS_ACCESS_KEY_ID = os.environ.get("AWS_ACCESS_KEY_ID")
-AWS_SECRET_ACCESS_KEY = os.environ.get("AWS_SECRET_ACCESS_KEY")
-
-try:
-    s3 = boto3.client(
-        "s3",
-        aws_access_key_id=AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-        region_name=AWS_REGION,
-    )
-except Exception:
-    # Client will still be constructed lazily by boto3 on first call; ensure env vars exist
-    s3 = boto3.client("s3", region_name=AWS_REGION)
+# Shared, pooled S3 client (see app/s3_storage.py)
+s3 = s3_storage.get_s3_client()
 
 class PresignResponse(BaseModel):
     url: str
@@ -48,8 +46,10 @@ class PresignResponse(BaseModel):
 
 @app.post("/generate-presigned-url", response_model=PresignResponse)
 def generate_presigned(filename: str, content_type: str = "application/octet-stream", expires_in: int = 3600):
-    # Generate a unique key to avoid collisions
-    key = f"user-uploads/{uuid.uuid4().hex}_{filename}"
+    # Unique, and time-ordered so the ingest worker can list only recent keys
+    key = s3_storage.presigned_upload_key(filename)
+    # The ingest worker relists keys issued within this window, so uploads may not outlive it
+    expires_in = min(expires_in, s3_storage.PRESIGN_MAX_EXPIRES)
     try:
         # Validate required configuration
         if not AWS_ACCESS_KEY_ID or not AWS_SECRET_ACCESS_KEY:
@@ -76,26 +76,23 @@ async def test_upload_s3(file: UploadFile = File(...)):
     return the generated S3 key and public URL (if the bucket/object is public).
     This is a convenience/testing endpoint; for production prefer presigned URLs.
     """
+    upload = await _ingest(file, check_image=False)
     try:
-        contents = await file.read()
         # generate a unique key
         key = f"test-uploads/{uuid.uuid4().hex}_{file.filename}"
 
-        # Upload to S3
-        s3.put_object(
-            Bucket=S3_BUCKET,
-            Key=key,
-            Body=contents,
-            ContentType=(file.content_type or "application/octet-stream"),
-        )
+        # Upload to S3 off the event loop (multipart for large files)
+        await s3_storage.upload_fileobj_async(upload.stream(), key, file.content_type)
 
         # Construct a likely URL; note this assumes standard AWS S3 URL pattern
-        url = f"https://{S3_BUCKET}.s3.{AWS_REGION}.amazonaws.com/{key}"
+        url = s3_storage.public_url(key)
 
         return JSONResponse({"key": key, "url": url})
     except Exception as e:
         logger.exception("S3 upload failed")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        upload.close()
 
 # Example health
 @app.get("/health")
@@ -111,9 +108,41 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 # Display images directory (for wardrobe display)
 DISPLAY_IMAGES_DIR = os.path.join(os.path.dirname(BASE_DIR), "clothes", "test")
+# Extra display roots (os.pathsep-separated); earlier roots win on category name clashes
+DISPLAY_IMAGE_ROOTS = [DISPLAY_IMAGES_DIR] + [
+    r for r in os.environ.get("DISPLAY_IMAGE_ROOTS", "").split(os.pathsep) if r
+]
+# When set (e.g. "/_display/"), nginx serves the bytes via X-Accel-Redirect
+DISPLAY_X_ACCEL_PREFIX = os.environ.get("DISPLAY_X_ACCEL_PREFIX", "")
 
 init_db()
 
+display_catalog = ImageCatalog(
+    DISPLAY_IMAGE_ROOTS,
+    check_interval=float(os.environ.get("DISPLAY_CATALOG_CHECK_SECONDS", "5")),
+)
+display_catalog.build()
+
+# Load face detectors once at startup rather than on the first request
+if os.environ.get("FACE_ANALYZER_PRELOAD", "true").lower() in ("1", "true", "yes"):
+    get_face_analyzer()
+
+# Start scraper browsers in the background (0 = start them on first use)
+SCRAPER_POOL_WARM = int(os.environ.get("SCRAPER_POOL_WARM", "1"))
+if SCRAPER_POOL_WARM > 0:
+    warm_driver_pool(SCRAPER_POOL_WARM)
+
+# H&M listings are served from the local catalog; seed empty pages from the
+# CSV exports and keep them fresh in the background (disable when a separate
+# `python -m app.product_catalog` process does the refreshing)
+product_catalog = get_product_catalog()
+product_catalog.seed_from_csv()
+if os.environ.get("PRODUCT_CATALOG_REFRESHER", "true").lower() in ("1", "true", "yes"):
+    CatalogRefresher(product_catalog).start()
+
+# Wardrobe ranking table for every skin tone / undertone / face shape combination
+get_clothing_recommender()
+
 # Update the first app instance with title and CORS middleware
 app.title = "Wardrobe API - Classification MVP"
 app.add_middleware(
@@ -125,9 +154,24 @@ app.add_middleware(
 )
 
 
+async def _ingest(file: UploadFile, check_image: bool = True):
+    """Stream an upload to a spooled temp file, mapping limit violations to HTTP errors."""
+    try:
+        return await ingest_upload(file, check_image=check_image)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @app.post("/upload")
 async def upload_cloth(file: UploadFile = File(...)):
-    contents = await file.read()
+    with await _ingest(file) as upload:
+        return _store_upload(upload)
+
+
+def _store_upload(upload):
+    contents = upload.stream()
 
     # 1) classify
     preds = classify_image_bytes(contents, topk=1)
@@ -149,8 +193,9 @@ async def upload_cloth(file: UploadFile = File(...)):
     # 4) save file
     fname = f"{os.urandom(8).hex()}.jpg"
     path = os.path.join(UPLOAD_DIR, fname)
-    with open(path, "wb") as f:
-        f.write(contents)
+    upload.save_to(path)
+    renditions.prewarm(path)
+    s3_storage.mirror_file(path)
 
     # 5) create DB entry
     item = create_item(
@@ -159,7 +204,7 @@ async def upload_cloth(file: UploadFile = File(...)):
         confidence=confidence,
         color_hex=hexc,
         thickness=thickness,
-        meta={"raw_preds": preds}
+        meta={"raw_preds": preds, "sha256": upload.sha256}
     )
 
     return JSONResponse({
@@ -202,11 +247,33 @@ def get_item_endpoint(item_id: str):
         "meta": it.meta
     }
 
+def _rendition_response(path: str, request: Request, w: int, fmt: Optional[str]):
+    """Serve a resized rendition of `path` with a strong ETag and immutable caching."""
+    if w <= 0:
+        raise HTTPException(status_code=400, detail="w must be positive")
+    try:
+        out_fmt = renditions.negotiate_format(fmt, request.headers.get("accept"))
+        rendition, etag = renditions.get_rendition(path, w, out_fmt)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except OSError as e:
+        logger.error(f"Failed to render {path}: {e}")
+        raise HTTPException(status_code=415, detail="Could not decode image")
+
+    headers = {"ETag": etag, "Cache-Control": renditions.IMMUTABLE_CACHE_CONTROL}
+    if not fmt:
+        headers["Vary"] = "Accept"
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(rendition, media_type=renditions.FORMATS[out_fmt]["media_type"], headers=headers)
+
 @app.get("/image/{filename}")
-def serve_image(filename: str):
+def serve_image(filename: str, request: Request, w: Optional[int] = None, fmt: Optional[str] = None):
     path = os.path.join(UPLOAD_DIR, filename)
     if not os.path.exists(path):
         raise HTTPException(status_code=404)
+    if w is not None:
+        return _rendition_response(path, request, w, fmt)
     # Add browser caching to speed up repeated loads
     # Cache for 1 day; adjust as needed
     return FileResponse(
@@ -216,34 +283,58 @@ def serve_image(filename: str):
     )
 
 @app.get("/display-image/{category}/{filename}")
-def serve_display_image(category: str, filename: str):
-    """Serve display images from clothes/test folder"""
+def serve_display_image(category: str, filename: str, request: Request, w: Optional[int] = None, fmt: Optional[str] = None):
+    """Serve display images from clothes/test folder (resized when ?w= is given)"""
     path = os.path.join(DISPLAY_IMAGES_DIR, category, filename)
     # Prevent directory traversal attacks
     if not os.path.abspath(path).startswith(os.path.abspath(DISPLAY_IMAGES_DIR)):
         raise HTTPException(status_code=403, detail="Forbidden")
-    if not os.path.exists(path):
+    # Only files present in the catalog are served, so no filesystem probe here
+    entry = display_catalog.lookup(category, filename)
+    if entry is None:
         raise HTTPException(status_code=404, detail="Image not found")
+    if w is not None:
+        return _rendition_response(entry.path, request, w, fmt)
+
+    headers = {"Cache-Control": "public, max-age=604800", "ETag": entry.etag}  # Cache for 1 week
+    if entry.etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    # nginx only maps DISPLAY_IMAGES_DIR; files from the other roots are served directly
+    relative = os.path.relpath(entry.path, os.path.abspath(DISPLAY_IMAGES_DIR))
+    if DISPLAY_X_ACCEL_PREFIX and not relative.startswith(os.pardir):
+        headers["X-Accel-Redirect"] = f"{DISPLAY_X_ACCEL_PREFIX.rstrip('/')}/{relative.replace(os.sep, '/')}"
+        return Response(media_type=entry.media_type, headers=headers)
     return FileResponse(
-        path,
-        media_type="image/jpeg",
-        headers={"Cache-Control": "public, max-age=604800"}  # Cache for 1 week
+        entry.path,
+        media_type=entry.media_type,
+        headers=headers,
+        stat_result=entry.stat,
     )
 
 @app.get("/display-images/{category}")
-def list_display_images(category: str):
-    """List available display images for a clothing category"""
-    category_dir = os.path.join(DISPLAY_IMAGES_DIR, category)
-    if not os.path.exists(category_dir):
+def list_display_images(category: str, request: Request, offset: int = 0, limit: Optional[int] = None, details: bool = False):
+    """List available display images for a clothing category (paginated, served from the catalog)"""
+    if offset < 0 or (limit is not None and limit < 0):
+        raise HTTPException(status_code=400, detail="offset and limit must be non-negative")
+    cat, entries = display_catalog.list(category, offset, limit)
+    if cat is None:
         return {"images": []}
-    
-    try:
-        files = [f for f in os.listdir(category_dir) 
-                if f.lower().endswith(('.jpg', '.jpeg', '.png', '.gif'))]
-        return {"category": category, "images": files}
-    except Exception as e:
-        logger.error(f"Failed to list display images: {e}")
-        raise HTTPException(status_code=500, detail="Failed to list images")
+
+    # The listing changes with the directory and with the requested page
+    etag = f'{cat.etag[:-1]}-{offset}-{limit}-{int(details)}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=60"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    body = {
+        "category": category,
+        "images": [e.name for e in entries],
+        "total": len(cat.entries),
+        "offset": offset,
+        "limit": limit,
+    }
+    if details:
+        body["items"] = [e.to_dict() for e in entries]
+    return JSONResponse(body, headers=headers)
 
 def calculate_weather_score(item, temp_c, weather_condition, item_type):
     """
@@ -525,11 +616,9 @@ async def analyze_face(file: UploadFile = File(...)):
     """
     Analyze face from uploaded photo and return skin tone and face shape analysis
     """
+    upload = await _ingest(file)
     try:
-        contents = await file.read()
-        
-        analyzer = FaceAnalyzer()
-        analysis = analyzer.analyze_face(contents)
+        analysis = await run_in_threadpool(analyze_face_cached, upload.stream(), upload.sha256)
         
         return JSONResponse({
             "skin_tone": analysis["skin_tone"],
@@ -541,6 +630,131 @@ async def analyze_face(file: UploadFile = File(...)):
     except Exception as e:
         logger.exception("Face analysis failed")
         raise HTTPException(status_code=500, detail=f"Face analysis failed: {str(e)}")
+    finally:
+        upload.close()
+
+
+@app.get("/face-analyzer/stats")
+def face_analyzer_stats():
+    """Load time and memory footprint of the shared face analyzer, plus result cache counters"""
+    return {**get_face_analyzer().load_stats, "cache": analysis_cache.stats}
+
+
+@app.websocket("/ws/face-stream")
+async def face_stream(websocket: WebSocket, detect_every: int = FACE_STREAM_DETECT_EVERY):
+    """
+    Live face analysis. The client sends encoded frames (JPEG/PNG/WebP) as
+    binary messages and receives a JSON state whenever the face box, skin
+    tone category/undertone or face shape changes. Frames that arrive while
+    the previous one is still being analysed are dropped (only the newest
+    is kept), so a slow connection lags by at most one frame.
+    """
+    await websocket.accept()
+    session = FaceStreamSession(get_face_analyzer(), detect_every=detect_every)
+    latest = {"frame": None, "received": 0, "dropped": 0}
+    ready = asyncio.Event()
+
+    async def receive_frames():
+        # Returns when the client disconnects
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            frame = message.get("bytes")
+            if frame is None:
+                # Text frames carry no image; tell the client and keep the session open
+                await websocket.send_json({"error": "binary frames only"})
+                continue
+            latest["received"] += 1
+            if latest["frame"] is not None:
+                latest["dropped"] += 1
+            latest["frame"] = frame
+            ready.set()
+
+    receiver = asyncio.create_task(receive_frames())
+    try:
+        while True:
+            waiter = asyncio.create_task(ready.wait())
+            done, _ = await asyncio.wait({receiver, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver in done:
+                waiter.cancel()
+                receiver.result()  # re-raises anything but a disconnect
+                break
+            ready.clear()
+            frame, latest["frame"] = latest["frame"], None
+            try:
+                update = await run_in_threadpool(session.process_frame, frame)
+            except ValueError as e:
+                await websocket.send_json({"error": str(e), "frame": session.frame_index})
+                continue
+            if update is not None:
+                update["stats"]["dropped"] = latest["dropped"]
+                await websocket.send_json(update)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+
+
+# (profile key, wardrobe version) -> (formatted recommendations, style tips).
+# At most 6 tone categories x 2 undertones x the face shapes per version.
+_face_rec_cache = {}
+_face_rec_cache_version = None
+# Guards the two above; callers run in threadpool workers (HTTP and WebSocket)
+_face_rec_lock = threading.Lock()
+
+
+def _wardrobe_list(item: str):
+    return [
+        {
+            "id": w_item.id,
+            "filename": w_item.filename,
+            "class_name": w_item.class_name,
+            "confidence": w_item.confidence,
+            "color_hex": w_item.color_hex,
+            "thickness": w_item.thickness
+        }
+        for w_item in get_items_by_class_name(item, limit=5)
+    ]
+
+
+def _face_recommendation_payload(skin_tone, face_shape):
+    """
+    Recommendations and style tips for a face profile, memoized per
+    (tone category, undertone, face shape) and wardrobe version. The
+    wardrobe matches for each clothing type are shared between profiles,
+    so the database is only queried again after the wardrobe changes.
+    """
+    global _face_rec_cache, _face_rec_cache_version
+    recommender = get_clothing_recommender()
+    key = recommender.profile_key(skin_tone, face_shape)
+    version = get_wardrobe_version()
+    with _face_rec_lock:
+        if version != _face_rec_cache_version:
+            _face_rec_cache = {"_wardrobe": {}}
+            _face_rec_cache_version = version
+        cache = _face_rec_cache
+        cached = cache.get(key)
+        wardrobe_by_item = dict(cache["_wardrobe"])
+    if cached is not None:
+        return cached
+
+    # Database queries run outside the lock; results go into the generation they were read for
+    formatted_recs = []
+    for item, data in recommender.recommend_clothing(skin_tone, face_shape):
+        if item not in wardrobe_by_item:
+            wardrobe_by_item[item] = _wardrobe_list(item)
+        formatted_recs.append({
+            "item": item,
+            "thickness": data["thickness"],
+            "score": data["score"],
+            "wardrobe_items": wardrobe_by_item[item]
+        })
+    payload = (formatted_recs, recommender.get_style_recommendations(skin_tone, face_shape))
+    with _face_rec_lock:
+        cache["_wardrobe"].update(wardrobe_by_item)
+        cache[key] = payload
+    return payload
 
 
 @app.post("/face-recommendations")
@@ -549,49 +763,17 @@ async def get_face_recommendations(file: UploadFile = File(...)):
     Analyze face and get clothing recommendations with ratings (1-10) for wardrobe items
     Includes wardrobe items matching recommended types
     """
+    upload = await _ingest(file)
     try:
-        contents = await file.read()
+        # Analyze face (a cache hit when the same photo was just sent to /analyze-face)
+        analysis = await run_in_threadpool(analyze_face_cached, upload.stream(), upload.sha256)
         
-        # Analyze face
-        analyzer = FaceAnalyzer()
-        analysis = analyzer.analyze_face(contents)
-        
-        # Get recommendations
-        recommender = ClothingRecommender()
-        recommendations = recommender.recommend_clothing(
-            analysis["skin_tone"],
-            analysis["face_shape"]
-        )
-        
-        # Get style recommendations
-        style_recs = recommender.get_style_recommendations(
+        formatted_recs, style_recs = await run_in_threadpool(
+            _face_recommendation_payload,
             analysis["skin_tone"],
             analysis["face_shape"]
         )
         
-        # Format recommendations and get wardrobe items for each
-        formatted_recs = []
-        for item, data in recommendations:
-            # Get wardrobe items matching this clothing type
-            wardrobe_items = get_items_by_class_name(item, limit=5)
-            wardrobe_list = []
-            for w_item in wardrobe_items:
-                wardrobe_list.append({
-                    "id": w_item.id,
-                    "filename": w_item.filename,
-                    "class_name": w_item.class_name,
-                    "confidence": w_item.confidence,
-                    "color_hex": w_item.color_hex,
-                    "thickness": w_item.thickness
-                })
-            
-            formatted_recs.append({
-                "item": item,
-                "thickness": data["thickness"],
-                "score": data["score"],
-                "wardrobe_items": wardrobe_list
-            })
-        
         return JSONResponse({
             "face_analysis": {
                 "skin_tone": analysis["skin_tone"],
@@ -606,32 +788,202 @@ async def get_face_recommendations(file: UploadFile = File(...)):
     except Exception as e:
         logger.exception("Face recommendation failed")
         raise HTTPException(status_code=500, detail=f"Face recommendation failed: {str(e)}")
+    finally:
+        upload.close()
 
 
 class WebRecommendationRequest(BaseModel):
     item_names: List[str]
 
 
+@app.get("/scraper/pool")
+def scraper_pool_stats():
+    """Live/idle browsers and checkout, recycle and crash counters of the scraper pool"""
+    return {**get_driver_pool().snapshot(), "fetches": web_scraper.fetch_stats_snapshot()}
+
+
+@app.get("/product-catalog/status")
+def product_catalog_status():
+    """Age, size, source and last error of every stored H&M listing page"""
+    return product_catalog.status()
+
+
 @app.post("/web-recommendations")
 async def get_web_recommendations(request: WebRecommendationRequest):
     """
     Get web-scraped clothing recommendations for given item types
-    This endpoint may take some time, so it's called separately with lazy loading
+    Served from the local product catalog (never scrapes on the request path);
+    items whose pages have not been scraped yet are listed under "pending"
     """
     try:
-        # Get top 10 items to scrape (to avoid too long wait times)
+        # Get top 10 items (kept for parity with the old live-scraping limit)
         items_to_scrape = request.item_names[:10] if len(request.item_names) > 10 else request.item_names
         
-        results = get_recommendations_for_items(items_to_scrape, limit_per_item=3)
+        results, pending = await run_in_threadpool(product_catalog.lookup, items_to_scrape, 3)
         
         return JSONResponse({
-            "web_recommendations": results
+            "web_recommendations": results,
+            "pending": pending
         })
     except Exception as e:
         logger.exception("Web scraping failed")
         raise HTTPException(status_code=500, detail=f"Web scraping failed: {str(e)}")
 
 
+def _stream_event(event: str, data: dict, fmt: str) -> str:
+    if fmt == "ndjson":
+        return json.dumps({"event": event, **data}) + "\n"
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/web-recommendations/stream")
+async def stream_web_recommendations(request: WebRecommendationRequest, http_request: Request,
+                                     format: str = "sse", live: bool = False):
+    """
+    Streaming variant of /web-recommendations (Server-Sent Events, or NDJSON
+    with ?format=ndjson). Items already in the product catalog are sent
+    straight away. Pages never scraped, and with ?live=true also stored
+    pages past their TTL, are scraped concurrently when the catalog says
+    they are due (TTL and failure back-off as for the refresher), and each
+    item is sent as soon as its page is done; a scrape of the same page
+    already in progress is joined rather than repeated. When the client
+    disconnects, queued scrapes nobody else is waiting for are cancelled.
+    Events: `item` {item, products}, `unavailable` {item}, `done` {elapsed_ms}.
+    """
+    if format not in ("sse", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'sse' or 'ndjson'")
+    items = request.item_names[:10]
+
+    async def events():
+        start = time.perf_counter()
+        results, pending = await run_in_threadpool(product_catalog.lookup, items, 3)
+
+        def plan():
+            # Which pages to scrape now; items with no page or a page not due are unavailable
+            items_by_url, unavailable = {}, []
+            for item in items:
+                url = product_catalog.url_for_item(item)
+                if item in results and not live:
+                    continue
+                if url and product_catalog.is_due(url):
+                    items_by_url.setdefault(url, []).append(item)
+                elif item not in results:
+                    unavailable.append(item)
+            return items_by_url, unavailable
+
+        items_by_url, unavailable = await run_in_threadpool(plan)
+        scraping = {item for page_items in items_by_url.values() for item in page_items}
+        for item, products in results.items():
+            if item not in scraping:
+                yield _stream_event("item", {"item": item, "products": products}, format)
+        for item in unavailable:
+            yield _stream_event("unavailable", {"item": item}, format)
+
+        # One scrape per distinct page, shared with the refresher and other requests
+        handles = [submit_refresh(product_catalog, url, cancellable=True) for url in items_by_url]
+        tasks = {asyncio.wrap_future(handle.future): handle.url for handle in handles}
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(tasks, timeout=1.0, return_when=asyncio.FIRST_COMPLETED)
+                if await http_request.is_disconnected():
+                    # Released below: queued scrapes nobody else waits for are cancelled,
+                    # running ones finish and still refresh the catalog
+                    logger.info(f"Client disconnected; releasing {len(tasks)} outstanding scrapes")
+                    return
+                for task in done:
+                    url = tasks.pop(task)
+                    page_items = items_by_url[url]
+                    found = {}
+                    if not task.cancelled() and task.exception() is None:
+                        # A failed refresh keeps the old listing, which is still worth sending
+                        found, _ = await run_in_threadpool(product_catalog.lookup, page_items, 3)
+                    for item in page_items:
+                        if item in found:
+                            yield _stream_event("item", {"item": item, "products": found[item]}, format)
+                        else:
+                            yield _stream_event("unavailable", {"item": item}, format)
+        finally:
+            # Also reached when the response is torn down mid-stream
+            for handle in handles:
+                handle.release()
+        yield _stream_event("done", {"elapsed_ms": round((time.perf_counter() - start) * 1000)}, format)
+
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/event-stream"
+    return StreamingResponse(
+        events(),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/catalog-index/status")
+def catalog_index_status():
+    """Size, source model and build time of the visual product index"""
+    index = get_catalog_index()
+    if index is None:
+        return {"built": False}
+    return {"built": True, **index.manifest}
+
+
+@app.get("/wardrobe/{item_id}/similar-products")
+async def similar_products(item_id: str, k: int = 10, mode: str = "similar", category: Optional[str] = None):
+    """
+    Catalog products that look like a wardrobe item (mode=similar, cosine
+    similarity) or go with it (mode=compatible, compatibility head scores
+    over the complementary tops/bottoms). Needs `python -m app.catalog_index`.
+    """
+    if mode not in CATALOG_SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {list(CATALOG_SEARCH_MODES)}")
+    k = max(1, min(k, 100))
+    index = get_catalog_index()
+    if index is None:
+        raise HTTPException(status_code=503, detail="Catalog index not built; run python -m app.catalog_index")
+    item = get_item(item_id)
+    if not item:
+        raise HTTPException(status_code=404, detail="Not found")
+    img_path = os.path.join(UPLOAD_DIR, item.filename)
+    if not os.path.exists(img_path):
+        raise HTTPException(status_code=404, detail="Item image not found")
+
+    model = get_model()
+    # Embeddings of another model live in a different space; scores would be meaningless
+    if not index.matches(model_identity(model)):
+        raise HTTPException(
+            status_code=503,
+            detail="Catalog index was built with a different compatibility model (variant or checkpoint); rebuild it with python -m app.catalog_index",
+        )
+
+    with open(img_path, "rb") as f:
+        image = f.read()
+    try:
+        embedding = await run_in_threadpool(lambda: model.embed_images([image]))
+    except Exception as e:
+        logger.exception("Embedding wardrobe item failed")
+        raise HTTPException(status_code=500, detail=f"Embedding failed: {str(e)}")
+
+    # The compatibility head scores (top, bottom); a bottom goes second
+    role = "bottom" if is_bottom_item(item.class_name) and not is_top_item(item.class_name) else "top"
+    mask = None
+    if category:
+        mask = index.mask_for(lambda c: c.lower() == category.lower())
+    elif mode == "compatible":
+        if is_top_item(item.class_name):
+            mask = index.mask_for(is_bottom_item)
+        elif is_bottom_item(item.class_name):
+            mask = index.mask_for(is_top_item)
+
+    start = time.perf_counter()
+    (hits,) = index.search(embedding, k=k, mode=mode, mask=mask, query_role=role)
+    search_ms = (time.perf_counter() - start) * 1000
+    return {
+        "item_id": item.id,
+        "mode": mode,
+        "products": [{**index.products[row], "score": round(score, 4)} for row, score in hits],
+        "indexed": len(index),
+        "search_ms": round(search_ms, 3),
+    }
+
+
 # Helper function to categorize clothing items
 def is_top_item(class_name: str) -> bool:
     """Check if an item is a top"""
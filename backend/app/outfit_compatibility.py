@@ -3,8 +3,6 @@ import torch
 import torch.nn as nn
 import torchvision.models as models
 from torchvision import transforms
-from PIL import Image
-import io
 import os
 import logging
 from typing import List, Tuple, Dict
@@ -13,10 +11,13 @@ import mlflow
 from mlflow import pytorch as mlflow_pytorch
 from mlflow.exceptions import MlflowException
 
+from .ingest import open_image
 from .dependencies import (
     get_mlflow_client,
+    get_model_variant,
     get_registry_model_name,
     get_registry_stage,
+    get_student_model_name,
     get_tracking_uri,
 )
 
@@ -25,6 +26,9 @@ logger = logging.getLogger(__name__)
 # Model configuration from MLflow params
 IMAGE_SIZE = 128
 EMBEDDING_DIM = 128  # Standard for Siamese networks with MobileNetV2
+# Distilled student defaults (ml.distill)
+STUDENT_IMAGE_SIZE = 96
+STUDENT_WIDTH_MULT = 0.35
 
 
 class SiameseMobileNetV2(nn.Module):
@@ -154,29 +158,91 @@ class SiameseMobileNetV2Sequential(nn.Module):
         return emb
 
 
+class StudentCompatibilityNet(nn.Module):
+    """
+    Small model distilled from SiameseMobileNetV2 (see ml.distill): a
+    width-reduced MobileNetV2 on `input_size` px inputs with the same
+    embedding size and outputs, so it can replace the teacher at serving time.
+    """
+
+    def __init__(self, embedding_dim=EMBEDDING_DIM, width_mult=STUDENT_WIDTH_MULT, input_size=STUDENT_IMAGE_SIZE):
+        super(StudentCompatibilityNet, self).__init__()
+        self.embedding_dim = embedding_dim
+        self.width_mult = width_mult
+        self.input_size = input_size
+
+        # Trained from scratch against the teacher, so no pretrained weights
+        mobilenet = models.mobilenet_v2(width_mult=width_mult)
+        self.backbone = mobilenet.features
+
+        self.embedding = nn.Sequential(
+            nn.AdaptiveAvgPool2d((1, 1)),
+            nn.Flatten(),
+            nn.Linear(mobilenet.last_channel, embedding_dim),
+            nn.ReLU(),
+            nn.Linear(embedding_dim, embedding_dim)
+        )
+
+        # Same layer pattern as the teacher head (Linear/ReLU ... Linear, Sigmoid)
+        self.compatibility_head = nn.Sequential(
+            nn.Linear(embedding_dim * 2, 64),
+            nn.ReLU(),
+            nn.Linear(64, 1),
+            nn.Sigmoid()
+        )
+
+    def config(self) -> Dict:
+        """Constructor arguments, stored in checkpoints as "architecture"."""
+        return {"type": "student", "embedding_dim": self.embedding_dim, "width_mult": self.width_mult, "input_size": self.input_size}
+
+    def forward(self, img1, img2):
+        """Forward pass for pair of images"""
+        emb1 = self.get_embedding(img1)
+        emb2 = self.get_embedding(img2)
+        compatibility_score = self.compatibility_head(torch.cat([emb1, emb2], dim=1))
+        return compatibility_score, emb1, emb2
+
+    def get_embedding(self, img):
+        """Get embedding for a single image"""
+        emb = self.embedding(self.backbone(img))
+        return nn.functional.normalize(emb, p=2, dim=1)
+
+
+def build_model_from_config(config: Dict) -> nn.Module:
+    """Model for a checkpoint's "architecture" entry (only students record one)."""
+    if config.get("type") != "student":
+        raise ValueError(f"Unknown model architecture: {config}")
+    return StudentCompatibilityNet(
+        embedding_dim=config.get("embedding_dim", EMBEDDING_DIM),
+        width_mult=config.get("width_mult", STUDENT_WIDTH_MULT),
+        input_size=config.get("input_size", STUDENT_IMAGE_SIZE),
+    )
 
 
 class OutfitCompatibilityModel:
-    """Wrapper for loading and using the outfit compatibility model"""
+    """
+    Wrapper for loading and using the outfit compatibility model.
+
+    `variant` ("teacher" or "student", default COMPATIBILITY_MODEL) picks the
+    registry model and local checkpoint to load; an explicit `model_path`
+    may point at either, as student checkpoints record their architecture.
+    """
     
-    def __init__(self, model_path: str = None, force_registry: bool = False):
+    def __init__(self, model_path: str = None, force_registry: bool = False, variant: str = None):
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.model = None
         self.model_path = model_path
+        self._fingerprint = None
+        self.variant = (variant or get_model_variant()).lower()
+        if self.variant not in ("teacher", "student"):
+            raise ValueError(f"Model variant must be 'teacher' or 'student', got {self.variant!r}")
 
         # MLflow configuration
         self.tracking_uri = get_tracking_uri()
-        self.registry_model_name = get_registry_model_name()
+        self.registry_model_name = get_student_model_name() if self.variant == "student" else get_registry_model_name()
         self.registry_stage = get_registry_stage()
         mlflow.set_tracking_uri(self.tracking_uri)
         
-        # Image preprocessing
-        self.transform = transforms.Compose([
-            transforms.Resize((IMAGE_SIZE, IMAGE_SIZE)),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-        ])
-        
         if force_registry:
             self._load_from_registry(raise_on_fail=True)
         else:
@@ -187,11 +253,32 @@ class OutfitCompatibilityModel:
             if not loaded_from_registry:
                 self.model_path = self.model_path or self._find_model_path()
                 self._load_local_checkpoint()
+
+        # Image preprocessing, at the input size of whichever model was loaded
+        self.image_size = getattr(self.model, "input_size", IMAGE_SIZE)
+        self.transform = transforms.Compose([
+            transforms.Resize((self.image_size, self.image_size)),
+            transforms.ToTensor(),
+            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+        ])
     
     def _find_model_path(self):
         """Find the model checkpoint file"""
         base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         
+        if self.variant == "student":
+            possible_paths = [
+                os.path.join(base_dir, "models", "compat_student.pth"),
+                os.path.join(base_dir, "artifacts", "compatibility", "compat_student.pth"),
+            ]
+            for path in possible_paths:
+                if os.path.exists(path):
+                    logger.info(f"Found student model at: {path}")
+                    return path
+            raise FileNotFoundError(
+                f"Student model not found. Tried: {possible_paths}. Run `python -m ml.distill` first."
+            )
+
         # Try multiple possible locations (updated for backend structure)
         possible_paths = [
             os.path.join(base_dir, "models", "compat_mobilenetv2.pth"),
@@ -227,6 +314,15 @@ class OutfitCompatibilityModel:
                     state_dict = checkpoint
             else:
                 state_dict = checkpoint
+
+            # Distilled students record their architecture next to the weights
+            if isinstance(checkpoint, dict) and "architecture" in checkpoint:
+                self.model = build_model_from_config(checkpoint["architecture"])
+                self.model.load_state_dict(state_dict)
+                self.model.to(self.device)
+                self.model.eval()
+                logger.info(f"Loaded {checkpoint['architecture']} model from {self.model_path}")
+                return
             
             # Inspect the state_dict keys to understand architecture
             state_dict_keys = list(state_dict.keys())
@@ -339,13 +435,37 @@ class OutfitCompatibilityModel:
     def preprocess_image(self, image_bytes: bytes) -> torch.Tensor:
         """Preprocess image bytes to tensor"""
         try:
-            img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+            img = open_image(image_bytes).convert("RGB")
             img_tensor = self.transform(img).unsqueeze(0)  # Add batch dimension
             return img_tensor.to(self.device)
         except Exception as e:
             logger.error(f"Image preprocessing failed: {e}")
             raise
     
+    def embed_images(self, images: List) -> np.ndarray:
+        """L2-normalised embeddings for a batch of images (bytes or file handles), one forward pass"""
+        if not images:
+            return np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        with torch.no_grad():
+            batch = torch.cat([self.preprocess_image(img) for img in images], dim=0)
+            embeddings = self.model.get_embedding(batch)
+        return embeddings.cpu().numpy().astype(np.float32)
+
+    def compatibility_head_arrays(self) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """(weight, bias) of each Linear in the compatibility head, for scoring without torch"""
+        return [
+            (layer.weight.detach().cpu().numpy().astype(np.float32), layer.bias.detach().cpu().numpy().astype(np.float32))
+            for layer in self.model.compatibility_head
+            if isinstance(layer, nn.Linear)
+        ]
+
+    def fingerprint(self) -> str:
+        """Hash of the compatibility head, identifying the model (see catalog_index.head_fingerprint)"""
+        if self._fingerprint is None:
+            from .catalog_index import head_fingerprint
+            self._fingerprint = head_fingerprint(self.compatibility_head_arrays())
+        return self._fingerprint
+    
     def compute_compatibility(self, top_image_bytes: bytes, bottom_image_bytes: bytes) -> float:
         """Compute compatibility score between top and bottom"""
         with torch.no_grad():
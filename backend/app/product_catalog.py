@@ -0,0 +1,408 @@
+# app/product_catalog.py
+"""
+Local store of scraped H&M listings, kept fresh by a background refresher.
+
+/web-recommendations answers from this SQLite file instead of launching a
+browser: listings change a few times a day, so each H&M page is scraped on
+a schedule (per-category TTLs) and requests only ever read. Entries past
+their TTL are still served (stale-while-revalidate) and queued for refresh.
+Pages are keyed by URL, so categories that share a page share one entry.
+
+The refresher can run inside the API process (PRODUCT_CATALOG_REFRESHER)
+or as its own process, which is preferable with several API workers:
+
+    python -m app.product_catalog --seed testScripts/hm_products.csv --once
+    python -m app.product_catalog                 # refresh loop
+"""
+import argparse
+import ast
+import csv
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .web_scraper import (
+    ITEM_TO_CATEGORY,
+    SCRAPING_URLS,
+    _normalize_hm_image_url,
+    get_scrape_executor,
+    scrape_hm_products,
+)
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PRODUCT_CATALOG_PATH = os.environ.get("PRODUCT_CATALOG_PATH", os.path.join(BASE_DIR, "product_catalog.db"))
+# Default listing TTL in seconds, plus optional per-category overrides ("jeans=86400,t-shirts=3600")
+PRODUCT_CATALOG_TTL = float(os.environ.get("PRODUCT_CATALOG_TTL", str(6 * 3600)))
+PRODUCT_CATALOG_TTLS = os.environ.get("PRODUCT_CATALOG_TTLS", "")
+# How often the refresher looks for stale pages, and how long it backs off after a failed scrape
+PRODUCT_REFRESH_INTERVAL = float(os.environ.get("PRODUCT_REFRESH_INTERVAL", "60"))
+PRODUCT_REFRESH_RETRY = float(os.environ.get("PRODUCT_REFRESH_RETRY", "300"))
+# Products stored per page; requests can ask for up to this many
+PRODUCT_CATALOG_DEPTH = int(os.environ.get("PRODUCT_CATALOG_DEPTH", "12"))
+SEED_CSVS = [
+    os.path.join(BASE_DIR, "testScripts", "hm_products.csv"),
+    os.path.join(BASE_DIR, "testScripts", "hm_scraped_products.csv"),
+]
+
+PRODUCT_FIELDS = ("title", "link", "price", "default_image", "hover_image", "colors")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS catalog_pages (
+    url TEXT PRIMARY KEY,
+    fetched_at REAL NOT NULL,
+    attempted_at REAL NOT NULL DEFAULT 0,
+    source TEXT NOT NULL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS catalog_products (
+    url TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (url, position)
+);
+"""
+
+
+def parse_ttls(spec: str) -> Dict[str, float]:
+    ttls = {}
+    for part in spec.split(","):
+        if "=" in part:
+            category, seconds = part.split("=", 1)
+            ttls[category.strip().lower()] = float(seconds)
+    return ttls
+
+
+class ProductCatalog:
+    def __init__(self, path: str = PRODUCT_CATALOG_PATH, default_ttl: float = PRODUCT_CATALOG_TTL,
+                 ttls: Optional[Dict[str, float]] = None):
+        self.path = path
+        self.default_ttl = default_ttl
+        self.ttls = ttls if ttls is not None else parse_ttls(PRODUCT_CATALOG_TTLS)
+        self._local = threading.local()
+        # Set by reads that hit a stale page so the refresher doesn't wait a full interval
+        self.wakeup = threading.Event()
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; WAL lets the refresher write while requests read
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def ttl_for_url(self, url: str) -> float:
+        """Shortest TTL of the categories that point at `url`."""
+        ttls = [self.ttls.get(c, self.default_ttl) for c, u in SCRAPING_URLS.items() if u == url]
+        return min(ttls) if ttls else self.default_ttl
+
+    def store(self, url: str, products: List[Dict], source: str = "scrape", fetched_at: Optional[float] = None) -> None:
+        """Replace the listing for `url` atomically."""
+        now = time.time()
+        rows = [(url, i, json.dumps({k: p.get(k) for k in PRODUCT_FIELDS})) for i, p in enumerate(products)]
+        with self._conn() as conn:
+            conn.execute("DELETE FROM catalog_products WHERE url = ?", (url,))
+            conn.executemany("INSERT INTO catalog_products (url, position, data) VALUES (?, ?, ?)", rows)
+            conn.execute(
+                "INSERT OR REPLACE INTO catalog_pages (url, fetched_at, attempted_at, source, error) VALUES (?, ?, ?, ?, NULL)",
+                (url, now if fetched_at is None else fetched_at, now, source),
+            )
+
+    def record_failure(self, url: str, error: str) -> None:
+        """Keep serving the old listing; only note the failed attempt for back-off."""
+        with self._conn() as conn:
+            updated = conn.execute(
+                "UPDATE catalog_pages SET attempted_at = ?, error = ? WHERE url = ?", (time.time(), error, url)
+            ).rowcount
+            if not updated:
+                conn.execute(
+                    "INSERT INTO catalog_pages (url, fetched_at, attempted_at, source, error) VALUES (?, 0, ?, 'none', ?)",
+                    (url, time.time(), error),
+                )
+
+    def page(self, url: str) -> Optional[Tuple[float, float, Optional[str]]]:
+        return self._conn().execute(
+            "SELECT fetched_at, attempted_at, error FROM catalog_pages WHERE url = ?", (url,)
+        ).fetchone()
+
+    def products(self, url: str, limit: int) -> List[Dict]:
+        rows = self._conn().execute(
+            "SELECT data FROM catalog_products WHERE url = ? ORDER BY position LIMIT ?", (url, limit)
+        ).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def is_stale(self, url: str, now: Optional[float] = None) -> bool:
+        page = self.page(url)
+        now = time.time() if now is None else now
+        return page is None or now - page[0] >= self.ttl_for_url(url)
+
+    def is_due(self, url: str, now: Optional[float] = None) -> bool:
+        """Stale, and its last failed attempt (if any) is older than the retry back-off."""
+        now = time.time() if now is None else now
+        page = self.page(url)
+        if page is None:
+            return True
+        fetched_at, attempted_at, error = page
+        if now - fetched_at < self.ttl_for_url(url):
+            return False
+        return not (error and now - attempted_at < PRODUCT_REFRESH_RETRY)
+
+    def due_urls(self, now: Optional[float] = None) -> List[str]:
+        """Pages the refresher should scrape now (see `is_due`)."""
+        now = time.time() if now is None else now
+        return [url for url in sorted(set(SCRAPING_URLS.values())) if self.is_due(url, now)]
+
+    def url_for_item(self, item_name: str) -> Optional[str]:
+        category = ITEM_TO_CATEGORY.get(item_name)
+        return SCRAPING_URLS.get(category) if category else None
+
+    def lookup(self, item_names: Iterable[str], limit: int = 3) -> Tuple[Dict[str, List[Dict]], List[str]]:
+        """
+        Products per item from the store, never scraping. Returns
+        (results, pending) where `pending` lists items with nothing stored
+        yet; stale or missing pages are handed to the refresher.
+        """
+        results, pending = {}, []
+        now = time.time()
+        for item_name in item_names:
+            url = self.url_for_item(item_name)
+            if not url:
+                continue
+            if self.is_stale(url, now):
+                self.wakeup.set()
+            products = self.products(url, limit)
+            if products:
+                category = ITEM_TO_CATEGORY[item_name]
+                results[item_name] = [{"category": category, **p} for p in products]
+            else:
+                pending.append(item_name)
+        return results, pending
+
+    def seed_from_csv(self, paths: Iterable[str] = SEED_CSVS) -> int:
+        """
+        Load listings from scraper CSV exports for pages that have none yet.
+        Seeded pages are stored as already expired, so they are served until
+        the first real refresh replaces them.
+        """
+        by_url: Dict[str, List[Dict]] = {}
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            with open(path, newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    url = SCRAPING_URLS.get((row.get("category") or "").strip().lower())
+                    if not url:
+                        continue
+                    try:
+                        colors = ast.literal_eval(row.get("colors") or "[]")
+                    except (ValueError, SyntaxError):
+                        colors = []
+                    by_url.setdefault(url, []).append({
+                        "title": row.get("title"),
+                        "link": row.get("link"),
+                        "price": row.get("price"),
+                        "default_image": _normalize_hm_image_url(row.get("default_image")),
+                        "hover_image": _normalize_hm_image_url(row.get("hover_image")),
+                        "colors": [c.rstrip(";").strip() for c in colors],
+                    })
+        seeded = 0
+        for url, products in by_url.items():
+            page = self.page(url)
+            if page is None or page[0] == 0 and not self.products(url, 1):
+                self.store(url, products, source="seed", fetched_at=0)
+                seeded += 1
+        return seeded
+
+    def status(self) -> List[Dict]:
+        now = time.time()
+        rows = self._conn().execute(
+            "SELECT p.url, p.fetched_at, p.attempted_at, p.source, p.error, "
+            "(SELECT COUNT(*) FROM catalog_products c WHERE c.url = p.url) FROM catalog_pages p ORDER BY p.url"
+        ).fetchall()
+        return [
+            {
+                "url": url,
+                "categories": sorted(c for c, u in SCRAPING_URLS.items() if u == url),
+                "products": count,
+                "source": source,
+                "age_seconds": round(now - fetched_at) if fetched_at else None,
+                "stale": now - fetched_at >= self.ttl_for_url(url),
+                "last_error": error,
+            }
+            for url, fetched_at, attempted_at, source, error, count in rows
+        ]
+
+
+def _category_for_url(url: str) -> str:
+    return next(c for c, u in SCRAPING_URLS.items() if u == url)
+
+
+def refresh_page(catalog: ProductCatalog, url: str, depth: int = PRODUCT_CATALOG_DEPTH) -> bool:
+    """Scrape one page now and store it; on failure the old listing is kept. Returns success."""
+    try:
+        products = scrape_hm_products(_category_for_url(url), depth)
+        error = "no products scraped"
+    except Exception as e:
+        products, error = [], str(e)
+    if products:
+        catalog.store(url, products)
+        return True
+    catalog.record_failure(url, error)
+    return False
+
+
+class _InflightRefresh:
+    """A queued or running refresh_page and the callers waiting on it."""
+
+    def __init__(self, future: Future):
+        self.future = future
+        self.waiters = 0
+        # Submitted by the refresher: runs even when every waiting request is gone
+        self.pinned = False
+
+
+# Re-entrant: Future.cancel() runs the done callback, which takes the lock, on the calling thread
+_refresh_inflight: Dict[str, _InflightRefresh] = {}
+_refresh_lock = threading.RLock()
+
+
+class RefreshHandle:
+    """
+    One caller's share of a page refresh: wait on `future` (its result is
+    refresh_page's success flag) and `release()` it once no longer
+    interested, e.g. when a streaming client disconnects.
+    """
+
+    def __init__(self, url: str, entry: _InflightRefresh):
+        self.url = url
+        self.future = entry.future
+        self._entry = entry
+        self._released = False
+
+    def result(self, timeout: Optional[float] = None) -> bool:
+        return self.future.result(timeout)
+
+    def release(self) -> None:
+        """Drop this share; the last one cancels the scrape if it has not started and no refresher wants it."""
+        with _refresh_lock:
+            if self._released:
+                return
+            self._released = True
+            self._entry.waiters -= 1
+            if self._entry.waiters == 0 and not self._entry.pinned and self.future.cancel():
+                logger.info(f"Cancelled queued scrape of {self.url}: no request is waiting for it")
+
+
+def submit_refresh(catalog: ProductCatalog, url: str, depth: int = PRODUCT_CATALOG_DEPTH,
+                   cancellable: bool = False) -> RefreshHandle:
+    """
+    Queue `refresh_page` for `url` on the scrape executor, or join the
+    scrape of that page already queued or running. With `cancellable`
+    (request paths), the queued scrape is cancelled once every caller
+    waiting on it has released its handle; otherwise it always runs.
+    """
+    with _refresh_lock:
+        entry = _refresh_inflight.get(url)
+        if entry is None:
+            entry = _InflightRefresh(get_scrape_executor().submit(refresh_page, catalog, url, depth))
+            _refresh_inflight[url] = entry
+
+            def _done(done: Future, key: str = url) -> None:
+                with _refresh_lock:
+                    current = _refresh_inflight.get(key)
+                    if current is not None and current.future is done:
+                        del _refresh_inflight[key]
+
+            entry.future.add_done_callback(_done)
+        entry.waiters += 1
+        entry.pinned = entry.pinned or not cancellable
+        return RefreshHandle(url, entry)
+
+
+def refresh_due(catalog: ProductCatalog, depth: int = PRODUCT_CATALOG_DEPTH) -> Dict[str, int]:
+    """Scrape every due page concurrently (bounded by the scraper pool) and store the results."""
+    urls = catalog.due_urls()
+    handles = [submit_refresh(catalog, url, depth) for url in urls]
+    stats = {"refreshed": 0, "failed": 0}
+    for handle in handles:
+        try:
+            stats["refreshed" if handle.result() else "failed"] += 1
+        finally:
+            handle.release()
+    if urls:
+        logger.info(f"Catalog refresh: {stats}")
+    return stats
+
+
+class CatalogRefresher(threading.Thread):
+    """Daemon thread that refreshes due pages every `interval` seconds or when woken by a stale read."""
+
+    def __init__(self, catalog: ProductCatalog, interval: float = PRODUCT_REFRESH_INTERVAL):
+        super().__init__(name="catalog-refresher", daemon=True)
+        self.catalog = catalog
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                refresh_due(self.catalog)
+            except Exception:
+                logger.exception("Catalog refresh failed")
+            self.catalog.wakeup.wait(self.interval)
+            self.catalog.wakeup.clear()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.catalog.wakeup.set()
+
+
+_catalog_instance = None
+_catalog_lock = threading.Lock()
+
+
+def get_product_catalog() -> ProductCatalog:
+    global _catalog_instance
+    if _catalog_instance is None:
+        with _catalog_lock:
+            if _catalog_instance is None:
+                _catalog_instance = ProductCatalog()
+    return _catalog_instance
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Seed and refresh the local H&M product catalog.")
+    parser.add_argument("--seed", nargs="*", default=None,
+                        help="CSV exports to seed empty pages from (default: testScripts CSVs)")
+    parser.add_argument("--once", action="store_true", help="Refresh due pages once and exit")
+    parser.add_argument("--interval", type=float, default=PRODUCT_REFRESH_INTERVAL)
+    parser.add_argument("--status", action="store_true", help="Print the state of every stored page and exit")
+    args = parser.parse_args()
+
+    catalog = get_product_catalog()
+    if args.status:
+        print(json.dumps(catalog.status(), indent=2))
+        return
+    if args.seed is not None:
+        logger.info(f"Seeded {catalog.seed_from_csv(args.seed or SEED_CSVS)} pages")
+    if args.once:
+        refresh_due(catalog)
+        return
+    refresher = CatalogRefresher(catalog, interval=args.interval)
+    refresher.start()
+    refresher.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+# app/renditions.py
+"""
+Resized renditions of wardrobe and display images.
+
+Renditions are generated lazily (or pre-warmed at upload time) in a small
+worker pool and stored content-addressed under RENDITION_DIR, so a given
+source image + width + format is only ever encoded once per host.
+"""
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from PIL import Image, ImageOps
+import hashlib
+import logging
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RENDITION_DIR = os.environ.get("RENDITION_DIR", os.path.join(BASE_DIR, "renditions"))
+RENDITION_WIDTHS = tuple(
+    sorted(int(w) for w in os.environ.get("RENDITION_WIDTHS", "160,320,640,1024").split(",") if w.strip())
+)
+RENDITION_WORKERS = int(os.environ.get("RENDITION_WORKERS", "2"))
+# Source digests remembered per process (least recently used evicted first)
+DIGEST_CACHE_SIZE = int(os.environ.get("RENDITION_DIGEST_CACHE_SIZE", "4096"))
+# Widths generated eagerly when an image is uploaded
+PREWARM_WIDTHS = (RENDITION_WIDTHS[0], RENDITION_WIDTHS[len(RENDITION_WIDTHS) // 2])
+
+FORMATS = {
+    "webp": {"pil": "WEBP", "ext": "webp", "media_type": "image/webp", "save": {"quality": 80, "method": 4}},
+    "jpeg": {"pil": "JPEG", "ext": "jpg", "media_type": "image/jpeg", "save": {"quality": 82, "optimize": True, "progressive": True}},
+}
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_executor = ThreadPoolExecutor(max_workers=RENDITION_WORKERS, thread_name_prefix="rendition")
+_inflight: Dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+
+# (path, size, mtime_ns) -> sha256 hex digest of the source file
+_digest_cache: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+_digest_lock = threading.Lock()
+
+
+def snap_width(width: int) -> int:
+    """Round a requested width up to the nearest configured rendition width."""
+    for w in RENDITION_WIDTHS:
+        if width <= w:
+            return w
+    return RENDITION_WIDTHS[-1]
+
+
+def negotiate_format(fmt: Optional[str], accept: Optional[str]) -> str:
+    """Pick an output format from an explicit ?fmt= value or the Accept header."""
+    if fmt:
+        fmt = fmt.lower()
+        if fmt == "jpg":
+            fmt = "jpeg"
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported format: {fmt}")
+        return fmt
+    if accept and "image/webp" in accept:
+        return "webp"
+    return "jpeg"
+
+
+def source_digest(path: str) -> str:
+    """SHA-256 of a source image, memoized on (path, size, mtime)."""
+    st = os.stat(path)
+    key = (path, st.st_size, st.st_mtime_ns)
+    with _digest_lock:
+        digest = _digest_cache.get(key)
+        if digest:
+            _digest_cache.move_to_end(key)
+    if digest:
+        return digest
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+    with _digest_lock:
+        _digest_cache[key] = digest
+        _digest_cache.move_to_end(key)
+        while len(_digest_cache) > DIGEST_CACHE_SIZE:
+            _digest_cache.popitem(last=False)
+    return digest
+
+
+def rendition_path(digest: str, width: int, fmt: str) -> str:
+    ext = FORMATS[fmt]["ext"]
+    return os.path.join(RENDITION_DIR, digest[:2], f"{digest}_{width}.{ext}")
+
+
+def rendition_etag(digest: str, width: int, fmt: str) -> str:
+    return f'"{digest[:32]}-{width}-{fmt}"'
+
+
+def _render(src_path: str, dst_path: str, width: int, fmt: str) -> str:
+    spec = FORMATS[fmt]
+    with Image.open(src_path) as img:
+        # Let the JPEG decoder downscale by a power of two before the real resize
+        img.draft("RGB", (width, width))
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        if img.width > width:
+            height = max(1, round(img.height * width / img.width))
+            img = img.resize((width, height), Image.LANCZOS)
+
+        os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+        # pid and thread id: several server processes may render the same file
+        tmp_path = f"{dst_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            img.save(tmp_path, format=spec["pil"], **spec["save"])
+            # Atomic publish so concurrent readers never see a partial file
+            os.replace(tmp_path, dst_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return dst_path
+
+
+def _submit(src_path: str, dst_path: str, width: int, fmt: str) -> Future:
+    """Start (or join) generation of a rendition; one job per output path."""
+    with _inflight_lock:
+        future = _inflight.get(dst_path)
+        if future is None and os.path.exists(dst_path):
+            # Finished between the caller's existence check and now
+            future = Future()
+            future.set_result(dst_path)
+        elif future is None:
+            future = _executor.submit(_render, src_path, dst_path, width, fmt)
+            _inflight[dst_path] = future
+
+            def _done(done, key=dst_path):
+                with _inflight_lock:
+                    _inflight.pop(key, None)
+                if done.exception() is not None:
+                    logger.warning(f"Rendition generation failed for {key}: {done.exception()}")
+
+            future.add_done_callback(_done)
+    return future
+
+
+def get_rendition(src_path: str, width: int, fmt: str = "jpeg") -> Tuple[str, str]:
+    """
+    Return (path, etag) of the rendition of `src_path` at `width` in `fmt`,
+    generating it if needed. Concurrent callers for the same rendition wait
+    on a single generation job.
+    """
+    width = snap_width(width)
+    digest = source_digest(src_path)
+    dst_path = rendition_path(digest, width, fmt)
+    if not os.path.exists(dst_path):
+        _submit(src_path, dst_path, width, fmt).result()
+    return dst_path, rendition_etag(digest, width, fmt)
+
+
+def prewarm(src_path: str, widths=PREWARM_WIDTHS, formats=("webp", "jpeg")) -> None:
+    """Queue rendition generation for a freshly ingested image without waiting."""
+    try:
+        digest = source_digest(src_path)
+    except OSError as e:
+        logger.warning(f"Cannot prewarm renditions for {src_path}: {e}")
+        return
+    for width in widths:
+        for fmt in formats:
+            dst_path = rendition_path(digest, width, fmt)
+            if not os.path.exists(dst_path):
+                _submit(src_path, dst_path, width, fmt)
@@ -0,0 +1,274 @@
+# app/s3_ingest.py
+"""
+Bulk ingest worker for images uploaded straight to S3 via presigned URLs.
+
+Keys under `user-uploads/` are discovered either by listing the prefix or
+from S3 event notifications delivered to an SQS queue. Each batch is
+downloaded in parallel, classified with one batched YOLO call, colour- and
+embedding-annotated, saved to UPLOAD_DIR and recorded as WardrobeItem rows.
+Keys are mapped to deterministic filenames (unique in the database), so
+re-running, retried notifications and concurrent workers are idempotent.
+
+    python -m app.s3_ingest --once                     # drain the prefix once
+    python -m app.s3_ingest --queue-url https://sqs... # consume notifications
+"""
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import unquote_plus
+
+import boto3
+from sqlalchemy.exc import IntegrityError
+
+from .crud import create_item, get_existing_filenames
+from .db import init_db
+from .detector import classify_image_batch
+from .ingest import ingest_fileobj
+from .s3_storage import AWS_REGION, PRESIGN_MAX_EXPIRES, PRESIGN_UPLOAD_PREFIX, S3_BUCKET, get_s3_client
+from .utils import estimate_thickness, get_dominant_color, rgb_to_hex
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("s3_ingest")
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UPLOAD_DIR = os.path.join(BASE_DIR, "uploads")
+DEFAULT_PREFIX = PRESIGN_UPLOAD_PREFIX
+# Allowed difference between the API hosts' clocks (which timestamp keys) and this worker's
+CLOCK_SKEW_SECONDS = 300
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def filename_for_key(key: str) -> str:
+    """Deterministic local filename for an S3 key (used to skip already-ingested objects)."""
+    return f"s3_{hashlib.sha256(key.encode('utf-8')).hexdigest()[:24]}.jpg"
+
+
+def iter_prefix_keys(bucket: str, prefix: str, start_after: Optional[str] = None) -> Iterator[str]:
+    """Yield image keys under `prefix` (after `start_after`, in key order), page by page."""
+    paginator = get_s3_client().get_paginator("list_objects_v2")
+    kwargs = {"StartAfter": start_after} if start_after else {}
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix, **kwargs):
+        for obj in page.get("Contents", []):
+            key = obj["Key"]
+            if key.lower().endswith(IMAGE_EXTENSIONS):
+                yield key
+
+
+def keys_from_notification(body: str, prefix: str) -> List[str]:
+    """Extract object keys from an S3 event notification (optionally wrapped by SNS)."""
+    payload = json.loads(body)
+    if "Message" in payload and "Records" not in payload:
+        payload = json.loads(payload["Message"])
+    keys = []
+    for record in payload.get("Records", []):
+        if not record.get("eventName", "").startswith("ObjectCreated"):
+            continue
+        key = unquote_plus(record["s3"]["object"]["key"])
+        if key.startswith(prefix) and key.lower().endswith(IMAGE_EXTENSIONS):
+            keys.append(key)
+    return keys
+
+
+def _batched(items: Iterable, size: int) -> Iterator[List]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class S3IngestWorker:
+    def __init__(self, bucket: str = S3_BUCKET, concurrency: int = 8, embed: bool = True):
+        self.bucket = bucket
+        self.embed = embed
+        self.pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="s3-ingest")
+        self._embedder = None
+        # Start time (ns) of the last completed scan per prefix
+        self._scanned_at: Dict[str, int] = {}
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+    def _download(self, key: str):
+        obj = get_s3_client().get_object(Bucket=self.bucket, Key=key)
+        return ingest_fileobj(
+            obj["Body"],
+            filename=key.rsplit("/", 1)[-1],
+            content_type=obj.get("ContentType"),
+        )
+
+    def _embeddings(self, uploads) -> Optional[List[List[float]]]:
+        if not self.embed:
+            return None
+        try:
+            if self._embedder is None:
+                # Imported lazily so classification-only workers don't load torch
+                from .outfit_compatibility import get_model
+                self._embedder = get_model()
+            vectors = self._embedder.embed_images([u.stream() for u in uploads])
+            return [[round(float(x), 6) for x in v] for v in vectors]
+        except Exception as e:
+            logger.warning(f"Embedding failed, continuing without embeddings: {e}")
+            self.embed = False
+            return None
+
+    def process_batch(self, keys: List[str]) -> Dict[str, int]:
+        """Ingest one batch of keys; returns counts of created/skipped/failed objects."""
+        stats = {"created": 0, "skipped": 0, "failed": 0}
+
+        existing = get_existing_filenames([filename_for_key(key) for key in keys])
+        pending = []
+        for key in keys:
+            if filename_for_key(key) in existing:
+                stats["skipped"] += 1
+            else:
+                pending.append(key)
+        if not pending:
+            return stats
+
+        # 1) download (parallel, streamed into spooled temp files)
+        fetched: List[Tuple[str, object]] = []
+        futures = {key: self.pool.submit(self._download, key) for key in pending}
+        for key, future in futures.items():
+            try:
+                fetched.append((key, future.result()))
+            except Exception as e:
+                logger.warning(f"Failed to fetch s3://{self.bucket}/{key}: {e}")
+                stats["failed"] += 1
+
+        uploads = [u for _, u in fetched]
+        try:
+            # 2) classify (single batched model call)
+            all_preds = classify_image_batch([u.stream() for u in uploads], topk=1)
+
+            # 3) colour (parallel; each upload has its own file handle)
+            def _color(upload):
+                try:
+                    return rgb_to_hex(get_dominant_color(upload.stream()))
+                except Exception:
+                    return "#000000"
+            colors = list(self.pool.map(_color, uploads))
+
+            # 4) embeddings (single batched forward pass)
+            embeddings = self._embeddings(uploads)
+
+            # 5) persist
+            for i, (key, upload) in enumerate(fetched):
+                preds = all_preds[i]
+                top = preds[0] if preds else {"class_name": "unknown", "confidence": 0.0}
+                class_name = top.get("class_name", "unknown")
+                fname = filename_for_key(key)
+                upload.save_to(os.path.join(UPLOAD_DIR, fname))
+
+                meta = {"raw_preds": preds, "sha256": upload.sha256, "s3_key": key}
+                if embeddings is not None:
+                    meta["embedding"] = embeddings[i]
+                try:
+                    create_item(
+                        filename=fname,
+                        class_name=class_name,
+                        confidence=float(top.get("confidence", 0.0)),
+                        color_hex=colors[i],
+                        thickness=estimate_thickness(class_name),
+                        meta=meta,
+                    )
+                except IntegrityError:
+                    # Another worker (or a redelivered message) ingested it since the check
+                    stats["skipped"] += 1
+                    continue
+                stats["created"] += 1
+        finally:
+            for upload in uploads:
+                upload.close()
+        return stats
+
+    def run_prefix(self, prefix: str, batch_size: int, full: bool = True) -> Dict[str, int]:
+        """
+        Ingest keys under `prefix`. With full=False (after a completed scan)
+        only keys issued since that scan started are listed: presigned keys
+        start with their creation time (s3_storage.presigned_upload_key), and
+        the window reaches back PRESIGN_MAX_EXPIRES, since a URL can be used
+        until it expires, plus CLOCK_SKEW_SECONDS. Keys listed again within
+        the window are skipped by the filename check in process_batch.
+        """
+        totals = {"created": 0, "skipped": 0, "failed": 0}
+        scan_start = time.time_ns()
+        since = None if full else self._scanned_at.get(prefix)
+        start_after = None
+        if since is not None:
+            floor = max(0, since - (PRESIGN_MAX_EXPIRES + CLOCK_SKEW_SECONDS) * 1_000_000_000)
+            start_after = f"{prefix}{floor:020d}"
+        for batch in _batched(iter_prefix_keys(self.bucket, prefix, start_after), batch_size):
+            stats = self.process_batch(batch)
+            for k, v in stats.items():
+                totals[k] += v
+            logger.info(f"Batch of {len(batch)}: {stats}")
+        self._scanned_at[prefix] = scan_start
+        return totals
+
+    def run_queue(self, queue_url: str, prefix: str, batch_size: int, once: bool = False) -> None:
+        sqs = boto3.client("sqs", region_name=AWS_REGION, endpoint_url=os.environ.get("SQS_ENDPOINT_URL") or None)
+        while True:
+            resp = sqs.receive_message(
+                QueueUrl=queue_url,
+                MaxNumberOfMessages=min(batch_size, 10),
+                WaitTimeSeconds=20,
+            )
+            messages = resp.get("Messages", [])
+            if not messages and once:
+                return
+
+            keys = []
+            for msg in messages:
+                try:
+                    keys.extend(keys_from_notification(msg["Body"], prefix))
+                except (ValueError, KeyError) as e:
+                    logger.warning(f"Ignoring malformed notification: {e}")
+            if keys:
+                logger.info(f"Notification batch: {self.process_batch(keys)}")
+
+            # Failed objects are logged and dropped; they can be re-driven with --once
+            for msg in messages:
+                sqs.delete_message(QueueUrl=queue_url, ReceiptHandle=msg["ReceiptHandle"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest presigned S3 uploads into the wardrobe.")
+    parser.add_argument("--bucket", default=S3_BUCKET)
+    parser.add_argument("--prefix", default=DEFAULT_PREFIX)
+    parser.add_argument("--queue-url", default=os.environ.get("S3_INGEST_QUEUE_URL"),
+                        help="SQS queue receiving S3 ObjectCreated notifications; lists the prefix when omitted")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--concurrency", type=int, default=8, help="Parallel downloads / colour workers")
+    parser.add_argument("--interval", type=float, default=30.0, help="Seconds between prefix scans")
+    parser.add_argument("--once", action="store_true", help="Process what is there now and exit")
+    parser.add_argument("--no-embed", action="store_true", help="Skip compatibility embeddings")
+    args = parser.parse_args()
+
+    init_db()
+    worker = S3IngestWorker(bucket=args.bucket, concurrency=args.concurrency, embed=not args.no_embed)
+
+    if args.queue_url:
+        worker.run_queue(args.queue_url, args.prefix, args.batch_size, once=args.once)
+        return
+
+    full = True
+    while True:
+        # The first scan lists everything (including keys from before time-ordered keys);
+        # later ones only the keys issued since
+        totals = worker.run_prefix(args.prefix, args.batch_size, full=full)
+        logger.info(f"Prefix scan complete ({'full' if full else 'incremental'}): {totals}")
+        full = False
+        if args.once:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# app/s3_storage.py
+"""
+Shared S3 client and transfer helpers.
+
+One pooled boto3 client and one TransferConfig are shared by the whole
+process. Uploads run on a dedicated thread pool so async handlers never
+block the event loop, and large bodies go through concurrent multipart
+transfers. Point S3_ENDPOINT_URL at MinIO (or a moto server) for local use.
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+import asyncio
+import logging
+import os
+import time
+import uuid
+from typing import Optional
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+
+logger = logging.getLogger(__name__)
+
+S3_BUCKET = os.environ.get("S3_BUCKET", "my-app-uploads-mlops")
+AWS_REGION = os.environ.get("AWS_REGION", "eu-north-1")
+S3_ENDPOINT_URL = os.environ.get("S3_ENDPOINT_URL") or None
+
+# Read credentials from environment only; never hardcode secrets
+AWS_ACCESS_KEY_ID = os.environ.get("AWS_ACCESS_KEY_ID")
+AWS_SECRET_ACCESS_KEY = os.environ.get("AWS_SECRET_ACCESS_KEY")
+
+S3_MAX_POOL_CONNECTIONS = int(os.environ.get("S3_MAX_POOL_CONNECTIONS", "32"))
+S3_UPLOAD_WORKERS = int(os.environ.get("S3_UPLOAD_WORKERS", "4"))
+S3_MULTIPART_THRESHOLD = int(os.environ.get("S3_MULTIPART_THRESHOLD", str(8 * 1024 * 1024)))
+S3_MULTIPART_CHUNKSIZE = int(os.environ.get("S3_MULTIPART_CHUNKSIZE", str(8 * 1024 * 1024)))
+S3_MULTIPART_CONCURRENCY = int(os.environ.get("S3_MULTIPART_CONCURRENCY", "8"))
+
+# Presigned uploads land under this prefix; URLs are valid for at most PRESIGN_MAX_EXPIRES seconds
+PRESIGN_UPLOAD_PREFIX = "user-uploads/"
+PRESIGN_MAX_EXPIRES = int(os.environ.get("PRESIGN_MAX_EXPIRES", "3600"))
+
+# Mirror files written to UPLOAD_DIR into S3 under this prefix
+S3_MIRROR_UPLOADS = os.environ.get("S3_MIRROR_UPLOADS", "").lower() in ("1", "true", "yes")
+S3_MIRROR_PREFIX = os.environ.get("S3_MIRROR_PREFIX", "uploads/")
+
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=S3_MULTIPART_THRESHOLD,
+    multipart_chunksize=S3_MULTIPART_CHUNKSIZE,
+    max_concurrency=S3_MULTIPART_CONCURRENCY,
+    use_threads=True,
+)
+
+_executor = ThreadPoolExecutor(max_workers=S3_UPLOAD_WORKERS, thread_name_prefix="s3-upload")
+
+
+@lru_cache()
+def get_s3_client():
+    """
+    Process-wide S3 client. boto3 clients are thread-safe, so the connection
+    pool is shared by request handlers, the transfer manager and the mirror.
+    """
+    config = Config(
+        region_name=AWS_REGION,
+        max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+        retries={"max_attempts": 5, "mode": "standard"},
+    )
+    kwargs = {"config": config, "endpoint_url": S3_ENDPOINT_URL}
+    if AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY:
+        kwargs["aws_access_key_id"] = AWS_ACCESS_KEY_ID
+        kwargs["aws_secret_access_key"] = AWS_SECRET_ACCESS_KEY
+    return boto3.client("s3", **kwargs)
+
+
+def presigned_upload_key(filename: str, now_ns: Optional[int] = None) -> str:
+    """
+    Key for a presigned upload: the creation time (zero-padded ns) then a
+    uuid, so keys are unique and list in the order their URLs were issued.
+    """
+    now_ns = time.time_ns() if now_ns is None else now_ns
+    return f"{PRESIGN_UPLOAD_PREFIX}{now_ns:020d}-{uuid.uuid4().hex}_{filename}"
+
+
+def public_url(key: str, bucket: str = S3_BUCKET) -> str:
+    """Best-guess URL for an object; assumes the standard AWS URL pattern unless an endpoint is set."""
+    if S3_ENDPOINT_URL:
+        return f"{S3_ENDPOINT_URL.rstrip('/')}/{bucket}/{key}"
+    return f"https://{bucket}.s3.{AWS_REGION}.amazonaws.com/{key}"
+
+
+def upload_fileobj(fileobj, key: str, content_type: Optional[str] = None, bucket: str = S3_BUCKET) -> str:
+    """Upload a binary file object, using concurrent multipart above the threshold."""
+    extra = {"ContentType": content_type or "application/octet-stream"}
+    get_s3_client().upload_fileobj(fileobj, bucket, key, ExtraArgs=extra, Config=TRANSFER_CONFIG)
+    return key
+
+
+def upload_file(path: str, key: str, content_type: Optional[str] = None, bucket: str = S3_BUCKET) -> str:
+    """Upload a local file, using concurrent multipart above the threshold."""
+    extra = {"ContentType": content_type or "application/octet-stream"}
+    get_s3_client().upload_file(path, bucket, key, ExtraArgs=extra, Config=TRANSFER_CONFIG)
+    return key
+
+
+async def upload_fileobj_async(fileobj, key: str, content_type: Optional[str] = None, bucket: str = S3_BUCKET) -> str:
+    """`upload_fileobj` run on the S3 thread pool instead of the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, upload_fileobj, fileobj, key, content_type, bucket)
+
+
+def mirror_file(path: str, content_type: str = "image/jpeg") -> Optional[Future]:
+    """
+    Copy a file written to UPLOAD_DIR into S3 in the background when
+    S3_MIRROR_UPLOADS is enabled. Failures are logged, never raised.
+    """
+    if not S3_MIRROR_UPLOADS:
+        return None
+    key = f"{S3_MIRROR_PREFIX}{os.path.basename(path)}"
+    future = _executor.submit(upload_file, path, key, content_type)
+
+    def _log_failure(done):
+        if done.exception() is not None:
+            logger.warning(f"Failed to mirror {path} to s3://{S3_BUCKET}/{key}: {done.exception()}")
+
+    future.add_done_callback(_log_failure)
+    return future
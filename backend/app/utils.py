@@ -1,11 +1,10 @@
 # app/utils.py
-from PIL import Image
 import numpy as np
 from sklearn.cluster import KMeans
-import io
 import colorsys
 import requests
 import os
+from .ingest import open_image
 
 # thickness mapping (customize)
 THICKNESS_BY_TYPE = {
@@ -39,9 +38,10 @@ def get_dominant_color(image_bytes, k=3, resize=300):
     """
     Returns the dominant color of an image as RGB tuple.
     Uses KMeans but ignores extreme background pixels (white/near-white).
+    Accepts raw bytes or a binary file handle.
     """
     # Load image
-    img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    img = open_image(image_bytes).convert("RGB")
     
     # Resize for speed
     img.thumbnail((resize, resize))
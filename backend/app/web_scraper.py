@@ -5,13 +5,58 @@ from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from bs4 import BeautifulSoup
-import time
+from selenium.common.exceptions import TimeoutException
+from bs4 import BeautifulSoup, SoupStrainer
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import atexit
+import os
+import re
+import threading
 import logging
+import requests
 from typing import List, Dict, Optional
+from .driver_pool import DriverPool, DriverUnavailable
 
 logger = logging.getLogger(__name__)
 
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+    logger.warning("lxml not available; falling back to the slower html.parser")
+
+# Browsers kept running for scraping, and pages each one serves before it is restarted
+SCRAPER_POOL_SIZE = int(os.environ.get("SCRAPER_POOL_SIZE", "2"))
+SCRAPER_MAX_PAGES_PER_DRIVER = int(os.environ.get("SCRAPER_MAX_PAGES_PER_DRIVER", "50"))
+# Seconds to wait for a free browser before giving up on a category
+SCRAPER_CHECKOUT_TIMEOUT = float(os.environ.get("SCRAPER_CHECKOUT_TIMEOUT", "60"))
+# Seconds to wait for the product listing to render after navigation
+SCRAPER_PAGE_TIMEOUT = float(os.environ.get("SCRAPER_PAGE_TIMEOUT", "10"))
+# Categories scraped concurrently; more workers than browsers only queue on the pool
+SCRAPER_WORKERS = int(os.environ.get("SCRAPER_WORKERS", str(SCRAPER_POOL_SIZE)))
+
+# Try a plain HTTP GET before rendering the page in Chrome
+SCRAPER_HTTP_FIRST = os.environ.get("SCRAPER_HTTP_FIRST", "true").lower() in ("1", "true", "yes")
+SCRAPER_HTTP_TIMEOUT = float(os.environ.get("SCRAPER_HTTP_TIMEOUT", "10"))
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+LISTING_ID = "products-listing-section"
+_LISTING_START = re.compile(r"<div\b[^>]*\bid=[\"']?" + LISTING_ID + r"[\"'\s>]", re.IGNORECASE)
+
+# How each successful page was fetched; updated from the scrape threads under _fetch_stats_lock
+fetch_stats = {"http": 0, "browser": 0, "failed": 0}
+_fetch_stats_lock = threading.Lock()
+
+_scrape_executor = ThreadPoolExecutor(max_workers=max(1, SCRAPER_WORKERS), thread_name_prefix="hm-scrape")
+
+
+def get_scrape_executor() -> ThreadPoolExecutor:
+    """Bounded executor every page scrape runs on (sized by SCRAPER_WORKERS)."""
+    return _scrape_executor
+
 # URLs to scrape
 SCRAPING_URLS = {
     "hoodies": "https://www2.hm.com/en_us/men/products/hoodies-sweatshirts.html",
@@ -56,9 +101,7 @@ def get_chrome_driver(headless: bool = True):
     chrome_options.add_argument("--disable-dev-shm-usage")
     chrome_options.add_argument("--disable-gpu")
     chrome_options.add_argument("--window-size=1920,1080")
-    chrome_options.add_argument(
-        "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-    )
+    chrome_options.add_argument(f"user-agent={USER_AGENT}")
     
     try:
         # Try to use ChromeDriver
@@ -73,6 +116,31 @@ def get_chrome_driver(headless: bool = True):
         return None
 
 
+_driver_pool = None
+_driver_pool_lock = threading.Lock()
+
+
+def get_driver_pool() -> DriverPool:
+    """Process-wide pool of headless Chrome drivers shared by all scrapes."""
+    global _driver_pool
+    if _driver_pool is None:
+        with _driver_pool_lock:
+            if _driver_pool is None:
+                _driver_pool = DriverPool(
+                    lambda: get_chrome_driver(headless=True),
+                    size=SCRAPER_POOL_SIZE,
+                    max_pages=SCRAPER_MAX_PAGES_PER_DRIVER,
+                )
+                # Don't leave orphaned Chrome processes behind on shutdown
+                atexit.register(_driver_pool.close)
+    return _driver_pool
+
+
+def warm_driver_pool(count: Optional[int] = None) -> None:
+    """Start browsers in the background so the first scrape doesn't pay for Chrome startup."""
+    threading.Thread(target=get_driver_pool().warm, args=(count,), name="driver-pool-warm", daemon=True).start()
+
+
 def _normalize_hm_image_url(url: Optional[str]) -> Optional[str]:
     """Ensure H&M image URLs are absolute and usable."""
     if not url:
@@ -83,9 +151,167 @@ def _normalize_hm_image_url(url: Optional[str]) -> Optional[str]:
         return f"https://image.hm.com{url}"
     if url.startswith("image.hm.com"):
         return f"https://{url}"
+    if url.startswith("assets/"):
+        return f"https://image.hm.com/{url}"
     return url
 
 
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """Shared keep-alive session sized for the scrape workers, with retries on throttling/5xx."""
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=4,
+                    pool_maxsize=max(4, SCRAPER_WORKERS * 2),
+                    max_retries=Retry(total=2, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504)),
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({
+                    "User-Agent": USER_AGENT,
+                    "Accept": "text/html,application/xhtml+xml",
+                    "Accept-Language": "en-US,en;q=0.9",
+                })
+                _http_session = session
+    return _http_session
+
+
+def listing_fragment(html: str) -> Optional[str]:
+    """The page from the listing <div> onwards, or None when the listing isn't in the HTML."""
+    match = _LISTING_START.search(html)
+    return html[match.start():] if match else None
+
+
+def _fetch_http(url: str) -> Optional[str]:
+    try:
+        resp = get_http_session().get(url, timeout=SCRAPER_HTTP_TIMEOUT)
+    except requests.RequestException as e:
+        logger.info(f"HTTP fetch failed for {url}: {e}")
+        return None
+    if resp.status_code != 200:
+        logger.info(f"HTTP fetch for {url} returned {resp.status_code}")
+        return None
+    return resp.text
+
+
+def _fetch_browser(url: str) -> str:
+    with get_driver_pool().driver(timeout=SCRAPER_CHECKOUT_TIMEOUT) as driver:
+        driver.get(url)
+        # Wait for the first product tile instead of sleeping a fixed time
+        try:
+            WebDriverWait(driver, SCRAPER_PAGE_TIMEOUT).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, f"#{LISTING_ID} li"))
+            )
+        except TimeoutException:
+            logger.warning(f"Product listing did not appear within {SCRAPER_PAGE_TIMEOUT}s for {url}")
+        return driver.page_source
+
+
+def parse_hm_listing(html: str, category: str, limit: int = 3, features: Optional[str] = None,
+                     partial: bool = True) -> List[Dict]:
+    """
+    Parse up to `limit` products from an H&M category listing page (live or saved HTML).
+    With `partial` only the listing <div> is built into a tree (lxml + SoupStrainer);
+    `partial=False, features="html.parser"` is the original whole-page parse.
+    """
+    if partial:
+        fragment = listing_fragment(html)
+        if fragment is None:
+            logger.warning(f"Failed to find products section for {category}")
+            return []
+        soup = BeautifulSoup(fragment, features or HTML_PARSER, parse_only=SoupStrainer("div", id=LISTING_ID))
+    else:
+        soup = BeautifulSoup(html, features or HTML_PARSER)
+    
+    section = soup.find("div", id=LISTING_ID)
+    if not section:
+        logger.warning(f"Failed to find products section for {category}")
+        return []
+    
+    items = section.find_all("li", limit=limit)
+    products = []
+    
+    for li in items:
+        try:
+            # Title
+            title_tag = li.find("h2")
+            title = title_tag.get_text(strip=True) if title_tag else "Unknown Product"
+            
+            # Link
+            link_tag = li.find("a", href=True)
+            link = None
+            if link_tag:
+                href = link_tag.get('href', '')
+                if href.startswith('http'):
+                    link = href
+                else:
+                    link = "https://www2.hm.com" + href
+            
+            # Price
+            price_tag = li.find("span", class_="d16b8d")
+            if not price_tag:
+                price_tag = li.find("span", class_=lambda x: x and "price" in x.lower())
+            price = price_tag.get_text(strip=True) if price_tag else "Price not available"
+            
+            # Default image
+            img_tag = li.find("img", {"data-src": True})
+            if not img_tag:
+                img_tag = li.find("img", {"src": True})
+            
+            default_image = None
+            if img_tag:
+                default_image = img_tag.get("data-src") or img_tag.get("src")
+            default_image = _normalize_hm_image_url(default_image)
+            
+            # Hover image
+            hover_image = None
+            if img_tag:
+                hover_image = img_tag.get("data-altimage") or img_tag.get("data-hover")
+            hover_image = _normalize_hm_image_url(hover_image)
+            
+            # Colors
+            color_spans = li.find_all("span", style=True)
+            colors = []
+            for span in color_spans:
+                style = span.get('style', '')
+                if "background-color" in style:
+                    color = style.replace("background-color:", "").strip()
+                    if color:
+                        colors.append(color)
+            
+            products.append({
+                "category": category,
+                "title": title,
+                "link": link,
+                "price": price,
+                "default_image": default_image,
+                "hover_image": hover_image,
+                "colors": colors
+            })
+        except Exception as e:
+            logger.error(f"Error parsing product item: {e}")
+            continue
+    
+    return products
+
+
+def _count_fetch(kind: str) -> None:
+    with _fetch_stats_lock:
+        fetch_stats[kind] += 1
+
+
+def fetch_stats_snapshot() -> Dict[str, int]:
+    with _fetch_stats_lock:
+        return dict(fetch_stats)
+
+
 def scrape_hm_products(category: str, limit: int = 3) -> List[Dict]:
     """
     Scrape H&M products for a given category
@@ -102,96 +328,30 @@ def scrape_hm_products(category: str, limit: int = 3) -> List[Dict]:
         logger.warning(f"No URL found for category: {category}")
         return []
     
-    driver = None
     try:
-        driver = get_chrome_driver(headless=True)
-        if not driver:
-            logger.error("Failed to initialize Chrome driver")
-            return []
-        
-        driver.get(url)
-        time.sleep(3)  # Allow page to load
-        
-        html = driver.page_source
-        soup = BeautifulSoup(html, "html.parser")
-        
-        section = soup.find("div", id="products-listing-section")
-        if not section:
-            logger.warning(f"Failed to find products section for {url}")
-            return []
-        
-        items = section.find_all("li", limit=limit)
-        products = []
-        
-        for li in items:
-            try:
-                # Title
-                title_tag = li.find("h2")
-                title = title_tag.get_text(strip=True) if title_tag else "Unknown Product"
-                
-                # Link
-                link_tag = li.find("a", href=True)
-                link = None
-                if link_tag:
-                    href = link_tag.get('href', '')
-                    if href.startswith('http'):
-                        link = href
-                    else:
-                        link = "https://www2.hm.com" + href
-                
-                # Price
-                price_tag = li.find("span", class_="d16b8d")
-                if not price_tag:
-                    price_tag = li.find("span", class_=lambda x: x and "price" in x.lower())
-                price = price_tag.get_text(strip=True) if price_tag else "Price not available"
-                
-                # Default image
-                img_tag = li.find("img", {"data-src": True})
-                if not img_tag:
-                    img_tag = li.find("img", {"src": True})
-                
-                default_image = None
-                if img_tag:
-                    default_image = img_tag.get("data-src") or img_tag.get("src")
-                default_image = _normalize_hm_image_url(default_image)
-                
-                # Hover image
-                hover_image = None
-                if img_tag:
-                    hover_image = img_tag.get("data-altimage") or img_tag.get("data-hover")
-                hover_image = _normalize_hm_image_url(hover_image)
-                
-                # Colors
-                color_spans = li.find_all("span", style=True)
-                colors = []
-                for span in color_spans:
-                    style = span.get('style', '')
-                    if "background-color" in style:
-                        color = style.replace("background-color:", "").strip()
-                        if color:
-                            colors.append(color)
-                
-                products.append({
-                    "category": category,
-                    "title": title,
-                    "link": link,
-                    "price": price,
-                    "default_image": default_image,
-                    "hover_image": hover_image,
-                    "colors": colors
-                })
-            except Exception as e:
-                logger.error(f"Error parsing product item: {e}")
-                continue
+        # Tier 1: plain HTTP; only worth parsing when the listing is server-rendered
+        if SCRAPER_HTTP_FIRST:
+            html = _fetch_http(url)
+            if html and listing_fragment(html) is not None:
+                products = parse_hm_listing(html, category, limit)
+                if products:
+                    _count_fetch("http")
+                    return products
+            logger.info(f"No listing in plain HTTP response for {category}; using the browser")
         
+        # Tier 2: render in a pooled Chrome
+        products = parse_hm_listing(_fetch_browser(url), category, limit)
+        _count_fetch("browser" if products else "failed")
         return products
         
+    except DriverUnavailable as e:
+        logger.error(f"Failed to get a Chrome driver for {category}: {e}")
+        _count_fetch("failed")
+        return []
     except Exception as e:
         logger.error(f"Error scraping {category}: {e}")
+        _count_fetch("failed")
         return []
-    finally:
-        if driver:
-            driver.quit()
 
 
 def get_recommendations_for_items(item_names: List[str], limit_per_item: int = 3) -> Dict[str, List[Dict]]:
@@ -205,16 +365,30 @@ def get_recommendations_for_items(item_names: List[str], limit_per_item: int = 3
     Returns:
         Dictionary mapping item names to their scraped products
     """
-    results = {}
-    
+    # Several categories share one H&M page (t-shirts/tshirts, hoodies/sweatshirts,
+    # trousers/track pants); each distinct URL is fetched once per call
+    items_by_url = {}
     for item_name in item_names:
         category = ITEM_TO_CATEGORY.get(item_name)
-        if category:
-            products = scrape_hm_products(category, limit=limit_per_item)
-            if products:
-                results[item_name] = products
+        if category and SCRAPING_URLS.get(category):
+            items_by_url.setdefault(SCRAPING_URLS[category], []).append((item_name, category))
         else:
             logger.debug(f"No scraping category found for: {item_name}")
     
-    return results
+    # Pages are scraped concurrently, bounded by SCRAPER_WORKERS and the driver pool
+    futures = {
+        url: _scrape_executor.submit(scrape_hm_products, items[0][1], limit_per_item)
+        for url, items in items_by_url.items()
+    }
+    
+    by_item = {}
+    for url, future in futures.items():
+        products = future.result()
+        if not products:
+            continue
+        for item_name, category in items_by_url[url]:
+            by_item[item_name] = [{**product, "category": category} for product in products]
+    
+    # Keep the caller's item order
+    return {item_name: by_item[item_name] for item_name in item_names if item_name in by_item}
 
@@ -0,0 +1 @@
+# Benchmark harnesses for backend hot paths
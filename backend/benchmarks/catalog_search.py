@@ -0,0 +1,58 @@
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+
+from app.catalog_index import CATALOG_INDEX_DIR, CatalogIndex
+
+# Shapes of the compatibility head for 128-dim embeddings
+HEAD_SHAPES = [(256, 256), (128, 256), (1, 128)]
+
+
+def synthetic_index(size: int, dim: int = 128, seed: int = 0) -> CatalogIndex:
+    rng = np.random.default_rng(seed)
+    embeddings = rng.standard_normal((size, dim)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    head = [(rng.standard_normal(s).astype(np.float32) * 0.1, np.zeros(s[0], dtype=np.float32)) for s in HEAD_SHAPES]
+    products = [{"id": str(i), "category": "tops" if i % 2 else "bottoms"} for i in range(size)]
+    return CatalogIndex(embeddings.astype(np.float16), products, head)
+
+
+def run(index: CatalogIndex, queries: int, k: int) -> Dict:
+    """Median latency of one search per mode over random unit queries, plus a batched run."""
+    rng = np.random.default_rng(1)
+    dim = index.embeddings.shape[1]
+    batch = rng.standard_normal((queries, dim)).astype(np.float32)
+    batch /= np.linalg.norm(batch, axis=1, keepdims=True)
+
+    result = {"products": len(index), "queries": queries, "k": k}
+    for mode in ("similar", "compatible"):
+        times = []
+        for q in batch:
+            start = time.perf_counter()
+            index.search(q, k=k, mode=mode)
+            times.append(time.perf_counter() - start)
+        result[f"{mode}_median_ms"] = round(float(np.median(times)) * 1000, 3)
+    start = time.perf_counter()
+    index.search(batch, k=k)
+    result["similar_batched_ms_per_query"] = round((time.perf_counter() - start) * 1000 / queries, 3)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark top-k search over the catalog index.")
+    parser.add_argument("--index", type=Path, help=f"Built index directory (e.g. {CATALOG_INDEX_DIR}); synthetic if omitted")
+    parser.add_argument("--size", type=int, default=10000, help="Rows of the synthetic index")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    index = CatalogIndex.load(str(args.index)) if args.index else synthetic_index(args.size)
+    print(json.dumps(run(index, args.queries, args.k), indent=2))
+
+
+if __name__ == "__main__":
+    main()
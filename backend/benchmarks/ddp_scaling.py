@@ -0,0 +1,120 @@
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+import torch.nn as nn
+from torch.nn.parallel import DistributedDataParallel
+
+from app.outfit_compatibility import SiameseMobileNetV2
+from ml.siamese_train import (
+    BASE_DIR,
+    PairDataset,
+    _free_port,
+    make_loader,
+    rank_zero_first,
+    set_sampler_epoch,
+    setup_distributed,
+)
+
+
+def _worker(rank: int, world_size: int, data_dir: Path, image_size: int, batch_size: int,
+            steps: int, warmup: int, threads: int, results) -> None:
+    used_threads = setup_distributed(rank, world_size, threads)
+    try:
+        dataset = PairDataset(data_dir, image_size=image_size)
+        with rank_zero_first(rank, world_size):
+            model = SiameseMobileNetV2()
+        module = DistributedDataParallel(model) if world_size > 1 else model
+        optimizer = torch.optim.Adam(model.parameters(), lr=1e-4)
+        criterion = nn.BCELoss()
+        loader = make_loader(dataset, batch_size, shuffle=True, rank=rank, world_size=world_size)
+
+        def batches():
+            epoch = 0
+            while True:
+                set_sampler_epoch(loader, epoch)
+                yield from loader
+                epoch += 1
+
+        stream = batches()
+        start = time.perf_counter()
+        for step in range(warmup + steps):
+            if step == warmup:
+                if world_size > 1:
+                    dist.barrier()
+                start = time.perf_counter()
+            img1, img2, labels = next(stream)
+            optimizer.zero_grad()
+            criterion(module(img1, img2)[0], labels).backward()
+            optimizer.step()
+        if world_size > 1:
+            dist.barrier()
+        if rank == 0:
+            results.put((time.perf_counter() - start, used_threads))
+    finally:
+        if world_size > 1:
+            dist.destroy_process_group()
+
+
+def run(data_dir: Path, process_counts: List[int], image_size: int, batch_size: int,
+        steps: int, warmup: int, threads: int) -> Dict:
+    """
+    Time `steps` DDP training steps (after `warmup`) for each process count,
+    with a fixed per-rank batch; efficiency is throughput(N) / (N * throughput(1)).
+    """
+    ctx = mp.get_context("spawn")
+    rows = []
+    for nprocs in process_counts:
+        os.environ["MASTER_ADDR"] = "127.0.0.1"
+        os.environ["MASTER_PORT"] = str(_free_port())
+        results = ctx.SimpleQueue()
+        mp.spawn(_worker, args=(nprocs, data_dir, image_size, batch_size, steps, warmup, threads, results),
+                 nprocs=nprocs, join=True)
+        elapsed, used_threads = results.get()
+        rows.append({
+            "processes": nprocs,
+            "threads_per_rank": used_threads,
+            "seconds": round(elapsed, 2),
+            "samples_per_second": round(steps * batch_size * nprocs / elapsed, 2),
+        })
+    base = rows[0]["samples_per_second"] / rows[0]["processes"]
+    for row in rows:
+        row["speedup"] = round(row["samples_per_second"] / rows[0]["samples_per_second"], 2)
+        row["efficiency"] = round(row["samples_per_second"] / (row["processes"] * base), 2)
+    return {"cpus": os.cpu_count(), "batch_size_per_rank": batch_size, "steps": steps, "runs": rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scaling efficiency of gloo/DDP Siamese training on CPU.")
+    parser.add_argument("--data", type=Path, default=BASE_DIR / "data" / "preprocessed")
+    parser.add_argument("--procs", type=int, nargs="+", default=None,
+                        help="Process counts to try (default: 1, 2, 4, ... up to the CPU count)")
+    parser.add_argument("--image-size", type=int, default=224)
+    parser.add_argument("--batch-size", type=int, default=8, help="Per-rank batch size")
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=0, help="Threads per rank (0 = CPUs / processes)")
+    parser.add_argument("--report", type=Path, help="Optional JSON report path")
+    args = parser.parse_args()
+
+    procs = args.procs
+    if not procs:
+        procs, n = [], 1
+        while n <= (os.cpu_count() or 1):
+            procs.append(n)
+            n *= 2
+    result = run(args.data, procs, args.image_size, args.batch_size, args.steps, args.warmup, args.threads)
+    if args.report:
+        args.report.parent.mkdir(parents=True, exist_ok=True)
+        args.report.write_text(json.dumps(result, indent=2), encoding="utf-8")
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
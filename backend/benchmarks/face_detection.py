@@ -0,0 +1,97 @@
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.face_analyzer import FACE_DETECT_MAX_SIDE, FaceAnalyzer
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png"}
+
+
+def _iou(a: Dict, b: Dict) -> float:
+    ax2, ay2 = a["x"] + a["w"], a["y"] + a["h"]
+    bx2, by2 = b["x"] + b["w"], b["y"] + b["h"]
+    iw = max(0, min(ax2, bx2) - max(a["x"], b["x"]))
+    ih = max(0, min(ay2, by2) - max(a["y"], b["y"]))
+    inter = iw * ih
+    union = a["w"] * a["h"] + b["w"] * b["h"] - inter
+    return inter / union if union else 0.0
+
+
+def _timed(analyzer: FaceAnalyzer, data: bytes, max_side: int, repeat: int):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            result = analyzer.analyze_face(data, max_side=max_side)
+        except ValueError:
+            result = None
+        times.append(time.perf_counter() - start)
+    return result, min(times)
+
+
+def run(image_dir: Path, max_side: int, repeat: int) -> Dict:
+    """
+    Compare the coarse-to-fine path against full-resolution detection on
+    every image under `image_dir`: best-of-`repeat` latency, bounding-box
+    IoU and agreement of the skin-tone category and face shape.
+    """
+    analyzer = FaceAnalyzer()
+    paths = sorted(p for p in image_dir.rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES)
+
+    rows: List[Dict] = []
+    for path in paths:
+        data = path.read_bytes()
+        full, full_t = _timed(analyzer, data, 0, repeat)
+        fast, fast_t = _timed(analyzer, data, max_side, repeat)
+        row: Dict[str, Optional[object]] = {
+            "image": str(path.relative_to(image_dir)),
+            "full_seconds": round(full_t, 4),
+            "fast_seconds": round(fast_t, 4),
+            "full_detected": full is not None,
+            "fast_detected": fast is not None,
+        }
+        if full and fast:
+            row["bbox_iou"] = round(_iou(full["face_bbox"], fast["face_bbox"]), 4)
+            row["skin_category_match"] = full["skin_tone"]["category"] == fast["skin_tone"]["category"]
+            row["face_shape_match"] = full["face_shape"] == fast["face_shape"]
+        rows.append(row)
+
+    both = [r for r in rows if "bbox_iou" in r]
+    full_times = [r["full_seconds"] for r in rows]
+    fast_times = [r["fast_seconds"] for r in rows]
+    summary = {
+        "images": len(rows),
+        "max_side": max_side,
+        "full_median_seconds": statistics.median(full_times) if rows else None,
+        "fast_median_seconds": statistics.median(fast_times) if rows else None,
+        "speedup": (sum(full_times) / sum(fast_times)) if rows and sum(fast_times) else None,
+        "detected_full": sum(r["full_detected"] for r in rows),
+        "detected_fast": sum(r["fast_detected"] for r in rows),
+        "mean_bbox_iou": statistics.mean(r["bbox_iou"] for r in both) if both else None,
+        "skin_category_agreement": sum(r["skin_category_match"] for r in both) / len(both) if both else None,
+        "face_shape_agreement": sum(r["face_shape_match"] for r in both) / len(both) if both else None,
+    }
+    return {"summary": summary, "images": rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark coarse-to-fine vs full-resolution face detection.")
+    parser.add_argument("--images", type=Path, required=True, help="Directory of face photos")
+    parser.add_argument("--max-side", type=int, default=FACE_DETECT_MAX_SIDE or 640)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per image; the fastest is kept")
+    parser.add_argument("--report", type=Path, help="Optional JSON report path")
+    args = parser.parse_args()
+
+    result = run(args.images, args.max_side, args.repeat)
+    if args.report:
+        args.report.parent.mkdir(parents=True, exist_ok=True)
+        args.report.write_text(json.dumps(result, indent=2), encoding="utf-8")
+    print(json.dumps(result["summary"], indent=2))
+
+
+if __name__ == "__main__":
+    main()
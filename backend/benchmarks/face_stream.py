@@ -0,0 +1,105 @@
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+from app.face_analyzer import FaceAnalyzer
+from app.face_stream import FACE_STREAM_DETECT_EVERY, FaceStreamSession
+
+
+def synthetic_frames(face_path: Path, count: int, size=(640, 480), seed: int = 0) -> Tuple[List[bytes], List[Tuple[int, int]]]:
+    """
+    Paste a face photo onto a blurred-noise background and move it along a
+    wavy path; returns the JPEG frames and the paste offset of each frame.
+    """
+    face = cv2.imread(str(face_path))
+    if face is None:
+        raise ValueError(f"Could not read {face_path}")
+    width, height = size
+    scale = min(1.0, 0.9 * height / face.shape[0])
+    face = cv2.resize(face, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    fh, fw = face.shape[:2]
+
+    rng = np.random.default_rng(seed)
+    background = cv2.GaussianBlur(rng.integers(0, 255, (height, width, 3), dtype=np.uint8), (0, 0), 5)
+    span_x, span_y = max(1, width - fw), max(1, height - fh)
+
+    frames, offsets = [], []
+    for i in range(count):
+        x = int(span_x * (0.5 + 0.4 * np.sin(i / 25)))
+        y = int(span_y * (0.5 + 0.3 * np.sin(i / 9)))
+        frame = background.copy()
+        frame[y:y + fh, x:x + fw] = face
+        frames.append(cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 85])[1].tobytes())
+        offsets.append((x, y))
+    return frames, offsets
+
+
+def run(face_path: Path, frames: int, detect_every: int) -> Dict:
+    """
+    Stream synthetic frames through a FaceStreamSession and through the
+    per-frame analyze_face pipeline; reports frames per second for both,
+    how many states were pushed, and how far the tracked box drifts from
+    the detected one (offset from the known paste position).
+    """
+    analyzer = FaceAnalyzer()
+    data, offsets = synthetic_frames(face_path, frames)
+
+    session = FaceStreamSession(analyzer, detect_every=detect_every)
+    drift = []
+    anchor = None
+    start = time.perf_counter()
+    updates = 0
+    for frame, (ox, oy) in zip(data, offsets):
+        if session.process_frame(frame) is not None:
+            updates += 1
+        if session.box is None:
+            continue
+        rel = (session.box[0] - ox, session.box[1] - oy)
+        if anchor is None:
+            anchor = rel
+        drift.append(float(np.hypot(rel[0] - anchor[0], rel[1] - anchor[1])))
+    stream_seconds = time.perf_counter() - start
+
+    sample = data[: min(len(data), 30)]
+    start = time.perf_counter()
+    for frame in sample:
+        try:
+            analyzer.analyze_face(frame)
+        except ValueError:
+            pass
+    full_seconds = time.perf_counter() - start
+
+    return {
+        "frames": frames,
+        "detect_every": detect_every,
+        "stream_fps": round(frames / stream_seconds, 1),
+        "full_pipeline_fps": round(len(sample) / full_seconds, 1),
+        "updates_pushed": updates,
+        "session_stats": session.stats,
+        "mean_drift_px": round(float(np.mean(drift)), 2) if drift else None,
+        "max_drift_px": round(float(np.max(drift)), 2) if drift else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the face stream tracker on synthetic frames.")
+    parser.add_argument("--face", type=Path, required=True, help="Photo with one face to animate")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--detect-every", type=int, default=FACE_STREAM_DETECT_EVERY)
+    parser.add_argument("--report", type=Path, help="Optional JSON report path")
+    args = parser.parse_args()
+
+    result = run(args.face, args.frames, args.detect_every)
+    if args.report:
+        args.report.parent.mkdir(parents=True, exist_ok=True)
+        args.report.write_text(json.dumps(result, indent=2), encoding="utf-8")
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
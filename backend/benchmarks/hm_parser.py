@@ -0,0 +1,90 @@
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from app.web_scraper import HTML_PARSER, SCRAPING_URLS, _fetch_browser, _fetch_http, listing_fragment, parse_hm_listing
+
+VARIANTS = {
+    # The original parse: whole page through the pure-Python parser
+    "full_html_parser": {"features": "html.parser", "partial": False},
+    "full_lxml": {"features": "lxml", "partial": False},
+    # Current default: listing <div> only
+    "partial": {"features": None, "partial": True},
+}
+
+
+def _best_of(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def save_fixtures(out_dir: Path) -> List[Path]:
+    """Save one listing page per distinct H&M URL (HTTP first, browser fallback)."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    saved = []
+    for category, url in sorted(SCRAPING_URLS.items()):
+        path = out_dir / f"{url.rstrip('/').rsplit('/', 1)[-1]}"
+        if path in saved:
+            continue
+        html = _fetch_http(url)
+        if not html or listing_fragment(html) is None:
+            html = _fetch_browser(url)
+        path.write_text(html, encoding="utf-8")
+        saved.append(path)
+        print(f"saved {category} -> {path} ({len(html)} bytes)")
+    return saved
+
+
+def run(fixtures: Path, limit: int, repeat: int) -> Dict:
+    """
+    Parse every saved listing page with each parser variant; reports the
+    best-of-`repeat` time per page and whether the products match the
+    original whole-page html.parser result.
+    """
+    rows = []
+    for path in sorted(fixtures.glob("*.htm*")):
+        html = path.read_text(encoding="utf-8", errors="replace")
+        reference = parse_hm_listing(html, path.stem, limit, features="html.parser", partial=False)
+        row = {"page": path.name, "bytes": len(html), "products": len(reference)}
+        for name, kwargs in VARIANTS.items():
+            row[f"{name}_ms"] = round(_best_of(lambda: parse_hm_listing(html, path.stem, limit, **kwargs), repeat) * 1000, 2)
+            row[f"{name}_matches"] = parse_hm_listing(html, path.stem, limit, **kwargs) == reference
+        rows.append(row)
+
+    summary = {"pages": len(rows), "limit": limit, "default_parser": HTML_PARSER}
+    if rows:
+        for name in VARIANTS:
+            summary[f"{name}_median_ms"] = statistics.median(r[f"{name}_ms"] for r in rows)
+            summary[f"{name}_agreement"] = sum(r[f"{name}_matches"] for r in rows) / len(rows)
+        base = sum(r["full_html_parser_ms"] for r in rows)
+        summary["partial_speedup"] = round(base / sum(r["partial_ms"] for r in rows), 1)
+    return {"summary": summary, "pages": rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark H&M listing parsers on saved HTML pages.")
+    parser.add_argument("--fixtures", type=Path, required=True, help="Directory of saved listing pages (*.html)")
+    parser.add_argument("--save", action="store_true", help="Download fresh fixtures into --fixtures first")
+    parser.add_argument("--limit", type=int, default=3, help="Products parsed per page")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per page; the fastest is kept")
+    parser.add_argument("--report", type=Path, help="Optional JSON report path")
+    args = parser.parse_args()
+
+    if args.save:
+        save_fixtures(args.fixtures)
+    result = run(args.fixtures, args.limit, args.repeat)
+    if args.report:
+        args.report.parent.mkdir(parents=True, exist_ok=True)
+        args.report.write_text(json.dumps(result, indent=2), encoding="utf-8")
+    print(json.dumps(result["summary"], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import argparse
+import json
+import statistics
+import tempfile
+import time
+from typing import Dict
+
+from mlflow.tracking import MlflowClient
+
+from ml.metric_buffer import MetricBuffer
+
+
+class DelayedClient:
+    """MlflowClient whose logging calls take `latency` extra seconds, like a remote tracking server."""
+
+    def __init__(self, client: MlflowClient, latency: float):
+        self.client = client
+        self.latency = latency
+
+    def log_metric(self, *args, **kwargs):
+        time.sleep(self.latency)
+        return self.client.log_metric(*args, **kwargs)
+
+    def log_batch(self, *args, **kwargs):
+        time.sleep(self.latency)
+        return self.client.log_batch(*args, **kwargs)
+
+
+def _step(seconds: float) -> None:
+    # Stands in for forward/backward; torch releases the GIL much like sleep does
+    time.sleep(seconds)
+
+
+def run(tracking_uri: str, steps: int, step_ms: float, latency_ms: float, flush_size: int) -> Dict:
+    """
+    Mean training-step time when every step logs its loss synchronously
+    (`log_metric`) versus through a MetricBuffer, plus how long the final
+    flush takes.
+    """
+    client = MlflowClient(tracking_uri=tracking_uri)
+    experiment_id = client.create_experiment(f"metric-logging-benchmark-{time.time_ns()}")
+    logger_client = DelayedClient(client, latency_ms / 1000) if latency_ms else client
+
+    run_id = client.create_run(experiment_id).info.run_id
+    sync_times = []
+    for step in range(steps):
+        start = time.perf_counter()
+        _step(step_ms / 1000)
+        logger_client.log_metric(run_id, "train_loss_step", 1.0 / (step + 1), step=step)
+        sync_times.append(time.perf_counter() - start)
+    client.set_terminated(run_id)
+
+    run_id = client.create_run(experiment_id).info.run_id
+    buffered_times = []
+    buffer = MetricBuffer(run_id, logger_client, flush_interval=5.0, flush_size=flush_size)
+    for step in range(steps):
+        start = time.perf_counter()
+        _step(step_ms / 1000)
+        buffer.log("train_loss_step", 1.0 / (step + 1), step=step)
+        buffered_times.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    buffer.close()
+    flush_seconds = time.perf_counter() - start
+    client.set_terminated(run_id)
+
+    logged = len(client.get_metric_history(run_id, "train_loss_step"))
+    sync_ms = statistics.mean(sync_times) * 1000
+    buffered_ms = statistics.mean(buffered_times) * 1000
+    return {
+        "tracking_uri": tracking_uri,
+        "steps": steps,
+        "step_compute_ms": step_ms,
+        "extra_latency_ms": latency_ms,
+        "sync_step_ms": round(sync_ms, 3),
+        "buffered_step_ms": round(buffered_ms, 3),
+        "logging_overhead_sync_ms": round(sync_ms - step_ms, 3),
+        "logging_overhead_buffered_ms": round(buffered_ms - step_ms, 3),
+        "final_flush_ms": round(flush_seconds * 1000, 1),
+        "buffered_metrics_delivered": logged,
+        "buffer_stats": buffer.stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Step time with synchronous vs buffered MLflow metric logging.")
+    parser.add_argument("--tracking-uri", help="Tracking server, e.g. http://localhost:5000 (default: temporary SQLite store)")
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--step-ms", type=float, default=20.0, help="Simulated compute per step")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Extra delay per logging call")
+    parser.add_argument("--flush-size", type=int, default=100)
+    args = parser.parse_args()
+
+    tracking_uri = args.tracking_uri or f"sqlite:///{tempfile.mkdtemp(prefix='mlflow-')}/mlflow.db"
+    print(json.dumps(run(tracking_uri, args.steps, args.step_ms, args.latency_ms, args.flush_size), indent=2))
+
+
+if __name__ == "__main__":
+    main()
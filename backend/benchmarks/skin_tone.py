@@ -0,0 +1,91 @@
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from app.face_analyzer import SKIN_SAMPLE_BUDGET, FaceAnalyzer
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png"}
+METHODS = ("kmeans", "histogram")
+
+
+def _timed(analyzer: FaceAnalyzer, img, face, method: str, repeat: int):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = analyzer.calculate_skin_tone(img, face, method=method, with_confidence=True)
+        times.append(time.perf_counter() - start)
+    return result, min(times)
+
+
+def run(image_dir: Path, repeat: int) -> Dict:
+    """
+    Compare the legacy KMeans skin-tone estimator with the subsampled
+    histogram estimator on the detected face of every image under
+    `image_dir`: best-of-`repeat` latency, category agreement and the
+    RGB / luminance difference between the two.
+    """
+    analyzer = FaceAnalyzer()
+    paths = sorted(p for p in image_dir.rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES)
+
+    rows: List[Dict] = []
+    for path in paths:
+        try:
+            img, face, _ = analyzer.locate_face(path.read_bytes())
+        except ValueError:
+            rows.append({"image": str(path.relative_to(image_dir)), "detected": False})
+            continue
+
+        results = {}
+        row: Dict = {"image": str(path.relative_to(image_dir)), "detected": True}
+        for method in METHODS:
+            result, seconds = _timed(analyzer, img, face, method, repeat)
+            results[method] = result
+            row[f"{method}_seconds"] = round(seconds, 5)
+            row[f"{method}_category"] = result["category"]
+            row[f"{method}_confidence"] = result["confidence"]
+        ref, fast = results["kmeans"], results["histogram"]
+        row["category_match"] = ref["category"] == fast["category"]
+        row["rgb_distance"] = round(sum((a - b) ** 2 for a, b in zip(ref["rgb"], fast["rgb"])) ** 0.5, 2)
+        row["luminance_delta"] = round(fast["luminance"] - ref["luminance"], 2)
+        rows.append(row)
+
+    scored = [r for r in rows if r["detected"]]
+    summary = {
+        "images": len(rows),
+        "detected": len(scored),
+        "sample_budget": SKIN_SAMPLE_BUDGET,
+    }
+    if scored:
+        kmeans_times = [r["kmeans_seconds"] for r in scored]
+        hist_times = [r["histogram_seconds"] for r in scored]
+        summary.update({
+            "kmeans_median_seconds": statistics.median(kmeans_times),
+            "histogram_median_seconds": statistics.median(hist_times),
+            "speedup": sum(kmeans_times) / sum(hist_times) if sum(hist_times) else None,
+            "category_agreement": sum(r["category_match"] for r in scored) / len(scored),
+            "mean_rgb_distance": statistics.mean(r["rgb_distance"] for r in scored),
+            "mean_luminance_delta": statistics.mean(r["luminance_delta"] for r in scored),
+        })
+    return {"summary": summary, "images": rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark KMeans vs histogram skin-tone estimation.")
+    parser.add_argument("--images", type=Path, required=True, help="Directory of face photos")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per image; the fastest is kept")
+    parser.add_argument("--report", type=Path, help="Optional JSON report path")
+    args = parser.parse_args()
+
+    result = run(args.images, args.repeat)
+    if args.report:
+        args.report.parent.mkdir(parents=True, exist_ok=True)
+        args.report.write_text(json.dumps(result, indent=2), encoding="utf-8")
+    print(json.dumps(result["summary"], indent=2))
+
+
+if __name__ == "__main__":
+    main()
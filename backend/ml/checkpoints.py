@@ -0,0 +1,127 @@
+import logging
+import os
+import random
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import torch
+
+logger = logging.getLogger("checkpoints")
+
+CHECKPOINT_PATTERN = re.compile(r"^ckpt-e(\d+)-s(\d+)\.pt$")
+
+
+def atomic_save(obj, path: Path) -> None:
+    """torch.save to a temp file in the same directory, fsync, then rename over `path`."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            torch.save(obj, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def capture_rng() -> Dict:
+    state = {"python": random.getstate(), "numpy": np.random.get_state(), "torch": torch.get_rng_state()}
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def restore_rng(state: Dict) -> None:
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+def _run_checkpoints(directory: Path) -> List[Path]:
+    """Checkpoints directly in `directory`, lowest step first."""
+    if not directory.is_dir():
+        return []
+    found = []
+    for path in directory.iterdir():
+        match = CHECKPOINT_PATTERN.match(path.name)
+        if match:
+            found.append((int(match.group(2)), int(match.group(1)), path))
+    return [path for _, _, path in sorted(found)]
+
+
+class Checkpointer:
+    """
+    Periodic training checkpoints under `root`, one subdirectory per MLflow
+    run (`use_run`), named ckpt-e<epoch>-s<step>.pt. A save is due every
+    `every_steps` optimizer steps or `every_seconds` seconds (0 disables
+    either); only the newest `keep` files of the run are kept, so runs never
+    prune or resume each other's checkpoints.
+    """
+
+    def __init__(self, root: Path, keep: int = 3, every_steps: int = 0, every_seconds: float = 600.0):
+        self.root = Path(root)
+        self.directory: Optional[Path] = None
+        self.keep = max(1, keep)
+        self.every_steps = every_steps
+        self.every_seconds = every_seconds
+        self._last_step = 0
+        self._last_time = time.monotonic()
+
+    def use_run(self, run_id: str) -> None:
+        """Write this run's checkpoints to root/<run_id>/."""
+        self.directory = self.root / run_id
+
+    def checkpoints(self) -> List[Path]:
+        """Existing checkpoints of the current run, oldest first."""
+        return _run_checkpoints(self.directory) if self.directory else []
+
+    def latest(self) -> Optional[Path]:
+        """
+        Most recently written checkpoint under root, i.e. the newest one of
+        the run that checkpointed last (checkpoints written before runs had
+        their own directory count as one more run).
+        """
+        if not self.root.is_dir():
+            return None
+        found = []
+        for directory in [self.root, *(p for p in self.root.iterdir() if p.is_dir())]:
+            for order, path in enumerate(_run_checkpoints(directory)):
+                found.append((path.stat().st_mtime_ns, order, path))
+        return max(found)[2] if found else None
+
+    def start(self, step: int) -> None:
+        """Restart the interval clocks, e.g. after resuming at `step`."""
+        self._last_step = step
+        self._last_time = time.monotonic()
+
+    def due(self, step: int) -> bool:
+        if self.every_steps and step - self._last_step >= self.every_steps:
+            return True
+        return bool(self.every_seconds) and time.monotonic() - self._last_time >= self.every_seconds
+
+    def save(self, state: Dict, epoch: int, step: int) -> Path:
+        if self.directory is None:
+            raise RuntimeError("Checkpointer.use_run() must be called before saving")
+        path = self.directory / f"ckpt-e{epoch:03d}-s{step:08d}.pt"
+        start = time.perf_counter()
+        atomic_save(state, path)
+        self.start(step)
+        # The file just written always survives, even if an older branch of the run has higher steps
+        others = [old for old in self.checkpoints() if old != path]
+        for old in others[:max(0, len(others) - (self.keep - 1))]:
+            old.unlink()
+        logger.info("Saved checkpoint %s in %.2fs", path.name, time.perf_counter() - start)
+        return path
+
+
+def load_checkpoint(path: Path) -> Dict:
+    # Checkpoints hold RNG states and history next to the tensors, so they are not weights-only
+    return torch.load(path, map_location="cpu", weights_only=False)
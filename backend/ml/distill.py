@@ -0,0 +1,211 @@
+import argparse
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import mlflow
+from mlflow.tracking import MlflowClient
+import numpy as np
+import torch
+import torch.nn as nn
+
+from app.outfit_compatibility import OutfitCompatibilityModel, StudentCompatibilityNet
+from ml.checkpoints import atomic_save
+from ml.metric_buffer import MetricBuffer
+from ml.siamese_train import PairDataset, load_params, transition_run_version
+from app.dependencies import (
+    get_registry_stage,
+    get_s3_endpoint,
+    get_student_model_name,
+    get_tracking_uri,
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("siamese_distill")
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_PARAMS = BASE_DIR / "params.yaml"
+RUNTIME_STUDENT_PATH = BASE_DIR / "models" / "compat_student.pth"
+
+
+def teacher_embeddings(teacher: nn.Module, dataset: PairDataset, device, batch_size: int = 64) -> torch.Tensor:
+    """
+    Teacher embeddings of every dataset image. The teacher is frozen, so it
+    runs once per image; pair targets then only need its compatibility head.
+    """
+    chunks = []
+    with torch.no_grad():
+        for start in range(0, len(dataset), batch_size):
+            images = dataset.image_batch(np.arange(start, min(start + batch_size, len(dataset)))).to(device)
+            chunks.append(teacher.get_embedding(images))
+    return torch.cat(chunks)
+
+
+def count_parameters(model: nn.Module) -> int:
+    return sum(p.numel() for p in model.parameters())
+
+
+def distill(params: Dict, teacher_path: Path, output_path: Path) -> Dict:
+    """
+    Train a StudentCompatibilityNet to reproduce the teacher on the
+    preprocessed images: its embeddings (cosine distance to the teacher's)
+    and its compatibility scores (BCE against the teacher's probabilities)
+    for random pairs. The student is saved with its architecture and
+    registered under the student model name.
+    """
+    cfg = params.get("distill", {})
+    train_cfg = params.get("train_siamese", {})
+    preprocess_cfg = params.get("preprocess", {})
+    preprocessed_dir = BASE_DIR / preprocess_cfg.get("output_dir", "data/preprocessed")
+    teacher_size = int(preprocess_cfg.get("image_size", 224))
+
+    student_size = int(cfg.get("image_size", 96))
+    width_mult = float(cfg.get("width_mult", 0.35))
+    batch_size = int(cfg.get("batch_size", 64))
+    num_epochs = int(cfg.get("num_epochs", 10))
+    lr = float(cfg.get("lr", 1e-3))
+    embedding_weight = float(cfg.get("embedding_weight", 1.0))
+    score_weight = float(cfg.get("score_weight", 1.0))
+
+    teacher_wrapper = OutfitCompatibilityModel(model_path=str(teacher_path), variant="teacher")
+    teacher = teacher_wrapper.model.eval()
+    device = teacher_wrapper.device
+
+    teacher_dataset = PairDataset(preprocessed_dir, image_size=teacher_size)
+    start = time.perf_counter()
+    targets = teacher_embeddings(teacher, teacher_dataset, device)
+    logger.info("Teacher embedded %s images in %.1fs", len(targets), time.perf_counter() - start)
+    # Same files in the same order, resized to the student's input
+    dataset = PairDataset(preprocessed_dir, image_size=student_size)
+    n = len(dataset)
+
+    student = StudentCompatibilityNet(embedding_dim=targets.shape[1], width_mult=width_mult, input_size=student_size)
+    student.to(device)
+    optimizer = torch.optim.Adam(student.parameters(), lr=lr)
+    bce = nn.BCELoss()
+
+    tracking_uri = get_tracking_uri()
+    s3_endpoint = get_s3_endpoint()
+    if s3_endpoint:
+        os.environ["MLFLOW_S3_ENDPOINT_URL"] = s3_endpoint
+    mlflow.set_tracking_uri(tracking_uri)
+    mlflow.set_experiment(train_cfg.get("experiment_name", "wardrobe-compatibility"))
+    student_model_name = get_student_model_name()
+
+    history: List[Tuple[int, float]] = []
+    global_step = 0
+    with mlflow.start_run(run_name="distill-student") as run:
+        mlflow.log_params(
+            {
+                "teacher": str(teacher_path),
+                "image_size": student_size,
+                "width_mult": width_mult,
+                "batch_size": batch_size,
+                "num_epochs": num_epochs,
+                "learning_rate": lr,
+                "embedding_weight": embedding_weight,
+                "score_weight": score_weight,
+                "student_parameters": count_parameters(student),
+                "teacher_parameters": count_parameters(teacher),
+            }
+        )
+        with MetricBuffer(
+            run.info.run_id,
+            MlflowClient(tracking_uri=tracking_uri),
+            flush_interval=float(train_cfg.get("metric_flush_interval", 5.0)),
+            flush_size=int(train_cfg.get("metric_flush_size", 100)),
+        ) as metric_buffer:
+            for epoch in range(num_epochs):
+                student.train()
+                running = {"loss": 0.0, "embedding_loss": 0.0, "score_loss": 0.0}
+                steps = 0
+                order = torch.randperm(n)
+                for offset in range(0, n, batch_size):
+                    rows = order[offset:offset + batch_size]
+                    partners = torch.randint(0, n, (len(rows),))
+                    img1 = dataset.image_batch(rows.numpy()).to(device)
+                    img2 = dataset.image_batch(partners.numpy()).to(device)
+                    target1, target2 = targets[rows], targets[partners]
+                    with torch.no_grad():
+                        target_scores = teacher.compatibility_head(torch.cat([target1, target2], dim=1))
+
+                    optimizer.zero_grad()
+                    scores, emb1, emb2 = student(img1, img2)
+                    # Embeddings are unit length, so 1 - dot product is the cosine distance
+                    embedding_loss = (2 - (emb1 * target1).sum(1) - (emb2 * target2).sum(1)).mean() / 2
+                    score_loss = bce(scores, target_scores)
+                    loss = embedding_weight * embedding_loss + score_weight * score_loss
+                    loss.backward()
+                    optimizer.step()
+
+                    running["loss"] += loss.item()
+                    running["embedding_loss"] += embedding_loss.item()
+                    running["score_loss"] += score_loss.item()
+                    steps += 1
+                    metric_buffer.log("distill_loss_step", loss.item(), step=global_step)
+                    global_step += 1
+
+                epoch_metrics = {key: value / max(steps, 1) for key, value in running.items()}
+                history.append((epoch, epoch_metrics["loss"]))
+                for key, value in epoch_metrics.items():
+                    metric_buffer.log(f"distill_{key}_epoch", value, step=epoch)
+                if not metric_buffer.flush(timeout=60):
+                    logger.warning("Metrics of epoch %s not yet delivered to MLflow; retrying in the background", epoch + 1)
+                logger.info(
+                    "Epoch %s: loss=%.4f (embedding %.4f, score %.4f)", epoch + 1,
+                    epoch_metrics["loss"], epoch_metrics["embedding_loss"], epoch_metrics["score_loss"],
+                )
+
+        student.eval()
+        checkpoint = {"model_state_dict": student.state_dict(), "architecture": student.config()}
+        atomic_save(checkpoint, output_path)
+        mlflow.log_artifact(str(output_path), artifact_path="checkpoints")
+        atomic_save(checkpoint, RUNTIME_STUDENT_PATH)
+
+        mlflow.pytorch.log_model(
+            pytorch_model=student,
+            artifact_path="model",
+            registered_model_name=student_model_name,
+        )
+        transition_run_version(tracking_uri, student_model_name, run.info.run_id, get_registry_stage())
+
+    return {
+        "history": history,
+        "student_parameters": count_parameters(student),
+        "teacher_parameters": count_parameters(teacher),
+        "output_path": str(output_path),
+        "runtime_checkpoint": str(RUNTIME_STUDENT_PATH),
+        "registered_model": student_model_name,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distill the compatibility model into a small student.")
+    parser.add_argument(
+        "--params-file",
+        type=Path,
+        default=DEFAULT_PARAMS,
+        help="Path to params.yaml",
+    )
+    parser.add_argument(
+        "--teacher",
+        type=Path,
+        default=BASE_DIR / "models" / "compat_mobilenetv2.pth",
+        help="Teacher checkpoint.",
+    )
+    parser.add_argument(
+        "--output-path",
+        type=Path,
+        default=BASE_DIR / "artifacts" / "compatibility" / "compat_student.pth",
+        help="Where to write the student checkpoint (DVC-tracked output).",
+    )
+    args = parser.parse_args()
+
+    params = load_params(args.params_file)
+    logger.info("Distillation complete: %s", distill(params, args.teacher, args.output_path))
+
+
+if __name__ == "__main__":
+    main()
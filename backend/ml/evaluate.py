@@ -2,15 +2,18 @@ import argparse
 import json
 import logging
 import os
+import statistics
+import time
 from pathlib import Path
 from typing import Dict
 
 import mlflow
 import torch
+import torch.nn as nn
 import yaml
 
 from app.outfit_compatibility import OutfitCompatibilityModel
-from ml.siamese_train import PairDataset
+from ml.siamese_train import PairDataset, make_loader
 from app.dependencies import get_tracking_uri, get_s3_endpoint
 
 logging.basicConfig(level=logging.INFO)
@@ -32,11 +35,12 @@ def evaluate_model(params: Dict, checkpoint_path: Path, report_path: Path) -> Di
 
     num_pairs = int(eval_cfg.get("num_pairs", 32))
     batch_size = int(eval_cfg.get("batch_size", 8))
+    num_workers = int(eval_cfg.get("num_workers", 0))
     image_size = int(preprocess_cfg.get("image_size", 224))
     preprocessed_dir = BASE_DIR / preprocess_cfg.get("output_dir", "data/preprocessed")
 
     dataset = PairDataset(preprocessed_dir, image_size=image_size)
-    dataloader = torch.utils.data.DataLoader(dataset, batch_size=batch_size, shuffle=True)
+    dataloader = make_loader(dataset, batch_size, shuffle=True, num_workers=num_workers)
 
     model_wrapper = OutfitCompatibilityModel(model_path=str(checkpoint_path))
     model = model_wrapper.model
@@ -74,6 +78,122 @@ def evaluate_model(params: Dict, checkpoint_path: Path, report_path: Path) -> Di
     return metrics
 
 
+def latency_per_item_ms(model, image_size: int, device, batch_size: int, repeats: int = 20) -> float:
+    """Median model time per image (ms) for embedding batches of `batch_size` already-preprocessed images."""
+    images = torch.randn(batch_size, 3, image_size, image_size, device=device)
+    times = []
+    with torch.no_grad():
+        model.get_embedding(images)  # warm-up
+        for _ in range(repeats):
+            start = time.perf_counter()
+            model.get_embedding(images)
+            if device.type == "cuda":
+                torch.cuda.synchronize()
+            times.append(time.perf_counter() - start)
+    return statistics.median(times) / batch_size * 1000
+
+
+def evaluate_distillation(params: Dict, teacher_path: Path, student_path: Path, report_path: Path) -> Dict:
+    """
+    Score teacher and student on the same pairs: accuracy of each against the
+    pseudo labels, how often the student agrees with the teacher (same side
+    of 0.5), mean score difference and embedding cosine, plus per-item
+    latency of each model at batch size 1 and `latency_batch_size`.
+    """
+    eval_cfg = params.get("evaluate", {})
+    preprocess_cfg = params.get("preprocess", {})
+
+    num_pairs = int(eval_cfg.get("num_pairs", 32))
+    batch_size = int(eval_cfg.get("batch_size", 8))
+    num_workers = int(eval_cfg.get("num_workers", 0))
+    latency_batch_size = int(eval_cfg.get("latency_batch_size", 32))
+    latency_repeats = int(eval_cfg.get("latency_repeats", 20))
+    image_size = int(preprocess_cfg.get("image_size", 224))
+    preprocessed_dir = BASE_DIR / preprocess_cfg.get("output_dir", "data/preprocessed")
+
+    dataset = PairDataset(preprocessed_dir, image_size=image_size)
+    dataloader = make_loader(dataset, batch_size, shuffle=True, num_workers=num_workers)
+
+    teacher_wrapper = OutfitCompatibilityModel(model_path=str(teacher_path), variant="teacher")
+    student_wrapper = OutfitCompatibilityModel(model_path=str(student_path), variant="student")
+    teacher, student = teacher_wrapper.model, student_wrapper.model
+    student_size = student_wrapper.image_size
+
+    def to_student(images: torch.Tensor) -> torch.Tensor:
+        if student_size == images.shape[-1]:
+            return images
+        return nn.functional.interpolate(
+            images, size=(student_size, student_size), mode="bilinear", align_corners=False, antialias=True
+        )
+
+    device = teacher_wrapper.device
+    total = 0
+    teacher_correct = 0
+    student_correct = 0
+    agree = 0
+    score_error = 0.0
+    cosine = 0.0
+
+    with torch.no_grad():
+        for img1, img2, labels in dataloader:
+            if total >= num_pairs:
+                break
+            img1, img2, labels = img1.to(device), img2.to(device), labels.to(device)
+            teacher_scores, teacher_emb, _ = teacher(img1, img2)
+            student_scores, student_emb, _ = student(to_student(img1), to_student(img2))
+            teacher_preds = (teacher_scores > 0.5).float()
+            student_preds = (student_scores > 0.5).float()
+            teacher_correct += (teacher_preds == labels).sum().item()
+            student_correct += (student_preds == labels).sum().item()
+            agree += (teacher_preds == student_preds).sum().item()
+            score_error += (teacher_scores - student_scores).abs().sum().item()
+            cosine += (teacher_emb * student_emb).sum().item()
+            total += labels.numel()
+
+    def model_report(wrapper: OutfitCompatibilityModel, correct: int, checkpoint: Path) -> Dict:
+        return {
+            "checkpoint": str(checkpoint),
+            "accuracy": correct / max(total, 1),
+            "parameters": sum(p.numel() for p in wrapper.model.parameters()),
+            "image_size": wrapper.image_size,
+            "latency_ms_per_item_batch1": latency_per_item_ms(
+                wrapper.model, wrapper.image_size, device, 1, latency_repeats
+            ),
+            f"latency_ms_per_item_batch{latency_batch_size}": latency_per_item_ms(
+                wrapper.model, wrapper.image_size, device, latency_batch_size, latency_repeats
+            ),
+        }
+
+    teacher_report = model_report(teacher_wrapper, teacher_correct, teacher_path)
+    student_report = model_report(student_wrapper, student_correct, student_path)
+    metrics = {
+        "evaluated_pairs": total,
+        "teacher": teacher_report,
+        "student": student_report,
+        "teacher_agreement": agree / max(total, 1),
+        "score_mae": score_error / max(total, 1),
+        "embedding_cosine": cosine / max(total, 1),
+        "speedup_batch1": teacher_report["latency_ms_per_item_batch1"] / student_report["latency_ms_per_item_batch1"],
+    }
+
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(metrics, f, indent=2)
+
+    return metrics
+
+
+def _numeric_metrics(metrics: Dict, prefix: str = "") -> Dict[str, float]:
+    """Flatten the report to the numeric values MLflow accepts as metrics."""
+    flat = {}
+    for key, value in metrics.items():
+        if isinstance(value, dict):
+            flat.update(_numeric_metrics(value, f"{prefix}{key}_"))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
 def main():
     parser = argparse.ArgumentParser(description="Evaluate Siamese compatibility model.")
     parser.add_argument(
@@ -88,6 +208,12 @@ def main():
         default=BASE_DIR / "models" / "compat_mobilenetv2.pth",
         help="Checkpoint to evaluate.",
     )
+    parser.add_argument(
+        "--student",
+        type=Path,
+        default=None,
+        help="Distilled student checkpoint; compares it against --checkpoint as the teacher.",
+    )
     parser.add_argument(
         "--report",
         type=Path,
@@ -105,6 +231,14 @@ def main():
     mlflow.set_tracking_uri(tracking_uri)
     mlflow.set_experiment(params.get("train_siamese", {}).get("experiment_name", "wardrobe-compatibility"))
 
+    if args.student:
+        with mlflow.start_run(run_name="distill-evaluate"):
+            metrics = evaluate_distillation(params, args.checkpoint, args.student, args.report)
+            mlflow.log_metrics(_numeric_metrics(metrics))
+            mlflow.log_artifact(str(args.report), artifact_path="reports")
+            logger.info("Distillation metrics: %s", metrics)
+        return
+
     with mlflow.start_run(run_name="siamese-evaluate"):
         metrics = evaluate_model(params, args.checkpoint, args.report)
         mlflow.log_metrics(metrics)
@@ -0,0 +1,155 @@
+import logging
+import threading
+import time
+from typing import List, Optional
+
+from mlflow.entities import Metric
+from mlflow.tracking import MlflowClient
+
+logger = logging.getLogger("metric_buffer")
+
+# MLflow rejects log_batch calls with more than 1000 metrics
+MAX_METRICS_PER_BATCH = 1000
+
+
+class MetricBuffer:
+    """
+    Collects step metrics in memory and sends them with
+    `MlflowClient.log_batch` from a background thread, every
+    `flush_interval` seconds or once `flush_size` metrics are waiting, so
+    the training loop never waits on the tracking server.
+
+    `flush()` blocks until everything logged so far has been sent; use it at
+    epoch end. Used as a context manager it flushes on exit, including when
+    training raises.
+
+    After a failed send the metrics stay queued and the next attempt waits
+    a full `flush_interval` (the size trigger is ignored until a send
+    succeeds), so an unreachable server is not retried in a tight loop.
+    """
+
+    def __init__(self, run_id: str, client: Optional[MlflowClient] = None,
+                 flush_interval: float = 5.0, flush_size: int = 100, max_pending: int = 100_000):
+        self.run_id = run_id
+        self.client = client or MlflowClient()
+        self.flush_interval = flush_interval
+        self.flush_size = max(1, flush_size)
+        self.max_pending = max_pending
+        self._pending: List[Metric] = []
+        self._cond = threading.Condition()
+        self._flush_requested = False
+        self._in_flight = 0
+        self._closed = False
+        self._backoff = False
+        self.stats = {"logged": 0, "sent": 0, "batches": 0, "errors": 0, "dropped": 0}
+        self._thread = threading.Thread(target=self._run, name="mlflow-metrics", daemon=True)
+        self._thread.start()
+
+    def log(self, key: str, value: float, step: int = 0) -> None:
+        metric = Metric(key=key, value=float(value), timestamp=int(time.time() * 1000), step=step)
+        with self._cond:
+            self._pending.append(metric)
+            self.stats["logged"] += 1
+            if len(self._pending) >= self.flush_size:
+                self._cond.notify()
+
+    def _send(self, batch: List[Metric]) -> bool:
+        try:
+            for start in range(0, len(batch), MAX_METRICS_PER_BATCH):
+                self.client.log_batch(self.run_id, metrics=batch[start:start + MAX_METRICS_PER_BATCH])
+            return True
+        except Exception as exc:
+            logger.warning("Could not log %s metrics to MLflow: %s", len(batch), exc)
+            return False
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_interval
+                while not (
+                    self._closed
+                    or self._flush_requested
+                    or (not self._backoff and len(self._pending) >= self.flush_size)
+                ):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._pending = self._pending, []
+                self._flush_requested = False
+                self._in_flight = len(batch)
+                closing = self._closed
+
+            sent = not batch or self._send(batch)
+            with self._cond:
+                self._in_flight = 0
+                if batch:
+                    self._backoff = not sent
+                if not sent:
+                    self.stats["errors"] += 1
+                    if closing:
+                        self.stats["dropped"] += len(batch)
+                    else:
+                        # Retried after flush_interval (or an explicit flush); only the newest max_pending metrics are kept
+                        merged = batch + self._pending
+                        self.stats["dropped"] += max(0, len(merged) - self.max_pending)
+                        self._pending = merged[-self.max_pending:]
+                elif batch:
+                    self.stats["sent"] += len(batch)
+                    self.stats["batches"] += 1
+                self._cond.notify_all()
+                if closing:
+                    return
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Send everything logged so far. Returns False if a send failed (the
+        metrics stay queued for the next flush) or it did not finish in time.
+        """
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            errors = self.stats["errors"]
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._pending or self._in_flight:
+                if self.stats["errors"] > errors or not self._thread.is_alive():
+                    return False
+                remaining = None if end is None else end - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return self.stats["errors"] == errors
+
+    def close(self, timeout: Optional[float] = 30.0) -> None:
+        """Flush once more and stop the background thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def __enter__(self) -> "MetricBuffer":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+class NullMetricBuffer:
+    """Drop-in for MetricBuffer on processes that must not log (non-zero DDP ranks)."""
+
+    stats: dict = {}
+
+    def log(self, key: str, value: float, step: int = 0) -> None:
+        pass
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        return True
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        pass
+
+    def __enter__(self) -> "NullMetricBuffer":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
@@ -1,13 +1,103 @@
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
 import os
+import shutil
+import time
 from pathlib import Path
-from typing import Dict, Tuple
+from typing import Dict, Optional, Tuple
 
+import numpy as np
 import yaml
 from PIL import Image
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 DEFAULT_PARAMS = BASE_DIR / "params.yaml"
+SOURCE_SUFFIXES = {".jpg", ".jpeg", ".png"}
+MANIFEST_NAME = "manifest.json"
+# Output suffix per format; "raw" stores the resized HxWx3 uint8 array as .npy
+FORMAT_SUFFIXES = {"png": ".png", "jpeg": ".jpg", "raw": ".npy"}
+# Packed dataset inside output_dir: images.npy [N, H, W, 3] uint8, labels.npy [N], index.json
+PACKED_DIR = "packed"
+
+
+def _read_output(path: Path) -> np.ndarray:
+    if path.suffix == ".npy":
+        return np.load(path)
+    with Image.open(path) as img:
+        return np.asarray(img.convert("RGB"), dtype=np.uint8)
+
+
+def _fingerprint(files: Dict) -> str:
+    digest = hashlib.sha256()
+    for key in sorted(files):
+        digest.update(f"{files[key]['output']}:{files[key]['sha256']}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def pack_dataset(output_dir: Path, files: Dict, image_size: int) -> Optional[Dict]:
+    """
+    Write every preprocessed image into one contiguous uint8 array that
+    training memory-maps instead of decoding files. Labels are the index of
+    each image's top-level folder (its category); index.json maps rows to
+    sources. Skipped (returns None) when the packed copy is already current.
+    """
+    packed_dir = output_dir / PACKED_DIR
+    fingerprint = _fingerprint(files)
+    try:
+        with open(packed_dir / "index.json", "r", encoding="utf-8") as f:
+            if json.load(f).get("fingerprint") == fingerprint:
+                return None
+    except (OSError, ValueError):
+        pass
+
+    keys = sorted(files)
+    classes = sorted({key.split("/", 1)[0] if "/" in key else "" for key in keys})
+    class_ids = {name: i for i, name in enumerate(classes)}
+    packed_dir.mkdir(parents=True, exist_ok=True)
+
+    tmp_images = packed_dir / "images.npy.tmp"
+    images = np.lib.format.open_memmap(tmp_images, mode="w+", dtype=np.uint8, shape=(len(keys), image_size, image_size, 3))
+    for row, key in enumerate(keys):
+        images[row] = _read_output(output_dir / files[key]["output"])
+    images.flush()
+    del images
+    labels = np.array([class_ids[key.split("/", 1)[0] if "/" in key else ""] for key in keys], dtype=np.int32)
+    with open(packed_dir / "labels.npy.tmp", "wb") as f:
+        np.save(f, labels)
+    os.replace(tmp_images, packed_dir / "images.npy")
+    os.replace(packed_dir / "labels.npy.tmp", packed_dir / "labels.npy")
+
+    index = {"fingerprint": fingerprint, "shape": [len(keys), image_size, image_size, 3], "classes": classes, "files": keys}
+    with open(packed_dir / "index.json.tmp", "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(packed_dir / "index.json.tmp", packed_dir / "index.json")
+    return index
+
+
+def load_packed(data_dir: Path) -> Optional[Tuple[np.ndarray, np.ndarray, Dict]]:
+    """
+    (images memmap, labels, index) of the packed dataset under data_dir, or
+    None when it is missing or stale, i.e. not built from the files listed
+    in the current manifest (a run with pack disabled leaves it behind).
+    """
+    data_dir = Path(data_dir)
+    packed_dir = data_dir / PACKED_DIR
+    try:
+        with open(packed_dir / "index.json", "r", encoding="utf-8") as f:
+            index = json.load(f)
+        with open(data_dir / MANIFEST_NAME, "r", encoding="utf-8") as f:
+            files = json.load(f).get("files", {})
+    except (OSError, ValueError):
+        return None
+    if index.get("fingerprint") != _fingerprint(files):
+        return None
+    images = np.load(packed_dir / "images.npy", mmap_mode="r")
+    labels = np.load(packed_dir / "labels.npy")
+    if list(images.shape) != index["shape"] or len(labels) != len(images):
+        return None
+    return images, labels, index
 
 
 def load_params(params_file: Path) -> Dict:
@@ -15,43 +105,182 @@ def load_params(params_file: Path) -> Dict:
         return yaml.safe_load(f)
 
 
-def preprocess_image(src_path: Path, dst_path: Path, image_size: Tuple[int, int]) -> None:
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def preprocess_image(src_path: Path, dst_path: Path, image_size: Tuple[int, int],
+                     fmt: str = "png", png_compress_level: int = 1, jpeg_quality: int = 90) -> None:
     dst_path.parent.mkdir(parents=True, exist_ok=True)
-    with Image.open(src_path).convert("RGB") as img:
-        img = img.resize(image_size)
-        img.save(dst_path, format="PNG", optimize=True)
+    tmp_path = dst_path.with_name(f".{dst_path.name}.{os.getpid()}.tmp")
+    with Image.open(src_path) as src:
+        img = src.convert("RGB").resize(image_size)
+    with open(tmp_path, "wb") as f:
+        if fmt == "raw":
+            np.save(f, np.asarray(img, dtype=np.uint8))
+        elif fmt == "jpeg":
+            img.save(f, format="JPEG", quality=jpeg_quality)
+        else:
+            img.save(f, format="PNG", compress_level=png_compress_level)
+    os.replace(tmp_path, dst_path)
+
+
+def _process_one(task: Tuple) -> Tuple[str, Optional[str], str]:
+    """
+    Worker: hash the source and convert it unless the manifest already has
+    that hash. Returns (relative path, sha256 or None, status).
+    """
+    relative, src_path, dst_path, known_hash, image_size, fmt, png_level, jpeg_quality = task
+    try:
+        sha = file_sha256(src_path)
+        if sha == known_hash and dst_path.exists():
+            return relative, sha, "unchanged"
+        preprocess_image(src_path, dst_path, image_size, fmt, png_level, jpeg_quality)
+        return relative, sha, "processed"
+    except Exception:
+        return relative, None, "failed"
+
 
+def _load_manifest(path: Path, settings: Dict) -> Tuple[Dict, bool]:
+    """
+    (previous manifest entries, whether they were written with these
+    settings). Entries are returned either way: their outputs still have to
+    be cleaned up when the settings changed.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}, False
+    return manifest.get("files", {}), manifest.get("settings") == settings
 
-def run(params: Dict) -> Dict:
+
+def run(params: Dict, workers: Optional[int] = None) -> Dict:
+    """
+    Resize every source image into output_dir. A manifest in output_dir maps
+    each source (relative path) to its size, mtime, sha256 and output, so
+    later runs only convert new or changed files and drop outputs of
+    deleted sources. Changing image_size or the output format reconverts
+    everything and removes the outputs of the old format.
+    """
     cfg = params.get("preprocess", {})
     input_dir = BASE_DIR / cfg.get("input_dir", "uploads")
     output_dir = BASE_DIR / cfg.get("output_dir", "data/preprocessed")
     image_size = int(cfg.get("image_size", 224))
+    fmt = str(cfg.get("format", "png")).lower()
+    if fmt not in FORMAT_SUFFIXES:
+        raise ValueError(f"preprocess.format must be one of {sorted(FORMAT_SUFFIXES)}, got {fmt!r}")
+    png_level = int(cfg.get("png_compress_level", 1))
+    jpeg_quality = int(cfg.get("jpeg_quality", 90))
+    workers = workers or int(cfg.get("workers", 0)) or os.cpu_count() or 1
 
-    processed = 0
-    skipped = 0
+    settings = {"image_size": image_size, "format": fmt, "png_compress_level": png_level, "jpeg_quality": jpeg_quality}
+    manifest_path = output_dir / MANIFEST_NAME
+    previous_files, same_settings = _load_manifest(manifest_path, settings)
+    # Entries written with other settings are only used for cleanup
+    previous = previous_files if same_settings else {}
+    start = time.perf_counter()
 
-    for src_path in input_dir.rglob("*"):
+    files: Dict[str, Dict] = {}
+    tasks = []
+    skipped = 0
+    unchanged = 0
+    for src_path in sorted(input_dir.rglob("*")):
         if src_path.is_dir():
             continue
-        if src_path.suffix.lower() not in {".jpg", ".jpeg", ".png"}:
+        if src_path.suffix.lower() not in SOURCE_SUFFIXES:
             skipped += 1
             continue
-
         relative = src_path.relative_to(input_dir)
-        dst_path = output_dir / relative.with_suffix(".png")
-        try:
-            preprocess_image(src_path, dst_path, (image_size, image_size))
-            processed += 1
-        except Exception:
-            skipped += 1
+        key = relative.as_posix()
+        output = relative.with_suffix(FORMAT_SUFFIXES[fmt]).as_posix()
+        stat = src_path.stat()
+        entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "output": output}
+        old = previous.get(key)
+        if (
+            old
+            and old.get("size") == stat.st_size
+            and old.get("mtime_ns") == stat.st_mtime_ns
+            and old.get("output") == output
+            and (output_dir / output).exists()
+        ):
+            # Same size and mtime: trust the recorded hash without reading the file
+            files[key] = {**entry, "sha256": old["sha256"]}
+            unchanged += 1
+            continue
+        files[key] = entry
+        known = old.get("sha256") if old and old.get("output") == output else None
+        tasks.append((key, src_path, output_dir / output, known, (image_size, image_size), fmt, png_level, jpeg_quality))
+
+    processed = 0
+    failed = 0
+    bytes_in = 0
+    if tasks:
+        if workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+                results = list(pool.map(_process_one, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+        else:
+            results = [_process_one(task) for task in tasks]
+        for key, sha, status in results:
+            if status == "failed":
+                files.pop(key)
+                failed += 1
+                continue
+            files[key]["sha256"] = sha
+            if status == "processed":
+                processed += 1
+                bytes_in += files[key]["size"]
+            else:
+                unchanged += 1
+
+    # Outputs whose source was deleted (or renamed), or written in a previous
+    # format, would otherwise leak into training
+    removed = 0
+    keep = {entry["output"] for entry in files.values()}
+    for output in {entry.get("output") for entry in previous_files.values()} - keep:
+        if not output:
+            continue
+        path = output_dir / output
+        if path.exists():
+            path.unlink()
+            removed += 1
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    tmp_manifest = manifest_path.with_suffix(".json.tmp")
+    with open(tmp_manifest, "w", encoding="utf-8") as f:
+        json.dump({"settings": settings, "files": files}, f, indent=1, sort_keys=True)
+    os.replace(tmp_manifest, manifest_path)
 
+    packed = None
+    if cfg.get("pack", True):
+        pack_start = time.perf_counter()
+        packed = pack_dataset(output_dir, files, image_size)
+        pack_seconds = time.perf_counter() - pack_start
+    elif (output_dir / PACKED_DIR).exists():
+        # Never left to go stale next to the files training reads instead
+        shutil.rmtree(output_dir / PACKED_DIR)
+
+    elapsed = time.perf_counter() - start
     summary = {
         "processed": processed,
-        "skipped": skipped,
+        "unchanged": unchanged,
+        "removed": removed,
+        "skipped": skipped + failed,
         "output_dir": str(output_dir),
         "image_size": image_size,
+        "format": fmt,
+        "workers": workers,
+        "seconds": round(elapsed, 2),
+        "images_per_second": round(processed / elapsed, 1) if processed else 0.0,
+        "source_mb_per_second": round(bytes_in / elapsed / 1e6, 2) if processed else 0.0,
     }
+    if packed is not None:
+        summary["packed_images"] = packed["shape"][0]
+        summary["pack_seconds"] = round(pack_seconds, 2)
     return summary
 
 
@@ -63,14 +292,19 @@ def main():
         default=DEFAULT_PARAMS,
         help="Path to params.yaml",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Worker processes (default: preprocess.workers, 0 = one per CPU)",
+    )
     args = parser.parse_args()
 
     params = load_params(args.params_file)
-    summary = run(params)
+    summary = run(params, workers=args.workers)
 
     print(f"Preprocessing complete: {summary}")
 
 
 if __name__ == "__main__":
     main()
-
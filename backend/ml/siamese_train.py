@@ -1,20 +1,32 @@
 import argparse
+import hashlib
 import logging
+import math
 import os
 import random
+import socket
+import time
+from contextlib import contextmanager, nullcontext
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import mlflow
 from mlflow.tracking import MlflowClient
+import numpy as np
 import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
 import torch.nn as nn
-from torch.utils.data import DataLoader, Dataset
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import BatchSampler, DataLoader, Dataset, DistributedSampler, RandomSampler, SequentialSampler
 from torchvision import transforms
 from PIL import Image
 import yaml
 
 from app.outfit_compatibility import SiameseMobileNetV2
+from ml.checkpoints import Checkpointer, atomic_save, capture_rng, load_checkpoint, restore_rng
+from ml.metric_buffer import MetricBuffer, NullMetricBuffer
+from ml.preprocess import PACKED_DIR, load_packed
 from app.dependencies import (
     get_registry_model_name,
     get_registry_stage,
@@ -30,16 +42,53 @@ DEFAULT_PARAMS = BASE_DIR / "params.yaml"
 RUNTIME_MODEL_PATH = BASE_DIR / "models" / "compat_mobilenetv2.pth"
 
 
+def _open_rgb(path: Path) -> Image.Image:
+    """Preprocessed image as RGB; `.npy` files are raw uint8 arrays (preprocess format: raw)."""
+    if path.suffix.lower() == ".npy":
+        return Image.fromarray(np.load(path))
+    return Image.open(path).convert("RGB")
+
+
+IMAGENET_MEAN = torch.tensor([0.485, 0.456, 0.406]).view(1, 3, 1, 1)
+IMAGENET_STD = torch.tensor([0.229, 0.224, 0.225]).view(1, 3, 1, 1)
+
+
 class PairDataset(Dataset):
     """
     Lightweight dataset that generates pseudo labels for compatibility.
     In a real setting you would supply curated positive/negative pairs.
+
+    Reads the packed uint8 array written by ml.preprocess when present
+    (memory-mapped, shared by all loader workers, no decoding); otherwise
+    falls back to decoding the image files. In packed mode an index may be
+    a list of indices, which returns a whole batch from one gather and one
+    vectorized normalization (see `make_loader`).
     """
 
-    def __init__(self, image_dir: Path, image_size: int):
-        self.image_paths: List[Path] = [
-            p for p in image_dir.rglob("*") if p.suffix.lower() in {".png", ".jpg", ".jpeg"}
-        ]
+    def __init__(self, image_dir: Path, image_size: int, use_packed: bool = True):
+        self.image_dir = Path(image_dir)
+        self.image_size = image_size
+        self._images = None
+        packed = load_packed(self.image_dir) if use_packed else None
+        if packed is not None:
+            images, self.labels, index = packed
+            self.packed = True
+            self.fingerprint = index["fingerprint"]
+            self.image_paths: List[Path] = [self.image_dir / name for name in index["files"]]
+            self._stored_size = images.shape[1]
+        else:
+            self.packed = False
+            self.labels = None
+            self.image_paths = [
+                p
+                for p in self.image_dir.rglob("*")
+                if p.suffix.lower() in {".png", ".jpg", ".jpeg", ".npy"} and PACKED_DIR not in p.relative_to(self.image_dir).parts
+            ]
+            digest = hashlib.sha256()
+            for path in sorted(self.image_paths):
+                stat = path.stat()
+                digest.update(f"{path.relative_to(self.image_dir).as_posix()}:{stat.st_size}:{stat.st_mtime_ns}\n".encode("utf-8"))
+            self.fingerprint = digest.hexdigest()
         if len(self.image_paths) < 2:
             raise ValueError("Need at least two images to form pairs.")
 
@@ -51,18 +100,69 @@ class PairDataset(Dataset):
             ]
         )
 
+    @property
+    def images(self) -> np.ndarray:
+        # Opened lazily so each DataLoader worker maps the file itself rather than unpickling a copy
+        if self._images is None:
+            self._images = np.load(self.image_dir / PACKED_DIR / "images.npy", mmap_mode="r")
+        return self._images
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_images"] = None
+        return state
+
     def __len__(self) -> int:
         return len(self.image_paths)
 
-    def __getitem__(self, idx: int):
+    def image_batch(self, rows: np.ndarray) -> torch.Tensor:
+        """Normalized images for dataset rows (no pairing), e.g. for feature extraction."""
+        if self.packed:
+            return self._normalize(self._gather(np.asarray(rows, dtype=np.int64)))
+        tensors = []
+        for row in rows:
+            with _open_rgb(self.image_paths[row]) as img:
+                tensors.append(self.transform(img))
+        return torch.stack(tensors)
+
+    def _normalize(self, batch: np.ndarray) -> torch.Tensor:
+        """[B, H, W, 3] uint8 -> normalized [B, 3, S, S] float32."""
+        tensor = torch.from_numpy(batch).permute(0, 3, 1, 2).float().div_(255)
+        if self._stored_size != self.image_size:
+            tensor = nn.functional.interpolate(
+                tensor, size=(self.image_size, self.image_size), mode="bilinear", align_corners=False, antialias=True
+            )
+        return tensor.sub_(IMAGENET_MEAN).div_(IMAGENET_STD)
+
+    def _gather(self, rows: np.ndarray) -> np.ndarray:
+        """Copy rows out of the memmap in ascending order (sequential reads), then restore the order."""
+        order = np.argsort(rows)
+        out = np.empty((len(rows),) + self.images.shape[1:], dtype=np.uint8)
+        out[order] = self.images[rows[order]]
+        return out
+
+    def _packed_batch(self, indices: np.ndarray):
+        n = len(self.image_paths)
+        partners = torch.randint(0, n, (len(indices),)).numpy()
+        # Pseudo label: even indexes are positives, odd are negatives
+        labels = torch.from_numpy((indices % 2 == 0).astype(np.float32)).unsqueeze(1)
+        return self._normalize(self._gather(indices % n)), self._normalize(self._gather(partners)), labels
+
+    def __getitem__(self, idx):
+        if self.packed:
+            if isinstance(idx, (list, tuple, np.ndarray, torch.Tensor)):
+                return self._packed_batch(np.asarray(idx, dtype=np.int64))
+            img1, img2, label = self._packed_batch(np.array([idx], dtype=np.int64))
+            return img1[0], img2[0], label[0]
+
         img1_path = self.image_paths[idx % len(self.image_paths)]
         img2_path = random.choice(self.image_paths)
 
         # Pseudo label: even indexes are positives, odd are negatives
         label = 1.0 if idx % 2 == 0 else 0.0
 
-        with Image.open(img1_path).convert("RGB") as img1:
-            with Image.open(img2_path).convert("RGB") as img2:
+        with _open_rgb(img1_path) as img1:
+            with _open_rgb(img2_path) as img2:
                 return (
                     self.transform(img1),
                     self.transform(img2),
@@ -70,6 +170,160 @@ class PairDataset(Dataset):
                 )
 
 
+def make_loader(dataset: PairDataset, batch_size: int, shuffle: bool = True, num_workers: int = 0,
+                rank: int = 0, world_size: int = 1) -> DataLoader:
+    """
+    DataLoader over a PairDataset. Packed datasets are sampled a batch at a
+    time (one __getitem__ call per batch instead of batch_size calls). With
+    world_size > 1 each rank iterates its own DistributedSampler shard;
+    call `set_sampler_epoch` every epoch so the shards reshuffle.
+    """
+    worker_args = {"num_workers": num_workers, "persistent_workers": num_workers > 0}
+    if world_size > 1:
+        base = DistributedSampler(dataset, num_replicas=world_size, rank=rank, shuffle=shuffle)
+    else:
+        base = RandomSampler(dataset) if shuffle else SequentialSampler(dataset)
+    if dataset.packed:
+        sampler = BatchSampler(base, batch_size=batch_size, drop_last=False)
+        return DataLoader(dataset, sampler=sampler, batch_size=None, **worker_args)
+    return DataLoader(dataset, batch_size=batch_size, sampler=base, **worker_args)
+
+
+def set_sampler_epoch(loader: DataLoader, epoch: int) -> None:
+    sampler = loader.sampler
+    while sampler is not None:
+        if isinstance(sampler, DistributedSampler):
+            sampler.set_epoch(epoch)
+            return
+        sampler = getattr(sampler, "sampler", None)
+
+
+def backbone_fingerprint(model: nn.Module) -> str:
+    """Hash of the backbone weights; feature caches are only valid for identical weights."""
+    digest = hashlib.sha256()
+    for name, tensor in sorted(model.backbone.state_dict().items()):
+        digest.update(name.encode("utf-8"))
+        digest.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+    return digest.hexdigest()
+
+
+def cached_features(model: nn.Module, dataset: PairDataset, cache_dir: Path, device, batch_size: int = 64) -> torch.Tensor:
+    """
+    Pooled 1280-dim backbone features of every dataset image, computed once
+    and stored under `cache_dir`, keyed by the backbone weights, the dataset
+    contents and the image size.
+    """
+    key = hashlib.sha256(
+        f"{backbone_fingerprint(model)}:{dataset.fingerprint}:{dataset.image_size}".encode("utf-8")
+    ).hexdigest()[:24]
+    path = Path(cache_dir) / f"features-{key}.npy"
+    if path.exists():
+        logger.info("Using cached backbone features %s", path)
+        return torch.from_numpy(np.load(path))
+
+    model.backbone.eval()
+    pool = nn.AdaptiveAvgPool2d((1, 1))
+    chunks = []
+    with torch.no_grad():
+        for start in range(0, len(dataset), batch_size):
+            images = dataset.image_batch(np.arange(start, min(start + batch_size, len(dataset)))).to(device)
+            chunks.append(pool(model.backbone(images)).flatten(1).cpu())
+    features = torch.cat(chunks)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".npy.tmp")
+    with open(tmp_path, "wb") as f:
+        np.save(f, features.numpy())
+    tmp_path.replace(path)
+    logger.info("Cached %s backbone features to %s", len(features), path)
+    return features
+
+
+def feature_pair_batches(features: torch.Tensor, batch_size: int, rank: int = 0, world_size: int = 1, seed: int = 0):
+    """
+    Shuffled (feat1, feat2, label) batches with the same pseudo labels as
+    PairDataset. Every rank draws the same permutation (`seed`, e.g. the
+    epoch) and takes its own slice, padded so all ranks run the same
+    number of steps.
+    """
+    n = len(features)
+    order = torch.randperm(n, generator=torch.Generator().manual_seed(seed))
+    total = math.ceil(n / world_size) * world_size
+    order = torch.cat([order, order[: total - n]])[rank::world_size]
+    for start in range(0, len(order), batch_size):
+        idx = order[start:start + batch_size]
+        partners = torch.randint(0, n, (len(idx),))
+        labels = (idx % 2 == 0).float().unsqueeze(1)
+        yield features[idx], features[partners], labels
+
+
+class FeatureHeads(nn.Module):
+    """The embedding and compatibility head of a SiameseMobileNetV2, applied to pooled backbone features."""
+
+    def __init__(self, model: SiameseMobileNetV2):
+        super().__init__()
+        self.embedding = model.embedding
+        self.compatibility_head = model.compatibility_head
+
+    def forward(self, feat1: torch.Tensor, feat2: torch.Tensor) -> torch.Tensor:
+        emb1 = nn.functional.normalize(self.embedding(feat1[:, :, None, None]), p=2, dim=1)
+        emb2 = nn.functional.normalize(self.embedding(feat2[:, :, None, None]), p=2, dim=1)
+        return self.compatibility_head(torch.cat([emb1, emb2], dim=1))
+
+
+def setup_distributed(rank: int, world_size: int, threads_per_rank: int = 0) -> int:
+    """
+    Pin this process's intra-op threads (default: an equal share of the
+    CPUs per rank) and join the gloo process group when world_size > 1.
+    MASTER_ADDR/MASTER_PORT come from the launcher. Returns the thread count.
+    """
+    if threads_per_rank <= 0 and world_size > 1:
+        threads_per_rank = max(1, (os.cpu_count() or 1) // world_size)
+    if threads_per_rank > 0:
+        torch.set_num_threads(threads_per_rank)
+        try:
+            torch.set_num_interop_threads(1 if world_size > 1 else threads_per_rank)
+        except RuntimeError:
+            pass  # already fixed by earlier parallel work in this process
+    if world_size > 1 and not dist.is_initialized():
+        dist.init_process_group("gloo", rank=rank, world_size=world_size)
+    return torch.get_num_threads()
+
+
+@contextmanager
+def rank_zero_first(rank: int, world_size: int):
+    """Run the block on rank 0 before the other ranks (downloads, cache files)."""
+    if world_size > 1 and rank != 0:
+        dist.barrier()
+    yield
+    if world_size > 1 and rank == 0:
+        dist.barrier()
+
+
+def transition_run_version(tracking_uri: str, model_name: str, run_id: str, stage: str) -> None:
+    """Move the registry version of `model_name` logged by `run_id` to `stage` (best effort)."""
+    try:
+        client = MlflowClient(tracking_uri=tracking_uri)
+        versions = client.search_model_versions(f"name='{model_name}'")
+        current_version = next(
+            (v for v in versions if v.run_id == run_id), None
+        )
+        if current_version and stage:
+            client.transition_model_version_stage(
+                name=model_name,
+                version=current_version.version,
+                stage=stage,
+                archive_existing_versions=False,
+            )
+            logger.info(
+                "Registered model version %s transitioned to stage %s",
+                current_version.version,
+                stage,
+            )
+    except Exception as exc:  # pragma: no cover - best-effort registry push
+        logger.warning("Could not push model to registry: %s", exc)
+
+
 def load_params(params_file: Path) -> Dict:
     with open(params_file, "r", encoding="utf-8") as f:
         return yaml.safe_load(f)
@@ -78,7 +332,25 @@ def load_params(params_file: Path) -> Dict:
 def train(
     params: Dict,
     output_path: Path,
+    rank: int = 0,
+    world_size: int = 1,
+    resume: Optional[str] = None,
 ) -> Dict:
+    """
+    Train on this process; with world_size > 1 this is one rank of a
+    DistributedDataParallel job (see `launch`). Only rank 0 talks to MLflow
+    and writes checkpoints. `resume` is a checkpoint path or "latest".
+    """
+    threads = setup_distributed(rank, world_size, int(params.get("train_siamese", {}).get("threads_per_rank", 0)))
+    try:
+        return _train(params, output_path, rank, world_size, threads, resume)
+    finally:
+        if world_size > 1 and dist.is_initialized():
+            dist.destroy_process_group()
+
+
+def _train(params: Dict, output_path: Path, rank: int, world_size: int, threads: int, resume: Optional[str]) -> Dict:
+    is_main = rank == 0
     train_cfg = params.get("train_siamese", {})
     image_size = int(params.get("preprocess", {}).get("image_size", 224))
     preprocessed_dir = BASE_DIR / params.get("preprocess", {}).get("output_dir", "data/preprocessed")
@@ -87,75 +359,233 @@ def train(
     num_epochs = int(train_cfg.get("num_epochs", 2))
     lr = float(train_cfg.get("lr", 5e-4))
     embedding_dim = int(train_cfg.get("embedding_dim", 128))
+    num_workers = int(train_cfg.get("num_workers", 2))
+    mode = train_cfg.get("mode", "full")
+    if mode not in ("full", "frozen_backbone"):
+        raise ValueError(f"train_siamese.mode must be 'full' or 'frozen_backbone', got {mode!r}")
+    init_checkpoint = train_cfg.get("init_checkpoint")
 
     dataset = PairDataset(preprocessed_dir, image_size=image_size)
-    dataloader = DataLoader(dataset, batch_size=batch_size, shuffle=True)
 
-    model = SiameseMobileNetV2(embedding_dim=embedding_dim)
+    # Rank 0 downloads the pretrained weights first; DDP then broadcasts its parameters
+    with rank_zero_first(rank, world_size):
+        model = SiameseMobileNetV2(embedding_dim=embedding_dim)
+    if init_checkpoint:
+        checkpoint = torch.load(BASE_DIR / init_checkpoint, map_location="cpu")
+        model.load_state_dict(checkpoint.get("model_state_dict", checkpoint), strict=False)
+        logger.info("Initialised from %s", init_checkpoint)
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     model.to(device)
 
+    dataloader = None
+    if mode == "frozen_backbone":
+        # Only embedding + compatibility_head train, on features computed once per backbone
+        model.backbone.requires_grad_(False)
+        batch_size = int(train_cfg.get("frozen_batch_size", 256))
+        with rank_zero_first(rank, world_size):
+            features = cached_features(
+                model, dataset, BASE_DIR / train_cfg.get("feature_cache_dir", "data/feature_cache"), device
+            ).to(device)
+        trainable = FeatureHeads(model)
+
+        def epoch_batches(epoch):
+            return feature_pair_batches(features, batch_size, rank, world_size, seed=epoch)
+    else:
+        dataloader = make_loader(dataset, batch_size, shuffle=True, num_workers=num_workers,
+                                 rank=rank, world_size=world_size)
+        trainable = model
+
+        def epoch_batches(epoch):
+            set_sampler_epoch(dataloader, epoch)
+            return dataloader
+
+    ddp_module = DistributedDataParallel(trainable) if world_size > 1 else trainable
+
+    def forward(x1, x2):
+        out = ddp_module(x1, x2)
+        return out if mode == "frozen_backbone" else out[0]
+
     criterion = nn.BCELoss()
-    optimizer = torch.optim.Adam(model.parameters(), lr=lr)
+    optimizer = torch.optim.Adam([p for p in trainable.parameters() if p.requires_grad], lr=lr)
+
+    checkpointer = Checkpointer(
+        BASE_DIR / train_cfg.get("checkpoint_dir", "artifacts/compatibility/checkpoints"),
+        keep=int(train_cfg.get("keep_checkpoints", 3)),
+        every_steps=int(train_cfg.get("checkpoint_every_steps", 0)),
+        every_seconds=float(train_cfg.get("checkpoint_every_seconds", 600)),
+    )
+    resume_state = None
+    if resume:
+        resume_path = checkpointer.latest() if resume == "latest" else Path(resume)
+        if resume_path is None:
+            logger.info("No checkpoint in %s; starting from scratch", checkpointer.root)
+        else:
+            resume_state = load_checkpoint(resume_path)
+            model.load_state_dict(resume_state["model_state_dict"])
+            optimizer.load_state_dict(resume_state["optimizer_state_dict"])
+            if resume_state.get("mode") != mode or resume_state.get("world_size") != world_size:
+                logger.warning(
+                    "Checkpoint was written with mode=%s world_size=%s; batches of the current epoch may differ",
+                    resume_state.get("mode"), resume_state.get("world_size"),
+                )
+            logger.info(
+                "Resuming from %s (epoch %s, batch %s, step %s)", resume_path,
+                resume_state["epoch"] + 1, resume_state["batch_in_epoch"], resume_state["global_step"],
+            )
 
     tracking_uri = get_tracking_uri()
     s3_endpoint = get_s3_endpoint()
     registry_model_name = get_registry_model_name()
     registry_stage = get_registry_stage()
 
-    if s3_endpoint:
-        os.environ["MLFLOW_S3_ENDPOINT_URL"] = s3_endpoint
+    if is_main:
+        if s3_endpoint:
+            os.environ["MLFLOW_S3_ENDPOINT_URL"] = s3_endpoint
 
-    mlflow.set_tracking_uri(tracking_uri)
-    mlflow.set_experiment(train_cfg.get("experiment_name", "wardrobe-compatibility"))
+        mlflow.set_tracking_uri(tracking_uri)
+        mlflow.set_experiment(train_cfg.get("experiment_name", "wardrobe-compatibility"))
 
     global_step = 0
     best_loss = float("inf")
     history: List[Tuple[int, float]] = []
+    throughput: List[float] = []
+    start_epoch = 0
+    if resume_state:
+        global_step = resume_state["global_step"]
+        best_loss = resume_state["best_loss"]
+        history = [tuple(h) for h in resume_state["history"]]
+        start_epoch = resume_state["epoch"]
+    checkpointer.start(global_step)
+
+    run_context = nullcontext()
+    resumed_run = False
+    if is_main:
+        run_context = None
+        if resume_state and resume_state.get("mlflow_run_id"):
+            try:
+                run_context = mlflow.start_run(run_id=resume_state["mlflow_run_id"])
+                resumed_run = True
+            except Exception as exc:
+                logger.warning("Could not reopen MLflow run %s (%s); starting a new one", resume_state["mlflow_run_id"], exc)
+        if run_context is None:
+            run_context = mlflow.start_run(run_name="siamese-train")
+
+    with run_context as run:
+        if is_main:
+            checkpointer.use_run(run.info.run_id)
+        if is_main and not resumed_run:
+            mlflow.log_params(
+                {
+                    "batch_size": batch_size,
+                    "num_epochs": num_epochs,
+                    "learning_rate": lr,
+                    "embedding_dim": embedding_dim,
+                    "image_size": image_size,
+                    "preprocessed_dir": str(preprocessed_dir),
+                    "packed_dataset": dataset.packed,
+                    "num_workers": num_workers,
+                    "mode": mode,
+                    "init_checkpoint": init_checkpoint or "",
+                    "world_size": world_size,
+                    "threads_per_rank": threads,
+                }
+            )
 
-    with mlflow.start_run(run_name="siamese-train") as run:
-        mlflow.log_params(
-            {
-                "batch_size": batch_size,
-                "num_epochs": num_epochs,
-                "learning_rate": lr,
-                "embedding_dim": embedding_dim,
-                "image_size": image_size,
-                "preprocessed_dir": str(preprocessed_dir),
+        # Step metrics go to the tracking server in batches from a background thread;
+        # leaving the block (normally or through an exception) flushes what is left
+        metric_buffer = MetricBuffer(
+            run.info.run_id,
+            MlflowClient(tracking_uri=tracking_uri),
+            flush_interval=float(train_cfg.get("metric_flush_interval", 5.0)),
+            flush_size=int(train_cfg.get("metric_flush_size", 100)),
+        ) if is_main else NullMetricBuffer()
+
+        def checkpoint_state(epoch: int, batch_in_epoch: int, epoch_rng: Dict) -> Dict:
+            return {
+                "model_state_dict": model.state_dict(),
+                "optimizer_state_dict": optimizer.state_dict(),
+                "epoch": epoch,
+                "batch_in_epoch": batch_in_epoch,
+                "global_step": global_step,
+                "running_loss": running_loss,
+                "steps": steps,
+                "best_loss": best_loss,
+                "history": history,
+                # RNG at the start of the epoch replays its batch order on resume,
+                # the current RNG continues from where training stopped
+                "epoch_rng": epoch_rng,
+                "rng": capture_rng(),
+                "mlflow_run_id": run.info.run_id,
+                "mode": mode,
+                "world_size": world_size,
             }
-        )
-
-        for epoch in range(num_epochs):
-            running_loss = 0.0
-            for img1, img2, labels in dataloader:
-                img1, img2, labels = img1.to(device), img2.to(device), labels.to(device)
 
-                optimizer.zero_grad()
-                scores, _, _ = model(img1, img2)
-                loss = criterion(scores, labels)
-                loss.backward()
-                optimizer.step()
-
-                running_loss += loss.item()
-                mlflow.log_metric("train_loss_step", loss.item(), step=global_step)
-                global_step += 1
-
-            epoch_loss = running_loss / max(len(dataloader), 1)
-            history.append((epoch, epoch_loss))
-            mlflow.log_metric("train_loss_epoch", epoch_loss, step=epoch)
-            logger.info("Epoch %s: loss=%.4f", epoch + 1, epoch_loss)
-
-            if epoch_loss < best_loss:
-                best_loss = epoch_loss
+        with metric_buffer:
+            for epoch in range(start_epoch, num_epochs):
+                epoch_start = time.perf_counter()
+                running_loss = 0.0
+                steps = 0
+                samples = 0
+                skip = 0
+                if resume_state and epoch == resume_state["epoch"]:
+                    restore_rng(resume_state["epoch_rng"])
+                    skip = resume_state["batch_in_epoch"]
+                    running_loss = resume_state["running_loss"] if is_main else 0.0
+                    steps = resume_state["steps"] if is_main else 0
+                epoch_rng = capture_rng()
+                for batch_index, (img1, img2, labels) in enumerate(epoch_batches(epoch)):
+                    if batch_index < skip:
+                        # Already trained before the checkpoint; replayed only to keep the order
+                        if batch_index == skip - 1:
+                            restore_rng(resume_state["rng"])
+                        continue
+                    img1, img2, labels = img1.to(device), img2.to(device), labels.to(device)
+
+                    optimizer.zero_grad()
+                    scores = forward(img1, img2)
+                    loss = criterion(scores, labels)
+                    loss.backward()
+                    optimizer.step()
+
+                    loss_value = loss.item()
+                    running_loss += loss_value
+                    steps += 1
+                    samples += len(labels)
+                    metric_buffer.log("train_loss_step", loss_value, step=global_step)
+                    global_step += 1
+                    if is_main and checkpointer.due(global_step):
+                        checkpointer.save(checkpoint_state(epoch, batch_index + 1, epoch_rng), epoch + 1, global_step)
+
+                # Loss and throughput over all ranks
+                totals = torch.tensor([running_loss, steps, samples], dtype=torch.float64)
+                if world_size > 1:
+                    dist.all_reduce(totals)
+                epoch_seconds = time.perf_counter() - epoch_start
+                epoch_loss = totals[0].item() / max(totals[1].item(), 1)
+                samples_per_second = totals[2].item() / epoch_seconds
+                history.append((epoch, epoch_loss))
+                throughput.append(samples_per_second)
+                metric_buffer.log("train_loss_epoch", epoch_loss, step=epoch)
+                metric_buffer.log("samples_per_second", samples_per_second, step=epoch)
+                if not metric_buffer.flush(timeout=60):
+                    logger.warning("Metrics of epoch %s not yet delivered to MLflow; retrying in the background", epoch + 1)
+                if is_main:
+                    logger.info("Epoch %s: loss=%.4f (%.1f samples/s)", epoch + 1, epoch_loss, samples_per_second)
+
+                if epoch_loss < best_loss:
+                    best_loss = epoch_loss
+                if is_main:
+                    checkpointer.save(checkpoint_state(epoch + 1, 0, capture_rng()), epoch + 1, global_step)
+
+        if not is_main:
+            return {"rank": rank, "best_loss": best_loss}
 
         # Persist model artifacts
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        torch.save({"model_state_dict": model.state_dict()}, output_path)
+        atomic_save({"model_state_dict": model.state_dict()}, output_path)
         mlflow.log_artifact(str(output_path), artifact_path="checkpoints")
 
         # Update runtime checkpoint for the API
-        RUNTIME_MODEL_PATH.parent.mkdir(parents=True, exist_ok=True)
-        torch.save({"model_state_dict": model.state_dict()}, RUNTIME_MODEL_PATH)
+        atomic_save({"model_state_dict": model.state_dict()}, RUNTIME_MODEL_PATH)
 
         # Log a full MLflow PyTorch model and push to registry
         model_info = mlflow.pytorch.log_model(
@@ -165,36 +595,50 @@ def train(
         )
 
         # Transition to desired stage if configured
-        try:
-            client = MlflowClient(tracking_uri=tracking_uri)
-            versions = client.search_model_versions(f"name='{registry_model_name}'")
-            current_version = next(
-                (v for v in versions if v.run_id == run.info.run_id), None
-            )
-            if current_version and registry_stage:
-                client.transition_model_version_stage(
-                    name=registry_model_name,
-                    version=current_version.version,
-                    stage=registry_stage,
-                    archive_existing_versions=False,
-                )
-                logger.info(
-                    "Registered model version %s transitioned to stage %s",
-                    current_version.version,
-                    registry_stage,
-                )
-        except Exception as exc:  # pragma: no cover - best-effort registry push
-            logger.warning("Could not push model to registry: %s", exc)
+        transition_run_version(tracking_uri, registry_model_name, run.info.run_id, registry_stage)
 
     return {
         "best_loss": best_loss,
         "history": history,
+        "samples_per_second": throughput,
+        "world_size": world_size,
         "output_path": str(output_path),
         "runtime_checkpoint": str(RUNTIME_MODEL_PATH),
         "tracking_uri": tracking_uri,
     }
 
 
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _spawned_rank(rank: int, params: Dict, output_path: Path, world_size: int, resume: Optional[str]) -> None:
+    result = train(params, output_path, rank=rank, world_size=world_size, resume=resume)
+    if rank == 0:
+        logger.info("Training complete: %s", result)
+
+
+def launch(params: Dict, output_path: Path, world_size: int, resume: Optional[str] = None) -> None:
+    """
+    Train with `world_size` local processes (gloo + DDP), or in this process
+    when world_size is 1. Under torchrun (RANK/WORLD_SIZE set) this process
+    is one of the ranks.
+    """
+    if "RANK" in os.environ and "WORLD_SIZE" in os.environ:
+        rank = int(os.environ["RANK"])
+        result = train(params, output_path, rank=rank, world_size=int(os.environ["WORLD_SIZE"]), resume=resume)
+        if rank == 0:
+            logger.info("Training complete: %s", result)
+    elif world_size > 1:
+        os.environ.setdefault("MASTER_ADDR", "127.0.0.1")
+        os.environ.setdefault("MASTER_PORT", str(_free_port()))
+        mp.spawn(_spawned_rank, args=(params, output_path, world_size, resume), nprocs=world_size, join=True)
+    else:
+        logger.info("Training complete: %s", train(params, output_path, resume=resume))
+
+
 def main():
     parser = argparse.ArgumentParser(description="Train Siamese compatibility model.")
     parser.add_argument(
@@ -209,13 +653,25 @@ def main():
         default=BASE_DIR / "artifacts" / "compatibility" / "compat_mobilenetv2.pth",
         help="Where to write the trained checkpoint (DVC-tracked output).",
     )
+    parser.add_argument(
+        "--nproc",
+        type=int,
+        default=None,
+        help="Training processes (default: train_siamese.world_size)",
+    )
+    parser.add_argument(
+        "--resume",
+        nargs="?",
+        const="latest",
+        default=None,
+        help="Continue from a checkpoint (default: the most recently written one under train_siamese.checkpoint_dir)",
+    )
     args = parser.parse_args()
 
     params = load_params(args.params_file)
-    result = train(params, args.output_path)
-    logger.info("Training complete: %s", result)
+    world_size = args.nproc or int(params.get("train_siamese", {}).get("world_size", 1))
+    launch(params, args.output_path, world_size, resume=args.resume)
 
 
 if __name__ == "__main__":
     main()
-
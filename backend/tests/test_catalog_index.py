@@ -0,0 +1,133 @@
+import io
+
+import numpy as np
+import pytest
+
+from app.catalog_index import CatalogIndex, head_fingerprint, model_identity
+
+EMBEDDING_DIM = 16
+
+
+def _head(rng, sizes=(2 * EMBEDDING_DIM, 12, 6, 1)):
+    return [
+        (rng.normal(size=(out_dim, in_dim)).astype(np.float32), rng.normal(size=out_dim).astype(np.float32))
+        for in_dim, out_dim in zip(sizes[:-1], sizes[1:])
+    ]
+
+
+def _unit(rows):
+    return (rows / np.linalg.norm(rows, axis=1, keepdims=True)).astype(np.float32)
+
+
+def _reference(head, top, bottom):
+    """Compatibility head on the explicit concatenation [top, bottom], as in training."""
+    hidden = np.concatenate([top, bottom])
+    for i, (w, b) in enumerate(head):
+        hidden = w @ hidden + b
+        if i < len(head) - 1:
+            hidden = np.maximum(hidden, 0)
+    return 1.0 / (1.0 + np.exp(-hidden[0]))
+
+
+def test_compatible_scores_put_the_top_first():
+    rng = np.random.default_rng(0)
+    head = _head(rng)
+    catalog = _unit(rng.normal(size=(7, EMBEDDING_DIM)))
+    query = _unit(rng.normal(size=(1, EMBEDDING_DIM)))
+    index = CatalogIndex(catalog, [{"category": "jeans"}] * len(catalog), head)
+
+    as_top = index.scores(query, "compatible", query_role="top")[0]
+    as_bottom = index.scores(query, "compatible", query_role="bottom")[0]
+
+    np.testing.assert_allclose(as_top, [_reference(head, query[0], row) for row in catalog], rtol=1e-5)
+    np.testing.assert_allclose(as_bottom, [_reference(head, row, query[0]) for row in catalog], rtol=1e-5)
+    # The head is not symmetric, so the two roles really differ
+    assert not np.allclose(as_top, as_bottom)
+
+
+def test_search_respects_role_and_mask():
+    rng = np.random.default_rng(1)
+    head = _head(rng)
+    catalog = _unit(rng.normal(size=(10, EMBEDDING_DIM)))
+    products = [{"category": "jeans" if i % 2 else "shirts"} for i in range(len(catalog))]
+    index = CatalogIndex(catalog, products, head)
+    query = _unit(rng.normal(size=(1, EMBEDDING_DIM)))
+
+    mask = index.mask_for(lambda c: c == "shirts")
+    (hits,) = index.search(query, k=3, mode="compatible", mask=mask, query_role="bottom")
+    expected = index.scores(query, "compatible", query_role="bottom")[0]
+    shirts = [i for i, p in enumerate(products) if p["category"] == "shirts"]
+    best = sorted(shirts, key=lambda i: -expected[i])[:3]
+    assert [row for row, _ in hits] == best
+
+
+class FakeModel:
+    def __init__(self, head, variant="teacher", model_path="models/compat_mobilenetv2.pth"):
+        self.head, self.variant, self.model_path = head, variant, model_path
+
+    def fingerprint(self):
+        return head_fingerprint(self.head)
+
+
+def test_index_rejects_other_models():
+    rng = np.random.default_rng(2)
+    head = _head(rng)
+    model = FakeModel(head)
+    index = CatalogIndex(_unit(rng.normal(size=(3, EMBEDDING_DIM))), [{}] * 3, head, model_identity(model))
+    assert index.matches(model_identity(FakeModel(head)))
+    assert not index.matches(model_identity(FakeModel(_head(rng))))
+    assert not index.matches(model_identity(FakeModel(head, variant="student")))
+    assert not index.matches(model_identity(FakeModel(head, model_path="models/compat_student.pth")))
+    # Indexes from before the manifest recorded the model are refused too
+    assert not CatalogIndex(index.embeddings, index.products, head, {}).matches(model_identity(model))
+
+
+def test_index_scores_match_compute_compatibility():
+    torch = pytest.importorskip("torch")
+    pytest.importorskip("torchvision")
+    nn = torch.nn
+    from PIL import Image
+    from torchvision import transforms
+
+    from app.outfit_compatibility import OutfitCompatibilityModel, SiameseMobileNetV2
+
+    class TinySiamese(nn.Module):
+        """SiameseMobileNetV2's forward pass with a tiny backbone (no pretrained download)."""
+
+        forward = SiameseMobileNetV2.forward
+        get_embedding = SiameseMobileNetV2.get_embedding
+
+        def __init__(self):
+            super().__init__()
+            self.backbone = nn.Sequential(nn.Conv2d(3, 8, 3), nn.ReLU())
+            self.embedding = nn.Sequential(
+                nn.AdaptiveAvgPool2d((1, 1)), nn.Flatten(), nn.Linear(8, EMBEDDING_DIM), nn.ReLU(),
+                nn.Linear(EMBEDDING_DIM, EMBEDDING_DIM),
+            )
+            self.compatibility_head = nn.Sequential(
+                nn.Linear(2 * EMBEDDING_DIM, 12), nn.ReLU(), nn.Dropout(0.3), nn.Linear(12, 1), nn.Sigmoid()
+            )
+
+    torch.manual_seed(0)
+    wrapper = OutfitCompatibilityModel.__new__(OutfitCompatibilityModel)
+    wrapper.device = torch.device("cpu")
+    wrapper.model = TinySiamese().eval()
+    wrapper.transform = transforms.Compose([transforms.Resize((16, 16)), transforms.ToTensor()])
+
+    def image(seed):
+        pixels = np.random.default_rng(seed).integers(0, 256, size=(16, 16, 3), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    catalog_images = [image(seed) for seed in range(5)]
+    query = image(99)
+    index = CatalogIndex(
+        wrapper.embed_images(catalog_images), [{}] * len(catalog_images), wrapper.compatibility_head_arrays()
+    )
+    query_embedding = wrapper.embed_images([query])
+
+    as_top = index.scores(query_embedding, "compatible", query_role="top")[0]
+    as_bottom = index.scores(query_embedding, "compatible", query_role="bottom")[0]
+    np.testing.assert_allclose(as_top, [wrapper.compute_compatibility(query, c) for c in catalog_images], atol=1e-5)
+    np.testing.assert_allclose(as_bottom, [wrapper.compute_compatibility(c, query) for c in catalog_images], atol=1e-5)
@@ -0,0 +1,77 @@
+import os
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from ml.checkpoints import Checkpointer, capture_rng, load_checkpoint, restore_rng  # noqa: E402
+
+
+def _names(paths):
+    return [path.name for path in paths]
+
+
+def _age(path, seconds):
+    """Backdate a file, so mtime order does not depend on filesystem timestamp resolution."""
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns - int(seconds * 1e9)))
+
+
+def test_retention_keeps_the_newest_of_the_run(tmp_path):
+    checkpointer = Checkpointer(tmp_path, keep=2)
+    checkpointer.use_run("run-a")
+    for step in (10, 20, 30):
+        checkpointer.save({"step": step}, epoch=1, step=step)
+    assert _names(checkpointer.checkpoints()) == ["ckpt-e001-s00000020.pt", "ckpt-e001-s00000030.pt"]
+    assert load_checkpoint(checkpointer.latest())["step"] == 30
+
+
+def test_runs_do_not_prune_each_other(tmp_path):
+    old_run = Checkpointer(tmp_path, keep=1)
+    old_run.use_run("run-a")
+    old_path = old_run.save({"run": "a"}, epoch=5, step=5000)
+    _age(old_path, 60)
+
+    # A fresh run starts at a low step: its checkpoint survives and is the one resumed
+    new_run = Checkpointer(tmp_path, keep=1)
+    new_run.use_run("run-b")
+    new_path = new_run.save({"run": "b"}, epoch=1, step=10)
+    assert new_path.exists() and old_path.exists()
+    assert Checkpointer(tmp_path).latest() == new_path
+
+
+def test_save_never_deletes_the_file_just_written(tmp_path):
+    checkpointer = Checkpointer(tmp_path, keep=2)
+    checkpointer.use_run("run-a")
+    for step in (100, 200, 300):
+        checkpointer.save({"step": step}, epoch=1, step=step)
+    # Resumed from an earlier checkpoint of the same run: lower step than what is on disk
+    path = checkpointer.save({"step": 150}, epoch=1, step=150)
+    assert path.exists()
+    assert len(checkpointer.checkpoints()) == 2
+
+
+def test_latest_includes_checkpoints_from_before_per_run_directories(tmp_path):
+    legacy = tmp_path / "ckpt-e002-s00000200.pt"
+    torch.save({"step": 200}, legacy)
+    assert Checkpointer(tmp_path).latest() == legacy
+    assert Checkpointer(tmp_path / "missing").latest() is None
+
+
+def test_save_requires_a_run(tmp_path):
+    with pytest.raises(RuntimeError):
+        Checkpointer(tmp_path).save({}, epoch=1, step=1)
+
+
+def test_resume_restores_rng_and_tensors(tmp_path):
+    checkpointer = Checkpointer(tmp_path, keep=3)
+    checkpointer.use_run("run-a")
+    torch.manual_seed(0)
+    weights = torch.randn(4, 4)
+    checkpointer.save({"weights": weights, "rng": capture_rng()}, epoch=1, step=1)
+    expected = torch.rand(3)
+
+    state = load_checkpoint(checkpointer.latest())
+    torch.testing.assert_close(state["weights"], weights)
+    restore_rng(state["rng"])
+    torch.testing.assert_close(torch.rand(3), expected)
@@ -0,0 +1,30 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+pytest.importorskip("ultralytics")
+pytest.importorskip("torch")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.main import app  # noqa: E402
+
+
+def _jpeg():
+    buffer = io.BytesIO()
+    Image.fromarray(np.zeros((64, 64, 3), dtype=np.uint8)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def test_text_frames_are_rejected_without_closing_the_stream():
+    client = TestClient(app)
+    with client.websocket_connect("/ws/face-stream") as ws:
+        ws.send_text("hello")
+        assert ws.receive_json() == {"error": "binary frames only"}
+        ws.send_bytes(_jpeg())
+        state = ws.receive_json()
+        assert state["stats"]["frames"] == 1
+        ws.send_text("again")
+        assert ws.receive_json() == {"error": "binary frames only"}
@@ -0,0 +1,89 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("mlflow")
+
+from ml.metric_buffer import MAX_METRICS_PER_BATCH, MetricBuffer  # noqa: E402
+
+
+class FakeClient:
+    """Stands in for MlflowClient.log_batch; raises while `failing` is set."""
+
+    def __init__(self, failing=False):
+        self.failing = failing
+        self.calls = 0
+        self.metrics = []
+        self._lock = threading.Lock()
+
+    def log_batch(self, run_id, metrics):
+        with self._lock:
+            self.calls += 1
+            if self.failing:
+                raise ConnectionError("tracking server unreachable")
+            self.metrics.extend(metrics)
+
+
+def test_flush_delivers_everything_in_order():
+    client = FakeClient()
+    with MetricBuffer("run", client, flush_interval=60, flush_size=10) as buffer:
+        for step in range(25):
+            buffer.log("loss", step / 10, step=step)
+        assert buffer.flush(timeout=5)
+        assert [m.step for m in client.metrics] == list(range(25))
+        assert buffer.stats["sent"] == 25 and buffer.stats["errors"] == 0
+
+
+def test_large_flush_is_split_into_mlflow_sized_batches():
+    client = FakeClient()
+    with MetricBuffer("run", client, flush_interval=60, flush_size=10**6) as buffer:
+        for step in range(MAX_METRICS_PER_BATCH + 5):
+            buffer.log("loss", 0.0, step=step)
+        assert buffer.flush(timeout=5)
+    assert client.calls == 2
+    assert len(client.metrics) == MAX_METRICS_PER_BATCH + 5
+
+
+def test_failing_server_is_retried_once_per_interval():
+    client = FakeClient(failing=True)
+    buffer = MetricBuffer("run", client, flush_interval=0.2, flush_size=1)
+    for step in range(50):
+        buffer.log("loss", 0.0, step=step)
+    time.sleep(1.0)
+    # One attempt per flush_interval, not one per wake-up of the size trigger
+    assert 1 <= client.calls <= 7
+    assert not buffer.flush(timeout=5)
+
+    client.failing = False
+    assert buffer.flush(timeout=5)
+    assert sorted(m.step for m in client.metrics) == list(range(50))
+    assert buffer.stats["dropped"] == 0
+    buffer.close()
+
+
+def test_size_trigger_resumes_after_a_successful_send():
+    client = FakeClient(failing=True)
+    with MetricBuffer("run", client, flush_interval=60, flush_size=5) as buffer:
+        for step in range(5):
+            buffer.log("loss", 0.0, step=step)
+        deadline = time.monotonic() + 5
+        while buffer.stats["errors"] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        client.failing = False
+        assert buffer.flush(timeout=5)
+
+        for step in range(5, 10):
+            buffer.log("loss", 0.0, step=step)
+        deadline = time.monotonic() + 5
+        while len(client.metrics) < 10 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert len(client.metrics) == 10
+
+
+def test_close_drops_metrics_it_cannot_send():
+    client = FakeClient(failing=True)
+    buffer = MetricBuffer("run", client, flush_interval=60, flush_size=100)
+    buffer.log("loss", 0.0, step=0)
+    buffer.close(timeout=5)
+    assert buffer.stats["dropped"] == 1
@@ -0,0 +1,123 @@
+import json
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from ml import preprocess
+
+
+def _write_image(path, seed):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pixels = np.random.default_rng(seed).integers(0, 256, size=(20, 20, 3), dtype=np.uint8)
+    Image.fromarray(pixels).save(path)
+
+
+def _outputs(output_dir):
+    return sorted(
+        path.relative_to(output_dir).as_posix()
+        for path in output_dir.rglob("*")
+        if path.is_file() and path.suffix in {".png", ".jpg", ".npy"} and preprocess.PACKED_DIR not in path.parts
+    )
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    input_dir, output_dir = tmp_path / "uploads", tmp_path / "preprocessed"
+    _write_image(input_dir / "shirts" / "0.png", 0)
+    _write_image(input_dir / "shirts" / "1.jpg", 1)
+    _write_image(input_dir / "jeans" / "2.png", 2)
+    return input_dir, output_dir
+
+
+def _params(dirs, **overrides):
+    input_dir, output_dir = dirs
+    cfg = {"input_dir": str(input_dir), "output_dir": str(output_dir), "image_size": 8, "workers": 1}
+    cfg.update(overrides)
+    return {"preprocess": cfg}
+
+
+def test_second_run_converts_nothing(dirs):
+    first = preprocess.run(_params(dirs))
+    assert first["processed"] == 3
+    second = preprocess.run(_params(dirs))
+    assert (second["processed"], second["unchanged"], second["removed"]) == (0, 3, 0)
+    assert "packed_images" not in second  # packed copy already current
+
+
+def test_changed_source_is_reconverted(dirs):
+    input_dir, output_dir = dirs
+    preprocess.run(_params(dirs))
+    source = input_dir / "shirts" / "0.png"
+    _write_image(source, 42)
+    stat = source.stat()
+    # Bump the mtime so the change is seen even on coarse-grained filesystems
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    summary = preprocess.run(_params(dirs))
+    assert (summary["processed"], summary["unchanged"]) == (1, 2)
+    expected = np.asarray(Image.open(source).convert("RGB").resize((8, 8)), dtype=np.uint8)
+    np.testing.assert_array_equal(preprocess._read_output(output_dir / "shirts" / "0.png"), expected)
+
+
+def test_deleted_source_output_is_removed(dirs):
+    input_dir, output_dir = dirs
+    preprocess.run(_params(dirs))
+    (input_dir / "jeans" / "2.png").unlink()
+
+    summary = preprocess.run(_params(dirs))
+    assert summary["removed"] == 1
+    assert _outputs(output_dir) == ["shirts/0.png", "shirts/1.png"]
+    manifest = json.loads((output_dir / preprocess.MANIFEST_NAME).read_text(encoding="utf-8"))
+    assert sorted(manifest["files"]) == ["shirts/0.png", "shirts/1.jpg"]
+
+
+def test_format_switch_removes_old_outputs(dirs):
+    _, output_dir = dirs
+    preprocess.run(_params(dirs, format="png"))
+    summary = preprocess.run(_params(dirs, format="raw"))
+    assert (summary["processed"], summary["removed"]) == (3, 3)
+    assert _outputs(output_dir) == ["jeans/2.npy", "shirts/0.npy", "shirts/1.npy"]
+
+    summary = preprocess.run(_params(dirs, format="jpeg"))
+    assert summary["removed"] == 3
+    assert _outputs(output_dir) == ["jeans/2.jpg", "shirts/0.jpg", "shirts/1.jpg"]
+
+
+def test_settings_change_reconverts_in_place(dirs):
+    _, output_dir = dirs
+    preprocess.run(_params(dirs))
+    summary = preprocess.run(_params(dirs, image_size=12))
+    assert (summary["processed"], summary["removed"]) == (3, 0)
+    assert preprocess._read_output(output_dir / "shirts" / "0.png").shape == (12, 12, 3)
+
+
+def test_load_packed_matches_outputs(dirs):
+    _, output_dir = dirs
+    preprocess.run(_params(dirs))
+    images, labels, index = preprocess.load_packed(output_dir)
+    assert index["files"] == ["jeans/2.png", "shirts/0.png", "shirts/1.jpg"]
+    assert list(labels) == [0, 1, 1]
+    np.testing.assert_array_equal(images[1], preprocess._read_output(output_dir / "shirts" / "0.png"))
+
+
+def test_stale_packed_copy_is_not_loaded(dirs):
+    input_dir, output_dir = dirs
+    preprocess.run(_params(dirs))
+    # Simulate a packed copy left behind by an older run: the manifest moved on
+    packed_index = (output_dir / preprocess.PACKED_DIR / "index.json").read_text(encoding="utf-8")
+    (input_dir / "jeans" / "2.png").unlink()
+    preprocess.run(_params(dirs))
+    (output_dir / preprocess.PACKED_DIR / "index.json").write_text(packed_index, encoding="utf-8")
+    assert preprocess.load_packed(output_dir) is None
+
+
+def test_pack_disabled_drops_packed_copy(dirs):
+    input_dir, output_dir = dirs
+    preprocess.run(_params(dirs))
+    (input_dir / "jeans" / "2.png").unlink()
+    summary = preprocess.run(_params(dirs, pack=False))
+    assert "packed_images" not in summary
+    assert not (output_dir / preprocess.PACKED_DIR).exists()
+    assert preprocess.load_packed(output_dir) is None
@@ -0,0 +1,78 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("selenium")
+
+from app import product_catalog  # noqa: E402
+
+URL_A = "https://example.com/a.html"
+URL_B = "https://example.com/b.html"
+
+
+@pytest.fixture
+def scrapes(monkeypatch):
+    """One-worker scrape executor; refresh_page records its URL and blocks until `release` is set."""
+    executor = ThreadPoolExecutor(max_workers=1)
+    started, release, scraped = threading.Event(), threading.Event(), []
+
+    def refresh_page(catalog, url, depth):
+        scraped.append(url)
+        started.set()
+        release.wait(5)
+        return True
+
+    monkeypatch.setattr(product_catalog, "get_scrape_executor", lambda: executor)
+    monkeypatch.setattr(product_catalog, "refresh_page", refresh_page)
+    yield started, release, scraped
+    release.set()
+    executor.shutdown(wait=True)
+    assert not product_catalog._refresh_inflight
+
+
+def test_disconnect_cancels_queued_scrapes(scrapes):
+    started, release, scraped = scrapes
+    running = product_catalog.submit_refresh(None, URL_A, cancellable=True)
+    queued = product_catalog.submit_refresh(None, URL_B, cancellable=True)
+    assert started.wait(5)
+
+    # The streaming client goes away
+    running.release()
+    queued.release()
+    release.set()
+
+    assert running.result(5) is True  # already running: finishes and refreshes the catalog
+    assert queued.future.cancelled()
+    assert scraped == [URL_A]
+
+
+def test_scrape_runs_while_another_request_waits(scrapes):
+    started, release, scraped = scrapes
+    running = product_catalog.submit_refresh(None, URL_A, cancellable=True)
+    first = product_catalog.submit_refresh(None, URL_B, cancellable=True)
+    second = product_catalog.submit_refresh(None, URL_B, cancellable=True)
+    assert second.future is first.future  # joined, not scraped twice
+    assert started.wait(5)
+
+    first.release()
+    release.set()
+    assert second.result(5) is True
+    assert scraped == [URL_A, URL_B]
+    running.release()
+    second.release()
+
+
+def test_refresher_scrapes_are_never_cancelled(scrapes):
+    started, release, scraped = scrapes
+    running = product_catalog.submit_refresh(None, URL_A)
+    requested = product_catalog.submit_refresh(None, URL_B, cancellable=True)
+    refresher = product_catalog.submit_refresh(None, URL_B)
+    assert started.wait(5)
+
+    requested.release()
+    refresher.release()
+    release.set()
+    assert refresher.result(5) is True
+    assert scraped == [URL_A, URL_B]
+    running.release()
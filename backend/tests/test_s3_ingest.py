@@ -0,0 +1,49 @@
+import time
+
+import pytest
+
+pytest.importorskip("boto3")
+
+from app import s3_storage  # noqa: E402
+
+SECOND = 1_000_000_000
+
+
+def test_presigned_keys_list_in_issue_order():
+    now = time.time_ns()
+    keys = [s3_storage.presigned_upload_key("z.jpg", now), s3_storage.presigned_upload_key("a.jpg", now + 1)]
+    keys += [s3_storage.presigned_upload_key("m.jpg", now + 10 * SECOND)]
+    assert sorted(keys) == keys
+    assert all(key.startswith(s3_storage.PRESIGN_UPLOAD_PREFIX) for key in keys)
+    assert len(set(s3_storage.presigned_upload_key("a.jpg", now) for _ in range(10))) == 10
+
+
+def test_incremental_scan_finds_late_uploads(monkeypatch):
+    pytest.importorskip("ultralytics")
+    from app import s3_ingest
+
+    bucket = {}  # key -> uploaded
+
+    def iter_prefix_keys(_bucket, prefix, start_after=None):
+        # list_objects_v2 semantics: key order, strictly after StartAfter
+        return iter(sorted(k for k in bucket if k.startswith(prefix) and (start_after is None or k > start_after)))
+
+    processed = []
+    monkeypatch.setattr(s3_ingest, "iter_prefix_keys", iter_prefix_keys)
+    worker = s3_ingest.S3IngestWorker(bucket="test", concurrency=1, embed=False)
+    monkeypatch.setattr(worker, "process_batch", lambda keys: processed.extend(keys) or {"created": len(keys)})
+
+    now = time.time_ns()
+    old = s3_storage.presigned_upload_key("old.jpg", now - 2 * (s3_storage.PRESIGN_MAX_EXPIRES * SECOND))
+    recent = s3_storage.presigned_upload_key("recent.jpg", now - 10 * SECOND)
+    bucket.update({old: True, recent: True})
+    worker.run_prefix(s3_storage.PRESIGN_UPLOAD_PREFIX, batch_size=10, full=True)
+    assert processed == [old, recent]
+
+    # URL issued before the last scan, but the upload only landed after it
+    late = s3_storage.presigned_upload_key("late.jpg", now - 20 * 60 * SECOND)
+    bucket[late] = True
+    processed.clear()
+    worker.run_prefix(s3_storage.PRESIGN_UPLOAD_PREFIX, batch_size=10, full=False)
+    assert late in processed
+    assert old not in processed  # older than any live presigned URL: not listed again